@@ -4,42 +4,41 @@ from dotenv import load_dotenv
 load_dotenv()  # load .env before other imports
 
 import os
-import traceback
+import asyncio
 import logging
+from contextlib import ExitStack, asynccontextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Optional
+
+from app.core.lazy import mark_phase, startup_report, timed_import
 
-import openai
-from openai import AsyncOpenAI
 from fastapi import FastAPI, Form, Request
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from twilio.twiml.messaging_response import MessagingResponse
-from twilio.rest import Client
+from starlette.background import BackgroundTask
 
-from app.modules.gmail_tool import gmail_tool, GmailInput
 from app.utils.error_reporter import report_error
-from app.core.agent_executor import agent_executor
+from app.core.clients import get_openai_client, get_twilio_client
+from app.core.jobs import job_manager
+from app.core.single_flight import AlreadyInFlight, single_flight
 from app.version import AGENT_VERSION
-from app.state.agent_state import agent_state
+from app.state.agent_state import agent_state, shared_redis_client
+
+# Ciężkie moduły (LangChain, openai, pandas, boto3, narzędzia) są importowane leniwie:
+# w rozgrzewce lifespan albo przy pierwszym użyciu.
 
 # ------------------------------------------------
-# Load and configure OpenAI client asynchronously
+# OpenAI: klient tworzony leniwie (get_openai_client), klucz tylko z ENV
 # ------------------------------------------------
-openai.api_key = os.getenv("OPENAI_API_KEY")
-if not openai.api_key:
+if not os.getenv("OPENAI_API_KEY"):
     logging.getLogger(__name__).warning("OPENAI_API_KEY nie jest ustawione w środowisku")
 
-_ai_client = AsyncOpenAI(api_key=openai.api_key)
-
 # ------------------------------------------------
-# Twilio Client configuration
+# Twilio Client configuration (klient tworzony leniwie: get_twilio_client)
 # ------------------------------------------------
-TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
-TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_WHATSAPP_FROM = os.getenv("TWILIO_WHATSAPP_FROM")  # e.g., 'whatsapp:+14155238886'
 
-# Initialize Twilio Client
-twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-
 # ------------------------------------------------
 # 1) Unified logging configuration
 # ------------------------------------------------
@@ -54,10 +53,82 @@ logger = logging.getLogger(__name__)
 # ------------------------------------------------
 # 2) Initialize FastAPI with CORS
 # ------------------------------------------------
+# Kolejność ma znaczenie: czas modułu obejmuje zależności, których nie załadowano wcześniej
+WARMUP_MODULES = (
+    "langchain_core",
+    "langchain",
+    "langchain_openai",
+    "boto3",
+    "app.modules.s3_tool",
+    "app.modules.decision_tool",
+    "app.core.tool_registry",
+    "app.core.pipeline",
+    "app.core.agent_executor",
+)
+
+_warmup = {"ready": False}
+
+
+def _warm_up() -> None:
+    """Importuje ciężkie moduły i buduje singletony; błędy nie blokują startu API."""
+    for module_name in WARMUP_MODULES:
+        try:
+            timed_import(module_name)
+        except Exception as e:
+            logger.warning("⚠️ Rozgrzewka: import %s nieudany: %s", module_name, e)
+    mark_phase("imports_done")
+
+    initializers = [get_twilio_client, get_openai_client, shared_redis_client]
+    try:
+        initializers.append(timed_import("app.core.agent_executor").get_agent_executor)
+    except Exception:
+        pass  # błąd importu zalogowany powyżej
+    for init in initializers:
+        try:
+            init()
+        except Exception as e:
+            logger.warning("⚠️ Rozgrzewka: %s nieudana: %s", init.__name__, e)
+    mark_phase("warmup_done")
+    _warmup["ready"] = True
+    logger.info("🔥 Rozgrzewka zakończona: %s", startup_report())
+
+
+async def _smtp_keepalive(interval: float) -> None:
+    """Co `interval` s NOOP na bezczynnych połączeniach SMTP, by pula nie wygasała między przebiegami."""
+    from app.utils.mail_transport import keepalive_mail_transports
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            alive = await asyncio.to_thread(keepalive_mail_transports)
+            if alive:
+                logger.debug("📬 Keepalive SMTP: %s", alive)
+        except Exception as e:
+            logger.warning("⚠️ Keepalive SMTP nieudany: %s", e)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    # Rozgrzewka w tle – /health odpowiada od razu
+    if os.getenv("AGENT_WARMUP", "1") == "1":
+        asyncio.get_running_loop().run_in_executor(None, _warm_up)
+    keepalive_interval = float(os.getenv("SMTP_KEEPALIVE_S", "120"))
+    keepalive = asyncio.create_task(_smtp_keepalive(keepalive_interval)) if keepalive_interval > 0 else None
+    try:
+        yield
+    finally:
+        if keepalive is not None:
+            keepalive.cancel()
+        job_manager.shutdown()
+        from app.utils.mail_transport import close_mail_transports
+        close_mail_transports()
+
+
 app = FastAPI(
     title="LangChain Agent Gateway",
     description="API dla uruchamiania agenta AI",
-    version=AGENT_VERSION
+    version=AGENT_VERSION,
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -89,17 +160,52 @@ async def global_exception_handler(request: Request, exc: Exception):
 # ------------------------------------------------
 @app.get("/health", tags=["Monitoring"])
 async def health_check():
-    return {"status": "ok"}
+    return {"status": "ok", "ready": _warmup["ready"]}
+
+@app.get("/startup-report", tags=["Monitoring"])
+async def startup_info():
+    return {"ready": _warmup["ready"], **startup_report()}
 
 @app.get("/version", tags=["Monitoring"])
 async def version_info():
     return {"version": AGENT_VERSION}
 
+@app.get("/metrics/llm-cache", tags=["Monitoring"])
+async def llm_cache_info():
+    from app.core.llm_cache import llm_cache_metrics
+    return llm_cache_metrics()
+
+@app.get("/metrics/tokens", tags=["Monitoring"])
+async def token_usage_info():
+    from app.core.token_accounting import last_run_report
+    return last_run_report()
+
+@app.get("/metrics/run-budget", tags=["Monitoring"])
+async def run_budget_info():
+    from app.core.run_budget import budget_report
+    return budget_report()
+
+@app.get("/metrics/tools", tags=["Monitoring"])
+async def tool_metrics_info(name: Optional[str] = None):
+    from app.core.tool_metrics import tool_metrics
+    return tool_metrics(name)
+
+@app.get("/metrics/tool-memo", tags=["Monitoring"])
+async def tool_memo_info():
+    from app.core.tool_memo import memo_metrics
+    return memo_metrics()
+
+@app.get("/metrics/mail", tags=["Monitoring"])
+async def mail_transport_info():
+    from app.utils.mail_transport import mail_transport_metrics
+    return mail_transport_metrics()
+
 @app.get("/integration-check", tags=["Monitoring"])
 async def integration_check():
     try:
-        assert agent_executor is not None, "Brak agent_executor"
-        assert openai.api_key, "Brak OPENAI_API_KEY"
+        from app.core.agent_executor import get_agent_executor
+        assert get_agent_executor() is not None, "Brak agent_executor"
+        assert os.getenv("OPENAI_API_KEY"), "Brak OPENAI_API_KEY"
         return {"status": "ok", "message": "Wszystkie komponenty są zintegrowane"}
     except AssertionError as e:
         logger.error("Błąd integracji: %s", e)
@@ -114,7 +220,7 @@ async def integration_check():
 # ------------------------------------------------
 async def explain_error_with_ai(error_text: str) -> str:
     try:
-        response = await _ai_client.chat.completions.create(
+        response = await get_openai_client().chat.completions.create(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "Jesteś ekspertem DevOps. Tłumacz błędy Python."},
@@ -129,35 +235,143 @@ async def explain_error_with_ai(error_text: str) -> str:
         return f"❌ Błąd AI: {inner}"
 
 # ------------------------------------------------
-# 6) Main agent endpoint
+# 6) Main agent endpoint (asynchroniczne zlecenia)
 # ------------------------------------------------
-@app.post("/run-agent-llm", tags=["Agent"])
-async def run_agent_llm():
+# Jeden klucz dla wszystkich trybów i punktów wejścia (zlecenia, SSE, WhatsApp):
+# przebiegi agenta i pipeline'u dzielą tracker i powiadomienia, więc nie mogą iść równolegle
+AGENT_RUN_KEY = "agent-run"
+
+
+def _run_agent(mode: str, entry: str = "api") -> Any:
+    # Równoległe wywołania (także z innych workerów) dołączają do trwającego przebiegu
+    return single_flight.do(AGENT_RUN_KEY, lambda: _run_agent_once(mode, entry))
+
+
+def _run_agent_once(mode: str, entry: str) -> Any:
+    from app.core.agent_executor import escalate_to_agent, invoke_agent
+    from app.core.pipeline import run_pipeline
+
+    if mode == "pipeline":
+        logger.info("⚙️ Pipeline startuje...")
+        return run_pipeline(escalate=partial(escalate_to_agent, entry=entry))
+
+    logger.info("🤖 Agent LLM startuje...")
+    result = invoke_agent("Rozpocznij analizę i obsługę zleceń", parallel=mode == "parallel", entry=entry)
+    return {
+        "output": result.get("output"),
+        "partial": result.get("partial", False),
+        "processed_records": result.get("processed_records", []),
+        "budget": result.get("budget"),
+    }
+
+
+async def _diagnose_agent_error(exc: Exception, error_text: str) -> dict:
+    ai_hint = await explain_error_with_ai(error_text)
+    report = await asyncio.to_thread(
+        report_error, "AgentLLM", "agent_executor.invoke()", exc, analyze=False
+    )
+    return {"ai_diagnosis": ai_hint, "error_report": report}
+
+
+@app.post("/run-agent-llm", tags=["Agent"], status_code=202)
+async def run_agent_llm(mode: str = "agent"):
+    """
+    Zleca przebieg agenta w tle i od razu zwraca 202 z ID zlecenia (stan: GET /jobs/{id}).
+    mode=agent – pełny przebieg przez AgentExecutor (LLM na każdym kroku),
+    mode=parallel – agent tool-calling, wywołania narzędzi z jednej tury wykonywane równolegle,
+    mode=pipeline – deterministyczna sekwencja, LLM tylko dla anomalii.
+    """
+    from app.core.pipeline import PIPELINE_MODES
+
+    if mode not in PIPELINE_MODES:
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": f"Nieznany tryb: {mode}. Dostępne: {', '.join(PIPELINE_MODES)}"}
+        )
+    job = job_manager.submit(
+        f"run-agent-llm:{mode}",
+        lambda: _run_agent(mode),
+        on_error=_diagnose_agent_error,
+        dedupe_key=AGENT_RUN_KEY,
+    )
+    return JSONResponse(
+        status_code=202,
+        content={
+            "status": "accepted",
+            "job_id": job["id"],
+            "status_url": f"/jobs/{job['id']}",
+            "coalesced": job["attached"] > 0,
+        },
+    )
+
+
+@app.get("/run-agent-llm/stream", tags=["Agent"])
+async def run_agent_llm_stream(mode: str = "agent"):
+    """
+    Uruchamia agenta i strumieniuje postęp jako Server-Sent Events: start, token,
+    tool_start, tool_end, tool_error, decision, a na końcu result / budget_exhausted / error.
+    Tryby: agent, parallel (pipeline nie ma kroków LLM do strumieniowania).
+    """
+    if mode not in ("agent", "parallel"):
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": f"Nieznany tryb: {mode}. Dostępne: agent, parallel"}
+        )
+    # Strumień rejestruje własny przebieg na cały czas trwania – zlecenia i inne
+    # strumienie nie wystartują równolegle, a /run-agent-llm dołączy do jego wyniku
+    claim = ExitStack()
     try:
-        logger.info("🤖 Agent LLM startuje...")
-        result = agent_executor.invoke({"input": "Rozpocznij analizę i obsługę zleceń"})
-        output_text = result.get("output") if isinstance(result, dict) else str(result)
-        return JSONResponse(status_code=200, content={"status": "ok", "result": output_text})
-    except Exception as e:
-        error_text = traceback.format_exc()
-        ai_hint = await explain_error_with_ai(error_text)
-        report = report_error("AgentLLM", "agent_executor.invoke()", e, analyze=False)
+        # SET NX w Redis (i ewentualne łączenie) poza pętlą zdarzeń
+        outcome = await asyncio.to_thread(claim.enter_context, single_flight.claim(AGENT_RUN_KEY))
+    except AlreadyInFlight:
         return JSONResponse(
-            status_code=500,
-            content={
-                "status": "error",
-                "message": str(e),
-                "ai_diagnosis": ai_hint,
-                "error_report": report,
-                "traceback": error_text
-            },
+            status_code=409,
+            content={"status": "error", "message": "Przebieg agenta już trwa – sprawdź GET /jobs/{job_id}."}
+        )
+    try:
+        # Import (przy zimnym starcie: cały agent) poza pętlą zdarzeń
+        agent_stream = await asyncio.to_thread(timed_import, "app.core.agent_stream")
+        events = agent_stream.stream_agent_events(
+            "Rozpocznij analizę i obsługę zleceń", parallel=mode == "parallel", entry="api"
         )
+    except BaseException:
+        claim.close()
+        raise
+    return StreamingResponse(
+        agent_stream.sse_stream(_claimed_events(events, outcome, claim)),
+        media_type="text/event-stream",
+        headers=agent_stream.SSE_HEADERS,
+        # Zapas: zwolnienie, gdyby strumień nie został w ogóle rozpoczęty
+        background=BackgroundTask(claim.close),
+    )
+
+
+async def _claimed_events(events: AsyncIterator, outcome: dict, claim: ExitStack) -> AsyncIterator:
+    """Przekazuje zdarzenia strumienia, zapisuje wynik końcowy dla dołączających i zwalnia przebieg."""
+    try:
+        async for event, data in events:
+            if event in ("result", "budget_exhausted"):
+                outcome["result"] = data
+            elif event == "error":
+                outcome["error"] = data.get("message")
+            yield event, data
+    finally:
+        claim.close()
+
+
+@app.get("/jobs/{job_id}", tags=["Agent"])
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": f"Brak zlecenia {job_id}"})
+    return JSONResponse(status_code=200, content=jsonable_encoder(job))
 
 # ------------------------------------------------
 # 7) Test email endpoint
 # ------------------------------------------------
 @app.post("/send-test-email", tags=["Agent"])
 async def test_email():
+    from app.modules.gmail_tool import gmail_tool, GmailInput
     result = gmail_tool.run(
         tool_input=GmailInput(subject="Zlecenie 12345", body="Proszę o zlecenie.")
     )
@@ -179,33 +393,33 @@ async def whatsapp_webhook(
 
     cmd = body.strip().lower()
     if cmd == "praca start":
-        try:
-            invocation = agent_executor.invoke({"input": "Rozpocznij analizę i obsługę zleceń"})
-            if isinstance(invocation, dict):
-                output = invocation.get("output") or invocation.get("result") or str(invocation)
-            else:
-                output = str(invocation)
-        except Exception as e:
-            output = f"❌ Błąd agenta: {e}"
+        def _run_and_reply() -> str:
+            try:
+                result = _run_agent("agent", entry="whatsapp")
+                output = str(result.get("output") if isinstance(result, dict) else result)
+            except Exception as e:
+                output = f"❌ Błąd agenta: {e}"
 
-        # Wyślij odpowiedź przez Twilio Client
-        try:
-            message = twilio_client.messages.create(
-                from_=TWILIO_WHATSAPP_FROM,
-                body=output,
-                to=from_number  # np. 'whatsapp:+48...'
-            )
-            logger.info("✔️ Odpowiedź wysłana przez Twilio: sid=%s", message.sid)
-        except Exception as send_err:
-            logger.error("❌ Błąd wysyłania wiadomości Twilio: %s", send_err, exc_info=True)
+            # Wyślij odpowiedź przez Twilio Client
+            try:
+                message = get_twilio_client().messages.create(
+                    from_=TWILIO_WHATSAPP_FROM,
+                    body=output,
+                    to=from_number  # np. 'whatsapp:+48...'
+                )
+                logger.info("✔️ Odpowiedź wysłana przez Twilio: sid=%s", message.sid)
+            except Exception as send_err:
+                logger.error("❌ Błąd wysyłania wiadomości Twilio: %s", send_err, exc_info=True)
+            return output
 
-        # Zwróć pustą odpowiedź (Twilio i tak otrzyma 200 OK)
+        # Agent działa w tle – Twilio od razu dostaje 200 OK, a odpowiedź trafi przez Client
+        job_manager.submit("whatsapp:praca-start", _run_and_reply)
         return PlainTextResponse("", status_code=200)
 
     elif cmd == "praca stop":
         agent_state.stop()
         try:
-            message = twilio_client.messages.create(
+            message = get_twilio_client().messages.create(
                 from_=TWILIO_WHATSAPP_FROM,
                 body="⏸️ Agent zatrzymany.",
                 to=from_number
@@ -218,7 +432,7 @@ async def whatsapp_webhook(
     else:
         # Nie rozumiem komendy – wyślij instrukcję
         try:
-            message = twilio_client.messages.create(
+            message = get_twilio_client().messages.create(
                 from_=TWILIO_WHATSAPP_FROM,
                 body="❓ Nie rozumiem. Dostępne: praca start, praca stop",
                 to=from_number
@@ -228,6 +442,8 @@ async def whatsapp_webhook(
             logger.error("❌ Błąd wysyłania instrukcji Twilio: %s", send_err, exc_info=True)
         return PlainTextResponse("", status_code=200)
 
+mark_phase("api_module_loaded")
+
 # ------------------------------------------------
 # 9) Uvicorn entrypoint for local/dev
 # ------------------------------------------------
@@ -1,86 +1,197 @@
 # app/core/agent_executor.py
 
 import os
-import json
+import asyncio
 import logging
+from functools import partial
 from pathlib import Path
 from typing import Any
 
-from langchain.agents import AgentExecutor, create_openai_functions_agent
+from langchain.agents import AgentExecutor, create_openai_functions_agent, create_tool_calling_agent
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 
+from app.core.lazy import lazy_singleton
+from app.core.llm_cache import get_llm_cache
+from app.core.parallel_tools import with_bounded_pool
+from app.core.pipeline import run_pipeline, PIPELINE_MODES
+from app.core.run_budget import (
+    BudgetExceeded,
+    BudgetGuard,
+    RunBudget,
+    budget_metrics,
+    partial_result,
+    with_tool_timeouts,
+)
+from app.core.scratchpad import compact_intermediate_steps
 from app.core.snapshot_tracker import SnapshotTracker
+from app.core.token_accounting import TokenAccountant, record_run
 from app.core.tool_registry import get_all_tools
-from app.modules.s3_tool import fetch_latest_snapshot, EmptyInput
+from app.modules.s3_tool import latest_snapshot, read_snapshot
 
 # --- Logging ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # --- Wczytanie promptu ---
-prompt_path = Path(os.getenv("PROMPT_PATH", "data/agent.prompt.txt"))
-if prompt_path.is_file():
-    try:
-        system_prompt = prompt_path.read_text(encoding="utf-8")
-    except Exception as e:
-        logger.error("Błąd odczytu promptu: %s", e, exc_info=True)
-        system_prompt = "Agent startowy (domyślna konfiguracja)."
-else:
-    logger.warning("Prompt nie znaleziony pod ścieżką %s, używam domyślnego.", prompt_path)
-    system_prompt = "Agent startowy (domyślna konfiguracja)."
-
-prompt = ChatPromptTemplate.from_messages([
-    ("system", system_prompt),
-    MessagesPlaceholder(variable_name="intermediate_steps"),
-    ("user", "{input}"),
-    MessagesPlaceholder(variable_name="agent_scratchpad"),
-])
-
-# --- LLM + Agent ---
-llm = ChatOpenAI(
-    model_name=os.getenv("OPENAI_MODEL", "gpt-4"),
-    temperature=0.3
+def load_system_prompt() -> str:
+    prompt_path = Path(os.getenv("PROMPT_PATH", "data/agent.prompt.txt"))
+    if prompt_path.is_file():
+        try:
+            return prompt_path.read_text(encoding="utf-8")
+        except Exception as e:
+            logger.error("Błąd odczytu promptu: %s", e, exc_info=True)
+    else:
+        logger.warning("Prompt nie znaleziony pod ścieżką %s, używam domyślnego.", prompt_path)
+    return "Agent startowy (domyślna konfiguracja)."
+
+
+# --- LLM + Agent (tworzone przy pierwszym użyciu lub w rozgrzewce API) ---
+model_name = os.getenv("OPENAI_MODEL", "gpt-4")
+
+
+@lazy_singleton("llm")
+def get_llm() -> ChatOpenAI:
+    return ChatOpenAI(
+        model_name=model_name,
+        temperature=0.3,
+        cache=get_llm_cache() or False,
+        # Zużycie tokenów także przy strumieniowaniu (astream_events) – dla budżetu i raportu
+        stream_usage=True,
+    )
+
+
+PARALLEL_HINT = (
+    "\n\n⚡ TRYB RÓWNOLEGŁY: narzędzia dla niezależnych rekordów wywołuj "
+    "w jednej turze, wieloma wywołaniami naraz."
 )
 
-tools = get_all_tools()
 
-agent = create_openai_functions_agent(
-    llm=llm,
-    prompt=prompt,
-    tools=tools
-)
+def _build_prompt(system_prompt: str) -> ChatPromptTemplate:
+    # Kroki pośrednie trafiają do modelu tylko przez (kompaktowany) agent_scratchpad
+    return ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("user", "{input}"),
+        MessagesPlaceholder(variable_name="agent_scratchpad"),
+    ])
+
+
+@lazy_singleton("agent_executor")
+def get_agent_executor() -> AgentExecutor:
+    prompt = _build_prompt(load_system_prompt())
+    tools = get_all_tools()
+    agent = create_openai_functions_agent(
+        llm=get_llm(),
+        prompt=prompt,
+        tools=tools
+    )
+    return AgentExecutor(
+        agent=agent,
+        tools=tools,
+        verbose=False,
+        return_intermediate_steps=True,
+        handle_parsing_errors=True,
+        trim_intermediate_steps=compact_intermediate_steps,
+    )
+
+
+@lazy_singleton("parallel_agent_executor")
+def get_parallel_agent_executor() -> AgentExecutor:
+    """
+    Agent tool-calling: model może zwrócić wiele wywołań narzędzi w jednej turze,
+    a executor (ainvoke) wykonuje je współbieżnie w ograniczonej puli wątków.
+    Wymaga modelu obsługującego równoległe tool calls (OPENAI_MODEL, np. gpt-4o).
+    """
+    prompt = _build_prompt(load_system_prompt() + PARALLEL_HINT)
+    tools = with_bounded_pool(get_all_tools())
+    agent = create_tool_calling_agent(llm=get_llm(), tools=tools, prompt=prompt)
+    return AgentExecutor(
+        agent=agent,
+        tools=tools,
+        verbose=False,
+        return_intermediate_steps=True,
+        handle_parsing_errors=True,
+        trim_intermediate_steps=compact_intermediate_steps,
+    )
+
+
+def prepare_run(parallel: bool = False, entry: str = "cli") -> tuple[AgentExecutor, dict[str, Any], BudgetGuard, TokenAccountant]:
+    """
+    Przygotowuje przebieg: kopię executora z limitami czasu narzędzi
+    i konfigurację z callbackami budżetu (BudgetGuard) oraz liczenia tokenów.
+    """
+    budget = RunBudget.for_entry(entry)
+    guard = BudgetGuard(budget)
+    accountant = TokenAccountant(model=model_name)
+
+    base = get_parallel_agent_executor() if parallel else get_agent_executor()
+    # Limity tur i czasu egzekwuje BudgetGuard (z wynikiem częściowym), nie executor
+    executor = base.model_copy(update={
+        "tools": with_tool_timeouts(base.tools, budget.tool_timeout_s),
+        "max_iterations": None,
+        "max_execution_time": None,
+    })
+    budget_metrics[f"runs:{entry}"] += 1
+    return executor, {"callbacks": [accountant, guard]}, guard, accountant
+
+
+def invoke_agent(text: str, parallel: bool = False, entry: str = "cli") -> dict[str, Any]:
+    """
+    Uruchamia agenta z liczeniem tokenów i budżetem przebiegu punktu wejścia `entry`
+    (cli/api/whatsapp). Raport tokenów trafia do wyniku pod kluczem 'token_usage',
+    zużycie budżetu pod 'budget'. Po wyczerpaniu budżetu zwracany jest wynik
+    częściowy (partial=True) z listą przetworzonych rekordów.
+    parallel=True – agent tool-calling z równoległym wykonaniem wywołań z jednej tury
+    (wołać spoza działającej pętli zdarzeń, np. z wątku zlecenia).
+    """
+    executor, config, guard, accountant = prepare_run(parallel, entry)
+    try:
+        if parallel:
+            result = asyncio.run(executor.ainvoke({"input": text}, config=config))
+        else:
+            result = executor.invoke({"input": text}, config=config)
+        result["processed_records"] = guard.processed_records
+        result["budget"] = guard.summary()
+    except BudgetExceeded as e:
+        result = partial_result(guard, e)
+    result["token_usage"] = record_run(accountant)
+    return result
+
+
+def escalate_to_agent(text: str, entry: str = "cli") -> str:
+    """
+    Przekazuje opis anomalii z trybu pipeline do agenta LLM i zwraca jego odpowiedź.
+    """
+    return invoke_agent(text, entry=entry).get("output")
 
-agent_executor = AgentExecutor(
-    agent=agent,
-    tools=tools,
-    verbose=False,
-    return_intermediate_steps=True,
-    handle_parsing_errors=True
-)
 
 # --- CLI ---
-def run_agent_cli() -> None:
+def run_agent_cli(mode: str = "agent") -> None:
     """
     Tryb CLI do lokalnego testowania działania agenta.
+    mode='pipeline' uruchamia deterministyczną sekwencję bez LLM (LLM tylko dla anomalii),
+    mode='parallel' – agent z równoległymi wywołaniami narzędzi.
     """
+    if mode not in PIPELINE_MODES:
+        logger.error("Nieznany tryb %s, dostępne: %s", mode, ", ".join(PIPELINE_MODES))
+        return
+
     try:
-        logger.info("📦 Pobieram snapshot danych z S3...")
-        raw = fetch_latest_snapshot.invoke({})
+        if mode == "pipeline":
+            result = run_pipeline(escalate=partial(escalate_to_agent, entry="cli"))
+            logger.info("✅ WYNIK KOŃCOWY:\n%s", result)
+            return
 
-        logger.info("Raw z S3Tool: %s", raw)
-        snapshot: dict[str, Any] = json.loads(raw) if isinstance(raw, str) else raw
+        logger.info("📦 Pobieram snapshot danych z S3...")
+        latest = latest_snapshot()
+        snapshot: dict[str, Any] = read_snapshot(latest)
 
         if "records" not in snapshot:
             logger.error("Brak klucza 'records' w snapshotcie: %s", snapshot)
             return
 
         records = snapshot.get("records", [])
-        kind = (
-            "marcel"
-            if any("marcel" in str(v).lower() for v in snapshot.values())
-            else "motoassist"
-        )
+        kind = latest["kind"]
 
         tracker = SnapshotTracker(kind=kind)
         new_records = tracker.filter_new_records(records)
@@ -90,13 +201,30 @@ def run_agent_cli() -> None:
             return
 
         logger.info("🟢 Wykryto %d nowych rekordów. Uruchamiam agenta...", len(new_records))
-        result = agent_executor.invoke({"input": "Rozpocznij analizę i obsługę zleceń"})
-
-        tracker.update_cache(records)
+        result = invoke_agent("Rozpocznij analizę i obsługę zleceń", parallel=mode == "parallel")
+
+        if result.get("partial"):
+            # Przebieg przerwany przez budżet – widziane są tylko rekordy, które
+            # przeszły przez narzędzia decyzyjne; reszta wróci w kolejnym przebiegu
+            processed = set(result.get("processed_records") or [])
+            tracker.update_cache(r for r in new_records if str(r.get("id")) in processed)
+            logger.warning(
+                "⚠️ Wynik częściowy: przetworzono %d z %d nowych rekordów.", len(processed), len(new_records)
+            )
+        else:
+            # Wcześniej widziane ID już są w cache – wystarczy dopisać nowe
+            tracker.update_cache(new_records)
         logger.info("✅ WYNIK KOŃCOWY:\n%s", result)
 
     except Exception as e:
         logger.error("❌ Błąd główny agenta: %s", e, exc_info=True)
 
 if __name__ == "__main__":
-    run_agent_cli()
+    import sys
+    if "--pipeline" in sys.argv:
+        cli_mode = "pipeline"
+    elif "--parallel" in sys.argv:
+        cli_mode = "parallel"
+    else:
+        cli_mode = os.getenv("AGENT_MODE", "agent")
+    run_agent_cli(mode=cli_mode)
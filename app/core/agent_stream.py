@@ -0,0 +1,150 @@
+# app/core/agent_stream.py
+
+import os
+import json
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Tuple
+
+from app.core.agent_executor import prepare_run
+from app.core.run_budget import DECISION_TOOLS, BudgetExceeded, partial_result, record_ids
+from app.core.token_accounting import record_run
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+MAX_PAYLOAD_CHARS = int(os.getenv("SSE_MAX_PAYLOAD_CHARS", "2000"))
+
+# Nagłówki wyłączające buforowanie w proxy (nginx, Cloudflare) i cache
+SSE_HEADERS = {
+    "Cache-Control": "no-cache, no-transform",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+Event = Tuple[str, Dict[str, Any]]
+
+
+def _preview(value: Any) -> Any:
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+    return text if len(text) <= MAX_PAYLOAD_CHARS else f"{text[:MAX_PAYLOAD_CHARS]}…"
+
+
+def _output_value(output: Any) -> Any:
+    # W astream_events v2 wynik narzędzia bywa ToolMessage
+    return getattr(output, "content", output)
+
+
+def _decisions(tool: str, tool_input: Any, output: Any) -> Iterable[Dict[str, Any]]:
+    """Decyzje per rekord z wyniku narzędzia decyzyjnego."""
+    output = _output_value(output)
+    if tool == "decide_orders_batch":
+        if isinstance(output, str):
+            try:
+                output = json.loads(output)
+            except json.JSONDecodeError:
+                return []
+        return [
+            {"id": item.get("id"), "decision": item.get("decision"), "error": item.get("error")}
+            for item in output if isinstance(item, dict)
+        ] if isinstance(output, list) else []
+
+    text = str(output).strip()
+    decision = text if text in ("TAK", "NIE") else None
+    return [
+        {"id": record_id, "decision": decision, "error": None if decision else text}
+        for record_id in record_ids(tool_input)
+    ]
+
+
+def _translate(event: Dict[str, Any]) -> Iterable[Event]:
+    kind = event["event"]
+    data = event.get("data") or {}
+
+    if kind == "on_chat_model_stream":
+        chunk = data.get("chunk")
+        text = getattr(chunk, "content", None)
+        if text:
+            yield "token", {"text": text}
+    elif kind == "on_tool_start":
+        yield "tool_start", {"tool": event["name"], "run_id": event["run_id"], "input": _preview(data.get("input"))}
+    elif kind == "on_tool_end":
+        output = data.get("output")
+        yield "tool_end", {"tool": event["name"], "run_id": event["run_id"], "output": _preview(_output_value(output))}
+        if event["name"] in DECISION_TOOLS:
+            for decision in _decisions(event["name"], data.get("input"), output):
+                yield "decision", decision
+    elif kind == "on_tool_error":
+        yield "tool_error", {"tool": event["name"], "run_id": event["run_id"], "error": str(data.get("error"))}
+
+
+async def stream_agent_events(text: str, parallel: bool = False, entry: str = "api") -> AsyncIterator[Event]:
+    """
+    Uruchamia agenta przez astream_events (v2) i zwraca zdarzenia postępu:
+    token, tool_start, tool_end, tool_error, decision, a na końcu result,
+    budget_exhausted albo error.
+    """
+    executor, config, guard, accountant = prepare_run(parallel, entry)
+    yield "start", {"mode": "parallel" if parallel else "agent", "budget": guard.budget.as_dict()}
+
+    final: Optional[Dict[str, Any]] = None
+    try:
+        async for event in executor.astream_events({"input": text}, config=config, version="v2"):
+            if event["event"] == "on_chain_end" and not event.get("parent_ids"):
+                final = (event.get("data") or {}).get("output")
+                continue
+            for translated in _translate(event):
+                yield translated
+        output = final if isinstance(final, dict) else {"output": final}
+        yield "result", {
+            "output": _preview(output.get("output")),
+            "processed_records": guard.processed_records,
+            "budget": guard.summary(),
+            "token_usage": record_run(accountant),
+        }
+    except BudgetExceeded as e:
+        result = partial_result(guard, e)
+        result["token_usage"] = record_run(accountant)
+        yield "budget_exhausted", result
+    except Exception as e:
+        logger.error("❌ Błąd strumienia agenta: %s", e, exc_info=True)
+        yield "error", {"message": str(e), "processed_records": guard.processed_records}
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+async def sse_stream(events: AsyncIterator[Event]) -> AsyncIterator[str]:
+    """
+    Zamienia zdarzenia na ramki SSE. Pierwsza ramka wychodzi od razu, a gdy
+    przez KEEPALIVE_SECONDS nic się nie dzieje, wysyłany jest komentarz
+    keepalive, żeby proxy nie zamknęło połączenia.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def _produce() -> None:
+        try:
+            async for item in events:
+                await queue.put(item)
+        finally:
+            await queue.put(done)
+
+    producer = asyncio.create_task(_produce())
+    yield "retry: 5000\n: connected\n\n"
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if item is done:
+                break
+            yield format_sse(*item)
+    finally:
+        # Rozłączenie klienta przerywa przebieg
+        if not producer.done():
+            producer.cancel()
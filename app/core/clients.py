@@ -0,0 +1,26 @@
+# app/core/clients.py
+
+import os
+
+from app.core.lazy import lazy_singleton
+
+
+@lazy_singleton("twilio_client")
+def get_twilio_client():
+    """
+    Współdzielony klient Twilio (jedna sesja HTTP na proces). Limit czasu
+    żądania: TWILIO_HTTP_TIMEOUT – wysyłka WhatsApp nie ma limitu na poziomie narzędzia.
+    """
+    from twilio.http.http_client import TwilioHttpClient
+    from twilio.rest import Client
+
+    http_client = TwilioHttpClient(timeout=float(os.getenv("TWILIO_HTTP_TIMEOUT", "15")))
+    return Client(os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN"), http_client=http_client)
+
+
+@lazy_singleton("openai_async_client")
+def get_openai_client():
+    """Asynchroniczny klient OpenAI do diagnostyki błędów."""
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
@@ -0,0 +1,125 @@
+# app/core/jobs.py
+
+import os
+import uuid
+import time
+import asyncio
+import logging
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.utils.error_reporter import report_error
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_ERROR = "error"
+
+
+class JobManager:
+    """
+    Uruchamia synchroniczne przebiegi agenta w ograniczonej puli wątków,
+    nie blokując pętli zdarzeń uvicorna. Każde zlecenie dostaje ID, a jego
+    stan i wynik można odczytać przez get(). Przechowywanych jest `max_jobs`
+    ostatnich zleceń – usuwane są tylko zakończone, trwające zostają zawsze.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_jobs: int = 200):
+        self.max_workers = max_workers or int(os.getenv("AGENT_JOB_WORKERS", "2"))
+        self.max_jobs = max_jobs
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="agent-job")
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Silne referencje do zadań asyncio (pętla trzyma tylko słabe)
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def submit(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        on_error: Optional[Callable[[Exception, str], Awaitable[Dict[str, Any]]]] = None,
+        dedupe_key: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Rejestruje zlecenie i planuje je w puli. Wywoływać z wnętrza pętli zdarzeń.
+        `on_error(exc, traceback)` może dołożyć do zlecenia dodatkowe pola diagnostyczne.
+        Jeśli zlecenie z tym samym `dedupe_key` jeszcze trwa, zwracane jest ono
+        (z licznikiem `attached`) zamiast tworzenia nowego.
+        """
+        if dedupe_key is not None:
+            active = self.find_active(dedupe_key)
+            if active is not None:
+                active["attached"] += 1
+                logger.info("🔗 Dołączono do trwającego zlecenia %s (%s).", active["id"], dedupe_key)
+                return active
+
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "name": name,
+            "dedupe_key": dedupe_key,
+            "attached": 0,
+            "status": JOB_QUEUED,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        self._jobs[job_id] = job
+        self._evict()
+        task = asyncio.get_running_loop().create_task(self._run(job, func, on_error))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        logger.info("🧾 Zlecenie %s (%s) w kolejce.", job_id, name)
+        return job
+
+    async def _run(self, job: Dict[str, Any], func, on_error) -> None:
+        loop = asyncio.get_running_loop()
+
+        def _call():
+            job["status"] = JOB_RUNNING
+            job["started_at"] = time.time()
+            return func()
+
+        try:
+            job["result"] = await loop.run_in_executor(self._pool, _call)
+            job["status"] = JOB_DONE
+        except Exception as e:
+            error_text = traceback.format_exc()
+            job["status"] = JOB_ERROR
+            job["error"] = {"message": str(e), "traceback": error_text}
+            logger.error("❌ Zlecenie %s zakończone błędem: %s", job["id"], e, exc_info=True)
+            if on_error is not None:
+                try:
+                    job["error"].update(await on_error(e, error_text))
+                except Exception as diag_err:
+                    report_error("JobManager", "on_error", diag_err)
+        finally:
+            job["finished_at"] = time.time()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id)
+
+    def find_active(self, dedupe_key: str) -> Optional[Dict[str, Any]]:
+        for job in reversed(self._jobs.values()):
+            if job["dedupe_key"] == dedupe_key and job["status"] in (JOB_QUEUED, JOB_RUNNING):
+                return job
+        return None
+
+    def _evict(self) -> None:
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in (JOB_DONE, JOB_ERROR)]
+        for job_id in finished[:excess]:
+            del self._jobs[job_id]
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+job_manager = JobManager()
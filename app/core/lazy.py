@@ -0,0 +1,89 @@
+# app/core/lazy.py
+
+import sys
+import time
+import logging
+import importlib
+import threading
+from functools import wraps
+from types import ModuleType
+from typing import Any, Callable, Dict, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_PROCESS_STARTED = time.time()
+_imports: Dict[str, float] = {}
+_inits: Dict[str, float] = {}
+_errors: Dict[str, str] = {}
+_phases: Dict[str, float] = {}
+
+
+def timed_import(module_name: str) -> ModuleType:
+    """
+    Importuje moduł i zapisuje czas importu (łącznie z zależnościami,
+    które nie były jeszcze załadowane). Ponowny import kosztuje 0 i nie nadpisuje wpisu.
+    """
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    started = time.perf_counter()
+    try:
+        return importlib.import_module(module_name)
+    except Exception as e:
+        _errors[f"import:{module_name}"] = str(e)
+        raise
+    finally:
+        _imports[module_name] = round(time.perf_counter() - started, 4)
+
+
+def mark_phase(name: str) -> None:
+    """Zapisuje moment (sekundy od startu procesu) osiągnięcia etapu startu."""
+    _phases[name] = round(time.time() - _PROCESS_STARTED, 4)
+
+
+def lazy_singleton(name: str) -> Callable[[Callable[[], T]], Callable[[], T]]:
+    """
+    Dekorator fabryki bez argumentów: instancja powstaje przy pierwszym użyciu
+    (lub rozgrzewce), jest współdzielona i chroniona blokadą. Czas budowy
+    trafia do raportu startu. Błąd nie jest zapamiętywany – kolejne wywołanie
+    spróbuje ponownie.
+    """
+
+    def decorator(factory: Callable[[], T]) -> Callable[[], T]:
+        state: Dict[str, Any] = {}
+        factory_lock = threading.Lock()
+
+        @wraps(factory)
+        def get() -> T:
+            if "value" in state:
+                return state["value"]
+            with factory_lock:
+                if "value" not in state:
+                    started = time.perf_counter()
+                    try:
+                        state["value"] = factory()
+                    except Exception as e:
+                        _errors[f"init:{name}"] = str(e)
+                        raise
+                    finally:
+                        _inits[name] = round(time.perf_counter() - started, 4)
+                    _errors.pop(f"init:{name}", None)
+                    logger.info("⚡ Zainicjalizowano %s w %.3fs.", name, _inits[name])
+            return state["value"]
+
+        get.is_ready = lambda: "value" in state
+        get.reset = lambda: state.clear()
+        return get
+
+    return decorator
+
+
+def startup_report() -> Dict[str, Any]:
+    """Czasy importów i inicjalizacji komponentów (od najwolniejszych)."""
+    return {
+        "phases": dict(_phases),
+        "imports": dict(sorted(_imports.items(), key=lambda kv: kv[1], reverse=True)),
+        "inits": dict(sorted(_inits.items(), key=lambda kv: kv[1], reverse=True)),
+        "errors": dict(_errors),
+    }
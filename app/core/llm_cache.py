@@ -0,0 +1,237 @@
+# app/core/llm_cache.py
+
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+from app.state.agent_state import shared_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Pola wiadomości (kwargs serializacji LangChain) bez wpływu na odpowiedź modelu
+_VOLATILE_MESSAGE_FIELDS = ("id", "response_metadata", "usage_metadata")
+# Listy wywołań narzędzi, których "id" jest losowe w każdym przebiegu
+_TOOL_CALL_LISTS = ("tool_calls", "invalid_tool_calls", "tool_call_chunks")
+
+
+def _normalize_text(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _normalize_text(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize_text(v) for v in value]
+    if isinstance(value, str):
+        return " ".join(value.split())
+    return value
+
+
+def _strip_volatile(messages: Any) -> Any:
+    """
+    Normalizuje zserializowane wiadomości (dumps) na potrzeby klucza cache.
+    Usuwa tylko pola zmienne w znanych miejscach: id wiadomości i metadane
+    odpowiedzi w kwargs. Losowe ID wywołań narzędzi (tool_calls[].id,
+    additional_kwargs.tool_calls[].id, tool_call_id) zastępuje kolejnymi
+    numerami, więc powiązanie wywołania z wynikiem zostaje w kluczu.
+    Identyfikatory klas serializacji (górne "id") nie są ruszane.
+    """
+    if not isinstance(messages, list):
+        return _normalize_text(messages)
+
+    call_ids: Dict[str, str] = {}
+
+    def _call_id(raw: Any) -> str:
+        return call_ids.setdefault(str(raw), f"call_{len(call_ids)}")
+
+    for message in messages:
+        kwargs = message.get("kwargs") if isinstance(message, dict) else None
+        if not isinstance(kwargs, dict):
+            continue
+        for field in _VOLATILE_MESSAGE_FIELDS:
+            kwargs.pop(field, None)
+        additional = kwargs.get("additional_kwargs")
+        for container in (kwargs, additional if isinstance(additional, dict) else {}):
+            for field in _TOOL_CALL_LISTS:
+                for call in container.get(field) or []:
+                    if isinstance(call, dict) and call.get("id") is not None:
+                        call["id"] = _call_id(call["id"])
+        if kwargs.get("tool_call_id") is not None:
+            kwargs["tool_call_id"] = _call_id(kwargs["tool_call_id"])
+    return _normalize_text(messages)
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """
+    Klucz cache: skrót znormalizowanych wiadomości i parametrów modelu
+    (llm_string zawiera m.in. model i temperaturę).
+    """
+    try:
+        normalized = json.dumps(_strip_volatile(json.loads(prompt)), sort_keys=True, ensure_ascii=False)
+    except (json.JSONDecodeError, TypeError):
+        normalized = " ".join(prompt.split())
+    return hashlib.sha256(f"{llm_string}\x00{normalized}".encode("utf-8")).hexdigest()
+
+
+class _StatsMixin:
+    def _init_stats(self) -> None:
+        self.stats: Counter = Counter()
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "backend": type(self).__name__,
+            **self.stats,
+            "hit_ratio": self.stats["hits"] / lookups if lookups else 0.0,
+        }
+
+
+class SQLiteLLMCache(_StatsMixin, BaseCache):
+    """
+    Lokalny cache odpowiedzi LLM w SQLite z TTL i limitem liczby wpisów
+    (usuwane najdawniej używane).
+    """
+
+    def __init__(self, path: Optional[Path] = None, ttl_seconds: Optional[float] = None, max_entries: int = 5000):
+        self._init_stats()
+        self.path = Path(path or os.getenv("LLM_CACHE_PATH", "data/llm_cache.sqlite"))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache(accessed)")
+        self._conn.commit()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        key = cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        self.stats["hits"] += 1
+        return loads(row[0])
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        key = cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, dumps(list(return_val)), now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                " SELECT key FROM llm_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+        self.stats["writes"] += 1
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+
+class RedisLLMCache(_StatsMixin, BaseCache):
+    """
+    Współdzielony cache odpowiedzi LLM w Redis: wpisy z TTL (EX),
+    a ZSET z czasem dostępu ogranicza liczbę wpisów (LRU).
+    """
+
+    def __init__(self, client, ttl_seconds: Optional[float] = None, max_entries: int = 5000, prefix: str = "llmcache"):
+        self._init_stats()
+        self.client = client
+        self.ttl_seconds = int(ttl_seconds) if ttl_seconds else None
+        self.max_entries = max_entries
+        self.prefix = prefix
+        self._lru_key = f"{prefix}:lru"
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        key = cache_key(prompt, llm_string)
+        raw = self.client.get(self._key(key))
+        if raw is None:
+            self.stats["misses"] += 1
+            return None
+        self.client.zadd(self._lru_key, {key: time.time()})
+        self.stats["hits"] += 1
+        return loads(raw)
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        key = cache_key(prompt, llm_string)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.set(self._key(key), dumps(list(return_val)), ex=self.ttl_seconds)
+        pipe.zadd(self._lru_key, {key: time.time()})
+        pipe.zcard(self._lru_key)
+        size = pipe.execute()[-1]
+        if size > self.max_entries:
+            stale = self.client.zrange(self._lru_key, 0, size - self.max_entries - 1)
+            if stale:
+                pipe = self.client.pipeline(transaction=False)
+                pipe.delete(*[self._key(k) for k in stale])
+                pipe.zrem(self._lru_key, *stale)
+                pipe.execute()
+        self.stats["writes"] += 1
+
+    def clear(self, **kwargs: Any) -> None:
+        keys = self.client.zrange(self._lru_key, 0, -1)
+        if keys:
+            self.client.delete(*[self._key(k) for k in keys])
+        self.client.delete(self._lru_key)
+
+
+_llm_cache: Optional[BaseCache] = None
+
+
+def get_llm_cache() -> Optional[BaseCache]:
+    """
+    Cache wg ENV LLM_CACHE: 'sqlite' (domyślnie), 'redis' (fallback do sqlite,
+    gdy Redis niedostępny) lub 'off'. TTL: LLM_CACHE_TTL_SECONDS, limit: LLM_CACHE_MAX_ENTRIES.
+    """
+    global _llm_cache
+    if _llm_cache is not None:
+        return _llm_cache
+
+    backend = os.getenv("LLM_CACHE", "sqlite").lower()
+    if backend == "off":
+        return None
+    ttl = float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400")) or None
+    max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+    if backend == "redis":
+        client = shared_redis_client()
+        if client is not None:
+            _llm_cache = RedisLLMCache(client, ttl_seconds=ttl, max_entries=max_entries)
+            return _llm_cache
+        logger.warning("Redis niedostępny – cache LLM w SQLite.")
+    _llm_cache = SQLiteLLMCache(ttl_seconds=ttl, max_entries=max_entries)
+    return _llm_cache
+
+
+def llm_cache_metrics() -> Dict[str, Any]:
+    cache = _llm_cache
+    return cache.metrics() if isinstance(cache, _StatsMixin) else {"backend": None}
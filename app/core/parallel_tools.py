@@ -0,0 +1,41 @@
+# app/core/parallel_tools.py
+
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, List
+
+from langchain_core.tools import BaseTool
+
+logger = logging.getLogger(__name__)
+
+TOOL_WORKERS = int(os.getenv("AGENT_TOOL_WORKERS", "8"))
+
+_pool = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="agent-tool")
+
+
+def _bounded_coroutine(func):
+    async def run(*args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_pool, partial(func, *args, **kwargs))
+
+    return run
+
+
+def with_bounded_pool(tools: List[BaseTool]) -> List[BaseTool]:
+    """
+    Kopie narzędzi, których wersja async wykonuje synchroniczną funkcję
+    we wspólnej, ograniczonej puli wątków (AGENT_TOOL_WORKERS). AgentExecutor
+    w trybie async uruchamia wszystkie wywołania z jednej tury przez
+    asyncio.gather, więc równoległość wyznacza rozmiar tej puli.
+    """
+    bounded = []
+    for tool in tools:
+        func = getattr(tool, "func", None)
+        if func is None or getattr(tool, "coroutine", None) is not None:
+            bounded.append(tool)
+            continue
+        bounded.append(tool.model_copy(update={"coroutine": _bounded_coroutine(func)}))
+    return bounded
@@ -0,0 +1,246 @@
+# app/core/pipeline.py
+
+import os
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.snapshot_delta import SnapshotDelta
+from app.core.snapshot_tracker import SnapshotTracker
+from app.modules.decision_tool import decide_orders_batch
+from app.modules.fetch_status_tool import check_fetch_status
+from app.modules.fetch_tool import resilient_fetch
+from app.modules.gmail_tool import send_gmail_emails
+from app.modules.s3_tool import latest_snapshot, read_snapshot, snapshot_records, EmptyInput
+from app.modules.snapshot_sanitizer_tool import (
+    SEGMENT_FIELD_ID,
+    WOJEWODZTWO_FIELD_ID,
+    SnapshotValidator,
+)
+from app.modules.whatsapp_tool import _send_whatsapp
+
+logger = logging.getLogger(__name__)
+
+# Błędy decyzji, których nie da się rozstrzygnąć regułami – trafiają do LLM
+ANOMALY_MARKERS = (
+    "Nie udało się rozpoznać województwa",
+    "nie występuje w tabeli",
+    "Błąd",
+)
+
+PIPELINE_MODES = ("agent", "parallel", "pipeline")
+
+
+def _notify_good_orders(records: List[Dict[str, Any]]) -> List[str]:
+    """E-maile wszystkich dobrych zleceń jednym połączeniem SMTP, WhatsApp per rekord."""
+    if not records:
+        return []
+    emails, whatsapp = [], []
+    for record in records:
+        cell = record.get("cellValuesByColumnId") or {}
+        record_id = str(record.get("id", ""))
+        segment = str(cell.get(SEGMENT_FIELD_ID, "")).strip()
+        wojewodztwo = str(cell.get(WOJEWODZTWO_FIELD_ID, "")).strip()
+        emails.append({
+            "subject": f"Zlecenie {record_id}",
+            "body": f"Nowe zlecenie spełnia kryteria.\nSegment: {segment}\nWojewództwo: {wojewodztwo}",
+        })
+        whatsapp.append(json.dumps({"1": record_id, "2": segment}, ensure_ascii=False))
+    notifications: List[str] = []
+    for email_result, message in zip(send_gmail_emails(emails), whatsapp):
+        notifications.extend([email_result, _send_whatsapp(message)])
+    return notifications
+
+
+def _notify_acquired_order(record: Dict[str, Any]) -> List[str]:
+    record_id = str(record.get("id", ""))
+    return [_send_whatsapp(json.dumps({"1": record_id, "2": "pozyskane"}, ensure_ascii=False))]
+
+
+def run_pipeline(
+    escalate: Optional[Callable[[str], str]] = None,
+    stream: Optional[bool] = None,
+    delta: Optional[bool] = None,
+) -> Dict[str, Any]:
+    """
+    Deterministyczny tryb przetwarzania – wykonuje sekwencję z agent.prompt.txt
+    (status fetch → s3 → sanityzacja/mapowanie/decyzja → gmail/whatsapp)
+    bezpośrednio w kodzie, bez rund LLM dla każdego kroku.
+    LLM (`escalate`) wołany jest tylko przy anomaliach: awarii fetch/S3
+    lub rekordach, których nie da się rozstrzygnąć tabelą preferencji.
+    stream=True (domyślnie ENV SNAPSHOT_STREAMING=1) czyta rekordy snapshotu
+    leniwie – w pamięci trzymane są tylko nowe rekordy.
+    delta=True (domyślnie ENV SNAPSHOT_DELTA=1) przetwarza tylko rekordy dodane
+    lub zmienione względem poprzednio przetworzonego snapshotu (SnapshotDelta);
+    zmieniony rekord jest ponownie oceniany i powiadamiany raz na wersję treści.
+    """
+    if stream is None:
+        stream = os.getenv("SNAPSHOT_STREAMING", "0") == "1"
+    if delta is None:
+        delta = os.getenv("SNAPSHOT_DELTA", "0") == "1"
+
+    result: Dict[str, Any] = {
+        "mode": "pipeline",
+        "processed": 0,
+        "decisions": [],
+        "invalid": [],
+        "validation": None,
+        "delta": None,
+        "notifications": [],
+        "anomalies": [],
+        "llm_output": None,
+    }
+
+    def _anomaly(stage: str, detail: str) -> None:
+        logger.warning("⚠️ Anomalia [%s]: %s", stage, detail)
+        result["anomalies"].append({"stage": stage, "detail": detail})
+
+    def _escalate() -> bool:
+        """
+        Przekazuje anomalie do LLM; True, gdy eskalacja zakończyła się bez błędu.
+        Bez obsługi eskalacji anomalie zostają tylko w wyniku i są traktowane
+        jak obsłużone – inaczej te same rekordy byłyby ponawiane bez końca.
+        """
+        if not result["anomalies"]:
+            return False
+        if escalate is None:
+            logger.info("Brak obsługi eskalacji – %d anomalii tylko w wyniku.", len(result["anomalies"]))
+            return True
+        summary = json.dumps(result["anomalies"], ensure_ascii=False)
+        logger.info("🤖 Przekazuję %d anomalii do LLM...", len(result["anomalies"]))
+        try:
+            result["llm_output"] = escalate(
+                "Tryb pipeline napotkał anomalie, których nie umie rozstrzygnąć. "
+                f"Przeanalizuj je i obsłuż zgodnie z instrukcją:\n{summary}"
+            )
+        except Exception as e:
+            logger.error("❌ Eskalacja anomalii do LLM nieudana: %s", e, exc_info=True)
+            result["llm_output"] = f"❌ Błąd eskalacji: {e}"
+            return False
+        return True
+
+    def _finish() -> Dict[str, Any]:
+        _escalate()
+        return result
+
+    # 1. Status fetch
+    logger.info("Uruchamiam fetch...")
+    status = check_fetch_status.func(EmptyInput())
+    if status.startswith("❌"):
+        started = resilient_fetch.func(EmptyInput())
+        if started.startswith("❌"):
+            _anomaly("fetch", f"{status} | {started}")
+            return _finish()
+
+    # 2. Snapshot
+    logger.info("Pobieram snapshot...")
+    # Jedno wykrycie klucza i jeden GET: rodzaj i rekordy pochodzą z tej samej treści
+    try:
+        snapshot = latest_snapshot()
+    except Exception as e:
+        _anomaly("s3", str(e))
+        return _finish()
+    kind = snapshot["kind"]
+    tracker = SnapshotTracker(kind=kind)
+
+    changes: Optional[Dict[str, Any]] = None
+    # Zmienione rekordy: ID już widziane, więc rozróżniane po wersji treści "<id>@<hash>"
+    revisions: Optional[SnapshotTracker] = None
+    revision_ids: Dict[str, str] = {}
+    if delta:
+        snapshot_delta = SnapshotDelta(kind=kind)
+        try:
+            changes = snapshot_delta.compute(snapshot)
+        except Exception as e:
+            _anomaly("s3", str(e))
+            return _finish()
+        # Dodane mogą być już powiadomione (także w trybie agenta) – przechodzą przez tracker.
+        # Zmienione trafiają do ponownej decyzji raz na wersję treści.
+        new_records = tracker.filter_new_records(changes["added"])
+        if changes["changed"]:
+            revisions = SnapshotTracker(kind=f"{kind}_revisions")
+            revision_ids = {
+                str(r["id"]): f"{r['id']}@{changes['hashes'][str(r['id'])]}" for r in changes["changed"]
+            }
+            fresh = {r["id"] for r in revisions.filter_new_records({"id": rev} for rev in revision_ids.values())}
+            new_records += [r for r in changes["changed"] if revision_ids[str(r["id"])] in fresh]
+        result["delta"] = {
+            "snapshot": changes["snapshot"],
+            "added": len(changes["added"]),
+            "changed": len(changes["changed"]),
+            "removed": len(changes["removed"]),
+        }
+    else:
+        try:
+            records = snapshot_records(snapshot) if stream else read_snapshot(snapshot).get("records") or []
+            new_records = tracker.filter_new_records(records)
+        except Exception as e:
+            _anomaly("s3", str(e))
+            return _finish()
+
+    def _commit_delta(pending_retry: bool) -> None:
+        # Indeks delty zapisywany dopiero po przetworzeniu. Przy rekordach do ponowienia
+        # zostaje stary – kolejna delta obejmie je znowu, a tracker odsieje już obsłużone.
+        if changes is None or changes["hashes"] is None:
+            return
+        if pending_retry:
+            logger.info("Indeks delty bez zmian – rekordy z anomaliami zostaną ponowione.")
+            return
+        snapshot_delta.commit(changes["snapshot"], changes["hashes"])
+
+    if not new_records:
+        logger.info("🟡 Brak nowych rekordów do przetworzenia.")
+        _commit_delta(pending_retry=False)
+        return _finish()
+
+    # 3. Analiza
+    escalated: List[Dict[str, Any]] = []
+    logger.info("Analizuję zlecenia (%s, %d nowych)...", kind, len(new_records))
+    if kind == "marcel":
+        for record in new_records:
+            result["notifications"].extend(_notify_acquired_order(record))
+    else:
+        validator = SnapshotValidator()
+        valid_records = list(validator.iter_valid(new_records))
+        result["validation"] = validator.stats()
+        result["invalid"] = [
+            {"id": record.get("id") if isinstance(record, dict) else None, "reason": reason}
+            for record, reason in validator.invalid
+        ]
+
+        decisions = decide_orders_batch(valid_records)
+        result["decisions"] = decisions
+        good_orders: List[Dict[str, Any]] = []
+        for record, verdict in zip(valid_records, decisions):
+            error = verdict["error"]
+            if error:
+                if any(marker in error for marker in ANOMALY_MARKERS):
+                    _anomaly("decision", f"{verdict['id']}: {error}")
+                    escalated.append(record)
+                continue
+            # 4. Komunikacja
+            if verdict["decision"] == "TAK":
+                good_orders.append(record)
+        if good_orders:
+            logger.info("Wysyłam e-maile (%d)...", len(good_orders))
+            result["notifications"].extend(_notify_good_orders(good_orders))
+
+    def _mark_seen(records: List[Dict[str, Any]]) -> None:
+        tracker.update_cache(records)
+        if revisions is not None:
+            revisions.update_cache(
+                {"id": revision_ids[str(r.get("id"))]} for r in records if str(r.get("id")) in revision_ids
+            )
+
+    result["processed"] = len(new_records)
+    # Wcześniej widziane ID już są w cache – wystarczy dopisać nowe. Rekordy
+    # przekazane do LLM trafiają do cache dopiero po udanej eskalacji.
+    escalated_ids = {str(r.get("id")) for r in escalated}
+    _mark_seen([r for r in new_records if str(r.get("id")) not in escalated_ids])
+    escalated_ok = _escalate()
+    if escalated_ok:
+        _mark_seen(escalated)
+    elif escalated:
+        logger.warning("⚠️ %d rekordów z anomaliami zostanie ponowionych w kolejnym przebiegu.", len(escalated))
+    _commit_delta(pending_retry=bool(escalated) and not escalated_ok)
+    return result
@@ -0,0 +1,253 @@
+# app/core/run_budget.py
+
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.tools import BaseTool
+
+from app.core.token_accounting import response_usage
+from app.core.tool_memo import SIDE_EFFECT_TOOLS
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINTS = ("cli", "api", "whatsapp")
+
+# Domyślne limity: (czas [s], tury LLM, tokeny, limit narzędzia [s])
+_DEFAULTS = {
+    "cli": (900, 30, 200_000, 120),
+    "api": (600, 25, 150_000, 90),
+    "whatsapp": (300, 15, 60_000, 60),
+}
+
+# Narzędzia, których wejście wskazuje rekordy uznane za przetworzone
+DECISION_TOOLS = {"decide_if_order_is_good", "decide_orders_batch"}
+
+# Liczniki wyczerpania budżetów i przekroczeń limitów narzędzi (od startu procesu)
+budget_metrics: Counter = Counter()
+
+_timeout_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RUN_BUDGET_TOOL_WORKERS", "8")), thread_name_prefix="tool-deadline"
+)
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, reason: str, detail: str):
+        super().__init__(f"Budżet przebiegu wyczerpany ({reason}): {detail}")
+        self.reason = reason
+        self.detail = detail
+
+
+class RunBudget:
+    """
+    Limity jednego przebiegu agenta. Wartości z ENV per punkt wejścia,
+    np. RUN_BUDGET_WHATSAPP_WALL_CLOCK_S, z fallbackiem na RUN_BUDGET_WALL_CLOCK_S
+    i wartości domyślne. 0 wyłącza dany limit.
+    """
+
+    def __init__(
+        self,
+        entry: str,
+        wall_clock_s: Optional[float],
+        max_iterations: Optional[int],
+        max_tokens: Optional[int],
+        tool_timeout_s: Optional[float],
+    ):
+        self.entry = entry
+        self.wall_clock_s = wall_clock_s or None
+        self.max_iterations = max_iterations or None
+        self.max_tokens = max_tokens or None
+        self.tool_timeout_s = tool_timeout_s or None
+
+    @classmethod
+    def for_entry(cls, entry: str) -> "RunBudget":
+        if entry not in _DEFAULTS:
+            raise ValueError(f"Nieznany punkt wejścia: {entry}. Dostępne: {', '.join(ENTRY_POINTS)}")
+
+        def _env(name: str, default: float) -> float:
+            raw = os.getenv(f"RUN_BUDGET_{entry.upper()}_{name}") or os.getenv(f"RUN_BUDGET_{name}")
+            return float(raw) if raw else default
+
+        wall, iterations, tokens, tool_timeout = _DEFAULTS[entry]
+        return cls(
+            entry,
+            wall_clock_s=_env("WALL_CLOCK_S", wall),
+            max_iterations=int(_env("MAX_ITERATIONS", iterations)),
+            max_tokens=int(_env("MAX_TOKENS", tokens)),
+            tool_timeout_s=_env("TOOL_TIMEOUT_S", tool_timeout),
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "entry": self.entry,
+            "wall_clock_s": self.wall_clock_s,
+            "max_iterations": self.max_iterations,
+            "max_tokens": self.max_tokens,
+            "tool_timeout_s": self.tool_timeout_s,
+        }
+
+
+def record_ids(payload: Any) -> List[str]:
+    """ID rekordów występujących w wejściu narzędzia (dict/list, także JSON zapisany w tekście)."""
+    ids: List[str] = []
+    stack = [payload]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str) and item.lstrip()[:1] in ("{", "["):
+            try:
+                stack.append(json.loads(item))
+            except json.JSONDecodeError:
+                pass
+        elif isinstance(item, dict):
+            if "id" in item and ("cellValuesByColumnId" in item or "fields" in item):
+                ids.append(str(item["id"]))
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+    return ids
+
+
+class BudgetGuard(BaseCallbackHandler):
+    """
+    Pilnuje budżetu w trakcie przebiegu: przed każdą turą LLM i wywołaniem
+    narzędzia sprawdza czas, liczbę tur i zużyte tokeny; po przekroczeniu
+    przerywa przebieg wyjątkiem BudgetExceeded. Zbiera ID rekordów, które
+    przeszły przez narzędzia decyzyjne, do wyniku częściowego.
+    """
+
+    raise_error = True
+    run_inline = True
+
+    def __init__(self, budget: RunBudget):
+        self.budget = budget
+        self.started = time.monotonic()
+        self.iterations = 0
+        self.tokens = 0
+        self.processed_records: List[str] = []
+        self.tool_calls: List[Dict[str, Any]] = []
+        self._pending: Dict[UUID, Dict[str, Any]] = {}
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def _check(self) -> None:
+        budget = self.budget
+        if budget.wall_clock_s and self.elapsed > budget.wall_clock_s:
+            raise BudgetExceeded("wall_clock", f"{self.elapsed:.1f}s > {budget.wall_clock_s}s")
+        if budget.max_iterations and self.iterations >= budget.max_iterations:
+            raise BudgetExceeded("iterations", f"{self.iterations} tur")
+        if budget.max_tokens and self.tokens >= budget.max_tokens:
+            raise BudgetExceeded("tokens", f"{self.tokens} > {budget.max_tokens}")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs) -> None:
+        self._check()
+        self.iterations += 1
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs) -> None:
+        self.tokens += int(response_usage(response).get("total_tokens") or 0)
+
+    def on_tool_start(self, serialized, input_str: str, *, run_id: UUID, **kwargs) -> None:
+        self._check()
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._pending[run_id] = {"tool": name, "input": kwargs.get("inputs") or input_str}
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs) -> None:
+        call = self._pending.pop(run_id, None)
+        if call is None:
+            return
+        self.tool_calls.append({"tool": call["tool"], "elapsed_s": round(self.elapsed, 3)})
+        if call["tool"] in DECISION_TOOLS:
+            for record_id in record_ids(call["input"]):
+                if record_id not in self.processed_records:
+                    self.processed_records.append(record_id)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "limits": self.budget.as_dict(),
+            "elapsed_s": round(self.elapsed, 3),
+            "iterations": self.iterations,
+            "tokens": self.tokens,
+            "tool_calls": len(self.tool_calls),
+        }
+
+
+def partial_result(guard: BudgetGuard, exc: BudgetExceeded) -> Dict[str, Any]:
+    """Wynik przebiegu przerwanego przez budżet; zdarzenie trafia do metryk."""
+    budget_metrics[f"exhausted:{guard.budget.entry}:{exc.reason}"] += 1
+    logger.warning("⏱️ %s (punkt wejścia: %s).", exc, guard.budget.entry)
+    return {
+        "output": f"⏱️ {exc}. Przetworzone rekordy: {len(guard.processed_records)}.",
+        "partial": True,
+        "budget_exhausted": exc.reason,
+        "processed_records": guard.processed_records,
+        "budget": guard.summary(),
+    }
+
+
+# --- Limity czasu narzędzi ---
+def _timeout_message(name: str, seconds: float) -> str:
+    budget_metrics[f"tool_timeout:{name}"] += 1
+    logger.warning("⏱️ Narzędzie %s przekroczyło limit %.0fs.", name, seconds)
+    return f"❌ Przekroczono limit czasu narzędzia {name} ({seconds:.0f}s)."
+
+
+def _sync_deadline(func, name: str, seconds: float):
+    def run(*args: Any, **kwargs: Any) -> Any:
+        future = _timeout_pool.submit(func, *args, **kwargs)
+        try:
+            return future.result(timeout=seconds)
+        except FutureTimeout:
+            # Wątek narzędzia kończy się w tle; agent dostaje komunikat o limicie
+            return _timeout_message(name, seconds)
+
+    return run
+
+
+def _async_deadline(coroutine, name: str, seconds: float):
+    async def run(*args: Any, **kwargs: Any) -> Any:
+        try:
+            return await asyncio.wait_for(coroutine(*args, **kwargs), timeout=seconds)
+        except asyncio.TimeoutError:
+            return _timeout_message(name, seconds)
+
+    return run
+
+
+def with_tool_timeouts(tools: List[BaseTool], seconds: Optional[float]) -> List[BaseTool]:
+    """
+    Kopie narzędzi z limitem czasu pojedynczego wywołania (sync i async).
+    Narzędzia z efektami ubocznymi (SIDE_EFFECT_TOOLS) zostają bez zmian: po
+    przekroczeniu limitu wątek wysyłałby dalej, a ponowione wywołanie agenta
+    mogłoby wysłać wiadomość drugi raz. Dla nich obowiązują limity transportu
+    (SMTP_TIMEOUT, timeout żądań HTTP).
+    """
+    if not seconds:
+        return list(tools)
+    limited = []
+    for tool in tools:
+        if tool.name in SIDE_EFFECT_TOOLS:
+            limited.append(tool)
+            continue
+        update = {}
+        if getattr(tool, "func", None) is not None:
+            update["func"] = _sync_deadline(tool.func, tool.name, seconds)
+        if getattr(tool, "coroutine", None) is not None:
+            update["coroutine"] = _async_deadline(tool.coroutine, tool.name, seconds)
+        limited.append(tool.model_copy(update=update) if update else tool)
+    return limited
+
+
+def budget_report() -> Dict[str, Any]:
+    return {
+        "limits": {entry: RunBudget.for_entry(entry).as_dict() for entry in ENTRY_POINTS},
+        "events": dict(budget_metrics),
+    }
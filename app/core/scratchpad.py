@@ -0,0 +1,158 @@
+# app/core/scratchpad.py
+
+import os
+import re
+import json
+from typing import Any, Callable, Dict, List, Tuple
+
+from langchain_core.agents import AgentAction
+
+from app.modules.snapshot_sanitizer_tool import SEGMENT_FIELD_ID, WOJEWODZTWO_FIELD_ID
+
+# Ostatnia obserwacja trafia do modelu (prawie) w całości, starsze jako skrót
+OBSERVATION_MAX_CHARS = int(os.getenv("AGENT_OBSERVATION_MAX_CHARS", "8000"))
+OLD_OBSERVATION_MAX_CHARS = int(os.getenv("AGENT_OLD_OBSERVATION_MAX_CHARS", "600"))
+FULL_STEPS = int(os.getenv("AGENT_SCRATCHPAD_FULL_STEPS", "1"))
+SUMMARY_ID_SAMPLE = 20
+POSTAL_CODE_RE = re.compile(r"^\d{2}-?\d{3}$")
+
+
+def _as_data(observation: Any) -> Any:
+    if isinstance(observation, (dict, list)):
+        return observation
+    if isinstance(observation, str) and observation[:1] in ("{", "["):
+        try:
+            return json.loads(observation)
+        except json.JSONDecodeError:
+            return None
+    return None
+
+
+def _as_text(observation: Any) -> str:
+    # Tak samo jak format_to_openai_function_messages
+    return observation if isinstance(observation, str) else json.dumps(observation, ensure_ascii=False)
+
+
+def _project_record(record: Any) -> Any:
+    """
+    Zostawia z rekordu tylko pola potrzebne do decyzji i mapowania:
+    id, segment, województwo i kod pocztowy.
+    """
+    if not isinstance(record, dict) or "cellValuesByColumnId" not in record:
+        return record
+    cells = record.get("cellValuesByColumnId") or {}
+    kept = {k: cells[k] for k in (SEGMENT_FIELD_ID, WOJEWODZTWO_FIELD_ID) if k in cells}
+    # Kod pocztowy (wejście mappera) nie ma stałego ID pola – rozpoznawany po formacie
+    kept.update(
+        (k, v) for k, v in cells.items()
+        if k not in kept and isinstance(v, str) and POSTAL_CODE_RE.match(v.strip())
+    )
+    return {"id": record.get("id"), "cellValuesByColumnId": kept}
+
+
+def _fit_items(items: List[Any], render: Callable[[List[Any], int], Any], max_chars: int) -> str:
+    """
+    JSON z najdłuższym prefiksem całych elementów `items`, który mieści się
+    w `max_chars`; render(zachowane, liczba_pominiętych) buduje obserwację.
+    Tekst nigdy nie jest cięty w środku struktury.
+    """
+    budget = max_chars - len(_as_text(render([], len(items))))
+    kept = 0
+    for item in items:
+        budget -= len(_as_text(item)) + 2  # separator ", "
+        if budget < 0:
+            break
+        kept += 1
+    text = _as_text(render(items[:kept], len(items) - kept))
+    while len(text) > max_chars and kept:
+        kept -= 1
+        text = _as_text(render(items[:kept], len(items) - kept))
+    return text
+
+
+def _fit_records(data: Dict[str, Any], records: List[Any], max_chars: int) -> str:
+    def _render(kept: List[Any], omitted: int) -> Dict[str, Any]:
+        marker = {"records_count": len(records), "records_omitted": omitted, "compacted": True} if omitted else {}
+        return {**data, "records": kept, **marker}
+    return _fit_items(records, _render, max_chars)
+
+
+def _fit_list(items: List[Any], max_chars: int) -> str:
+    def _render(kept: List[Any], omitted: int) -> List[Any]:
+        return kept + [{"items_omitted": omitted, "compacted": True}] if omitted else kept
+    return _fit_items(items, _render, max_chars)
+
+
+def _fit_dict(data: Dict[str, Any], max_chars: int) -> str:
+    def _render(kept: List[Tuple[str, Any]], omitted: int) -> Dict[str, Any]:
+        marker = {"keys_omitted": omitted, "compacted": True} if omitted else {}
+        return {**dict(kept), **marker}
+    return _fit_items(list(data.items()), _render, max_chars)
+
+
+def _recent(data: Any, max_chars: int) -> str:
+    """Ostatnia obserwacja: rekordy zawężone do pól decyzyjnych, cięcie tylko na granicy rekordu."""
+    if isinstance(data, dict) and isinstance(data.get("records"), list):
+        return _fit_records(data, [_project_record(r) for r in data["records"]], max_chars)
+    if isinstance(data, list):
+        return _fit_list([_project_record(r) for r in data], max_chars)
+    return _fit_dict(data, max_chars)
+
+
+def _summarize(data: Any, max_chars: int) -> str:
+    """Skrót starszej obserwacji: liczność i próbka ID rekordów zamiast treści."""
+    if isinstance(data, dict) and isinstance(data.get("records"), list):
+        records = data["records"]
+        scalars = {k: v for k, v in data.items() if k != "records" and not isinstance(v, (dict, list))}
+        ids = [r.get("id") for r in records[:SUMMARY_ID_SAMPLE] if isinstance(r, dict)]
+        return _fit_items(
+            ids,
+            lambda kept, _: {**scalars, "records_count": len(records), "record_ids_sample": kept, "compacted": True},
+            max_chars,
+        )
+    if isinstance(data, list):
+        summary = {"items_count": len(data), "first_item": data[0] if data else None, "compacted": True}
+        if len(_as_text(summary)) > max_chars:
+            del summary["first_item"]
+        return _as_text(summary)
+    return _fit_dict(data, max_chars)
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    # Tylko dla zwykłego tekstu – JSON skracany jest po całych elementach
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}… [obcięto {len(text) - max_chars} znaków]"
+
+
+def compact_observation(observation: Any, max_chars: int, keep_records: bool) -> str:
+    """
+    Zwraca tekst obserwacji mieszczący się (w miarę możliwości) w `max_chars`.
+    keep_records=True (ostatnia obserwacja): rekordy zawężone do id, segmentu,
+    województwa i kodu pocztowego, a nadmiar odcinany całymi rekordami – nigdy
+    skrót. Starsze obserwacje są streszczane do liczności i ID. JSON pozostaje
+    poprawny; obcinany jest wyłącznie zwykły tekst.
+    """
+    text = _as_text(observation)
+    if len(text) <= max_chars:
+        return text
+
+    data = _as_data(observation)
+    if not isinstance(data, (dict, list)):
+        return _truncate(text, max_chars)
+    return _recent(data, max_chars) if keep_records else _summarize(data, max_chars)
+
+
+def compact_intermediate_steps(steps: List[Tuple[AgentAction, Any]]) -> List[Tuple[AgentAction, str]]:
+    """
+    Hook `trim_intermediate_steps` dla AgentExecutor: duże obserwacje narzędzi
+    są kompaktowane, zanim wrócą do scratchpada. Pełne wyniki zostają
+    w `intermediate_steps` zwracanych przez executor.
+    """
+    compacted = []
+    for position, (action, observation) in enumerate(steps):
+        # Ostatnia obserwacja nigdy nie jest streszczana (także przy FULL_STEPS=0)
+        recent = position >= len(steps) - max(FULL_STEPS, 1)
+        limit = OBSERVATION_MAX_CHARS if recent else OLD_OBSERVATION_MAX_CHARS
+        compacted.append((action, compact_observation(observation, limit, keep_records=recent)))
+    return compacted
@@ -0,0 +1,224 @@
+# app/core/single_flight.py
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from app.state.agent_state import shared_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Przedłużenie dzierżawy tylko przez właściciela blokady
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class AlreadyInFlight(RuntimeError):
+    """Przebieg o tym kluczu już trwa (w tym lub innym procesie)."""
+
+
+def _settle(key: str, outcome: Dict[str, Any]) -> None:
+    if "result" not in outcome and "error" not in outcome:
+        outcome["error"] = f"Przebieg {key} przerwany przed zakończeniem"
+
+
+class SingleFlight:
+    """
+    Łączy równoległe wywołania o tym samym kluczu w jeden przebieg.
+    W procesie: kolejni wołający czekają na wynik trwającego przebiegu.
+    Między procesami (gdy Redis jest skonfigurowany): blokada SET NX z dzierżawą
+    odnawianą w tle; pozostali czekają na wynik zapisany w Redis przez właściciela.
+    claim() rejestruje przebieg prowadzony przez samego wołającego (np. strumień SSE).
+    """
+
+    def __init__(
+        self,
+        redis_client: Any = None,
+        lease_seconds: Optional[float] = None,
+        wait_timeout: Optional[float] = None,
+        poll_interval: float = 1.0,
+    ):
+        self._redis = redis_client
+        self._redis_resolved = redis_client is not None
+        self.lease_seconds = lease_seconds or float(os.getenv("SINGLE_FLIGHT_LEASE_SECONDS", "30"))
+        self.wait_timeout = wait_timeout or float(os.getenv("SINGLE_FLIGHT_WAIT_TIMEOUT", "1800"))
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._flights: Dict[str, Future] = {}
+
+    @property
+    def redis(self):
+        if not self._redis_resolved:
+            self._redis = shared_redis_client()
+            # Brak połączenia nie jest zapamiętywany – kolejne użycie spróbuje ponownie
+            self._redis_resolved = self._redis is not None
+        return self._redis
+
+    def in_flight(self, key: str) -> bool:
+        with self._lock:
+            return key in self._flights
+
+    @contextmanager
+    def claim(self, key: str):
+        """
+        Rejestruje przebieg wołającego pod kluczem `key` na czas bloku `with`
+        (w procesie i – z Redis – między procesami). Gdy przebieg już trwa,
+        rzuca AlreadyInFlight. Wywołania do() z tym kluczem dołączają do niego
+        i dostają to, co blok zapisze w outcome["result"] (lub outcome["error"]).
+        Blok zakończony bez żadnego z nich (np. klient rozłączył strumień) jest
+        traktowany jak przerwany – dołączający dostają błąd, a nie wynik None.
+        Z Redis wołać poza pętlą zdarzeń (asyncio.to_thread) – SET NX blokuje.
+        """
+        with self._lock:
+            if key in self._flights:
+                raise AlreadyInFlight(key)
+            future = self._flights[key] = Future()
+
+        try:
+            client = self.redis
+            if client is None:
+                outcome: Dict[str, Any] = {}
+                yield outcome
+                _settle(key, outcome)
+            else:
+                token = uuid.uuid4().hex
+                if not client.set(self._lock_key(key), token, nx=True, px=int(self.lease_seconds * 1000)):
+                    raise AlreadyInFlight(key)
+                with self._lease(key, token) as outcome:
+                    yield outcome
+                    _settle(key, outcome)  # przed publikacją wyniku w _lease
+            if "error" in outcome:
+                future.set_exception(RuntimeError(outcome["error"]))
+            else:
+                future.set_result(outcome.get("result"))
+        except BaseException as e:
+            # Przerwany strumień (GeneratorExit/anulowanie) – dołączający dostają błąd
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError(f"Przebieg {key} przerwany"))
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+
+    def do(self, key: str, func: Callable[[], Any]) -> Any:
+        """Uruchamia func() albo dołącza do trwającego przebiegu o tym samym kluczu."""
+        with self._lock:
+            future = self._flights.get(key)
+            leader = future is None
+            if leader:
+                future = self._flights[key] = Future()
+
+        if not leader:
+            logger.info("🔗 Dołączam do trwającego przebiegu %s.", key)
+            return future.result()
+
+        try:
+            result = self._do_distributed(key, func) if self.redis is not None else func()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+
+    # --- Redis ---
+    def _lock_key(self, key: str) -> str:
+        return f"singleflight:{key}:lock"
+
+    def _result_key(self, key: str, token: str) -> str:
+        return f"singleflight:{key}:result:{token}"
+
+    def _do_distributed(self, key: str, func: Callable[[], Any]) -> Any:
+        client = self.redis
+        lease_ms = int(self.lease_seconds * 1000)
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            token = uuid.uuid4().hex
+            if client.set(self._lock_key(key), token, nx=True, px=lease_ms):
+                return self._run_as_owner(key, token, func)
+
+            holder = client.get(self._lock_key(key))
+            if holder:
+                logger.info("🔗 Przebieg %s trwa w innym procesie, czekam na wynik.", key)
+                outcome = self._wait_for_result(key, holder, deadline)
+                if outcome is not None:
+                    if "error" in outcome:
+                        raise RuntimeError(outcome["error"])
+                    return outcome.get("result")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Przekroczono czas oczekiwania na przebieg {key}")
+
+    def _run_as_owner(self, key: str, token: str, func: Callable[[], Any]) -> Any:
+        with self._lease(key, token) as outcome:
+            outcome["result"] = func()
+            return outcome["result"]
+
+    @contextmanager
+    def _lease(self, key: str, token: str):
+        """Odnawia dzierżawę blokady w tle, a na końcu publikuje wynik i zwalnia blokadę."""
+        client = self.redis
+        lease_ms = int(self.lease_seconds * 1000)
+        stop = threading.Event()
+
+        def _renew():
+            while not stop.wait(self.lease_seconds / 3):
+                try:
+                    if not client.eval(_RENEW_SCRIPT, 1, self._lock_key(key), token, lease_ms):
+                        logger.warning("⚠️ Utracono dzierżawę przebiegu %s.", key)
+                        return
+                except Exception as e:
+                    logger.warning("⚠️ Błąd odnawiania dzierżawy %s: %s", key, e)
+
+        renewer = threading.Thread(target=_renew, name=f"singleflight-{key}", daemon=True)
+        renewer.start()
+        outcome: Dict[str, Any] = {}
+        try:
+            yield outcome
+        except BaseException as e:
+            outcome["error"] = str(e) or type(e).__name__
+            raise
+        finally:
+            stop.set()
+            try:
+                client.set(
+                    self._result_key(key, token),
+                    json.dumps(outcome, ensure_ascii=False, default=str),
+                    ex=max(60, int(self.lease_seconds * 2)),
+                )
+                client.eval(_RELEASE_SCRIPT, 1, self._lock_key(key), token)
+            except Exception as e:
+                logger.warning("⚠️ Nie można opublikować wyniku przebiegu %s: %s", key, e)
+
+    def _wait_for_result(self, key: str, token: str, deadline: float) -> Optional[Dict[str, Any]]:
+        """Czeka na wynik właściciela `token`; None, gdy blokada zniknęła bez wyniku."""
+        client = self.redis
+        while time.monotonic() < deadline:
+            raw = client.get(self._result_key(key, token))
+            if raw:
+                return json.loads(raw)
+            if client.get(self._lock_key(key)) != token:
+                # Właściciel mógł właśnie zapisać wynik – ostatnie sprawdzenie
+                raw = client.get(self._result_key(key, token))
+                return json.loads(raw) if raw else None
+            time.sleep(self.poll_interval)
+        return None
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,121 @@
+# app/core/snapshot_delta.py
+
+import os
+import json
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from app.modules.s3_tool import latest_snapshot, snapshot_records, stream_snapshot_records
+from app.modules.snapshot_sanitizer_tool import SEGMENT_FIELD_ID, WOJEWODZTWO_FIELD_ID
+
+logger = logging.getLogger(__name__)
+
+# Pola, których zmiana wpływa na decyzję – tylko one są hashowane
+DEFAULT_DELTA_FIELDS: Sequence[str] = (SEGMENT_FIELD_ID, WOJEWODZTWO_FIELD_ID)
+
+
+def record_hash(record: Dict[str, Any], fields: Sequence[str] = DEFAULT_DELTA_FIELDS) -> str:
+    cell = record.get("cellValuesByColumnId") or {}
+    payload = json.dumps([cell.get(f) for f in fields], ensure_ascii=False, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class SnapshotDelta:
+    """
+    Wylicza różnicę rekordów między kolejnymi snapshotami: added / changed / removed.
+    Trzyma trwały indeks {id rekordu: hash pól} ostatnio przetworzonego snapshotu,
+    więc poprzedni snapshot nie jest ponownie czytany – najnowszy jest przeglądany
+    strumieniowo, a w pamięci zostają tylko zmienione rekordy.
+    """
+
+    def __init__(self, kind: str = "motoassist", fields: Sequence[str] = DEFAULT_DELTA_FIELDS):
+        self.kind = kind
+        self.fields = tuple(fields)
+        self.index_path = Path(os.getenv("SNAPSHOT_DELTA_DIR", "data")) / f"{kind}_record_hashes.json"
+
+    def _load_index(self) -> Optional[Dict[str, Any]]:
+        if not self.index_path.is_file():
+            return None
+        try:
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+            if data.get("fields") == list(self.fields):
+                return data
+            logger.info("Zmieniona lista pól delty – przebudowuję indeks %s.", self.index_path)
+        except (json.JSONDecodeError, AttributeError) as e:
+            logger.error("Błąd dekodowania indeksu delty %s: %s", self.index_path, e)
+        return None
+
+    def _save_index(self, snapshot_key: str, hashes: Dict[str, str]) -> None:
+        payload = {"snapshot": snapshot_key, "fields": list(self.fields), "hashes": hashes}
+        tmp = self.index_path.with_suffix(".tmp")
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(payload, separators=(",", ":")), encoding="utf-8")
+            tmp.replace(self.index_path)
+        except OSError as e:
+            logger.error("Błąd zapisu indeksu delty do %s: %s", self.index_path, e)
+
+    def _hash_records(self, records: Iterable[Dict[str, Any]]) -> Dict[str, str]:
+        return {str(r["id"]): record_hash(r, self.fields) for r in records if r.get("id")}
+
+    def diff(
+        self,
+        records: Iterable[Dict[str, Any]],
+        previous_hashes: Dict[str, str],
+    ) -> Dict[str, Any]:
+        """
+        Porównuje rekordy (np. generator) z indeksem hashy poprzedniego snapshotu.
+        Zwraca {'added': [...], 'changed': [...], 'removed': [id, ...], 'hashes': {...}}.
+        """
+        added: List[Dict[str, Any]] = []
+        changed: List[Dict[str, Any]] = []
+        hashes: Dict[str, str] = {}
+        for record in records:
+            record_id = record.get("id")
+            if not record_id:
+                continue
+            record_id = str(record_id)
+            digest = record_hash(record, self.fields)
+            hashes[record_id] = digest
+            old = previous_hashes.get(record_id)
+            if old is None:
+                added.append(record)
+            elif old != digest:
+                changed.append(record)
+        removed = [rid for rid in previous_hashes if rid not in hashes]
+        return {"added": added, "changed": changed, "removed": removed, "hashes": hashes}
+
+    def compute(self, snapshot: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Delta najnowszego snapshotu (wynik latest_snapshot(); domyślnie pobierany
+        tutaj) względem ostatnio przetworzonego (indeks).
+        Przy pierwszym uruchomieniu indeks budowany jest z poprzedniego snapshotu w S3.
+        Indeks nie jest tu zapisywany – zwrócone 'hashes' należy przekazać do
+        commit() dopiero po udanym przetworzeniu delty.
+        """
+        snapshot = snapshot or latest_snapshot()
+        latest_key, previous_key = snapshot["key"], snapshot["previous_key"]
+        index = self._load_index()
+
+        if index and index.get("snapshot") == latest_key:
+            logger.info("🟡 Snapshot %s już przetworzony – pusta delta.", latest_key)
+            return {"snapshot": latest_key, "added": [], "changed": [], "removed": [], "hashes": None}
+
+        if not index:
+            logger.info("Odbudowuję indeks delty z poprzedniego snapshotu %s...", previous_key)
+            previous_hashes = self._hash_records(stream_snapshot_records(previous_key))
+        else:
+            previous_hashes = index["hashes"]
+
+        delta = self.diff(snapshot_records(snapshot), previous_hashes)
+        logger.info(
+            "Delta %s: dodane=%d, zmienione=%d, usunięte=%d",
+            latest_key, len(delta["added"]), len(delta["changed"]), len(delta["removed"])
+        )
+        return {"snapshot": latest_key, **delta}
+
+    def commit(self, snapshot_key: str, hashes: Dict[str, str]) -> None:
+        """Zapisuje indeks snapshotu po jego udanym przetworzeniu (hashes z compute())."""
+        self._save_index(snapshot_key, hashes)
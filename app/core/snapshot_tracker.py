@@ -1,61 +1,549 @@
+import os
 import json
+import time
 import logging
+from collections import Counter
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.state.agent_state import shared_redis_client
+from app.utils.bloom_filter import BloomFilter
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from redis.exceptions import ResponseError as RedisResponseError, WatchError as RedisWatchError
+except ImportError:
+    class RedisResponseError(Exception):
+        pass
+
+    class RedisWatchError(Exception):
+        pass
 
 # Konfiguracja logowania
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+BATCH_SIZE = 1000
+
+
+class LocalSeenStore:
+    """
+    Lokalny magazyn przetworzonych identyfikatorów.
+    W pamięci: dict id -> znacznik czasu (członkostwo O(1)).
+    Na dysku: dziennik append-only `<kind>_seen_records.log` (linie "id<TAB>ts"),
+    okresowo kompaktowany przez zapis do pliku tymczasowego i atomowy rename.
+    Identyfikatory starsze niż `ttl_seconds` są pomijane i usuwane przy kompakcji.
+    """
+
+    def __init__(self, cache_dir: Path, kind: str, ttl_seconds: Optional[float] = None):
+        self.log_path = cache_dir / f"{kind}_seen_records.log"
+        self.legacy_path = cache_dir / f"{kind}_seen_records.json"
+        self.ttl_seconds = ttl_seconds
+        self._seen: Dict[str, float] = {}
+        self._log_lines = 0
+        self._load()
+
+    # --- Ładowanie ---
+    def _load(self) -> None:
+        if self.log_path.is_file():
+            with self.log_path.open(encoding="utf-8") as fh:
+                for line in fh:
+                    record_id, _, ts = line.rstrip("\n").partition("\t")
+                    if not record_id:
+                        continue
+                    self._log_lines += 1
+                    try:
+                        self._seen[record_id] = float(ts)
+                    except ValueError:
+                        self._seen[record_id] = time.time()
+        elif self.legacy_path.is_file():
+            self._migrate_legacy()
+
+        expired = self._evict_expired()
+        if expired:
+            logger.info("Usunięto %d przeterminowanych identyfikatorów z %s", expired, self.log_path)
+        if expired or self._needs_compaction():
+            self.compact()
+
+    def _migrate_legacy(self) -> None:
+        try:
+            data = json.loads(self.legacy_path.read_text(encoding="utf-8"))
+        except json.JSONDecodeError as e:
+            logger.error("Błąd dekodowania JSON w %s: %s", self.legacy_path, e)
+            return
+        if not isinstance(data, list):
+            logger.warning("Zawartość %s nie jest listą, restartuję cache.", self.legacy_path)
+            return
+        now = time.time()
+        self._seen = {str(i): now for i in data}
+        self.compact()
+        logger.info("Przeniesiono %d identyfikatorów z %s do %s", len(self._seen), self.legacy_path, self.log_path)
+
+    def _evict_expired(self) -> int:
+        if not self.ttl_seconds:
+            return 0
+        horizon = time.time() - self.ttl_seconds
+        expired = [rid for rid, ts in self._seen.items() if ts < horizon]
+        for rid in expired:
+            del self._seen[rid]
+        return len(expired)
+
+    def _needs_compaction(self) -> bool:
+        # Kompakcja, gdy dziennik ma ponad dwukrotnie więcej linii niż żywych ID
+        return self._log_lines > 2 * max(len(self._seen), 1000)
+
+    # --- API magazynu ---
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def ids(self):
+        return self._seen.keys()
+
+    def first_seen(self) -> Dict[str, float]:
+        """Żywe ID z czasem pierwszego przetworzenia."""
+        return dict(self._seen)
+
+    def contains_many(self, ids: List[str]) -> List[bool]:
+        seen = self._seen
+        return [rid in seen for rid in ids]
+
+    def add_many(self, ids: Iterable[str]) -> int:
+        """Dopisuje nowe identyfikatory na końcu dziennika. Zwraca liczbę dopisanych."""
+        now = time.time()
+        fresh = [rid for rid in dict.fromkeys(ids) if rid not in self._seen]
+        if not fresh:
+            return 0
+        with self.log_path.open("a", encoding="utf-8") as fh:
+            fh.writelines(f"{rid}\t{now}\n" for rid in fresh)
+        for rid in fresh:
+            self._seen[rid] = now
+        self._log_lines += len(fresh)
+        if self._needs_compaction():
+            self.compact()
+        return len(fresh)
+
+    def compact(self) -> None:
+        """Przepisuje dziennik tylko z żywymi ID (plik tymczasowy + atomowy rename)."""
+        self._evict_expired()
+        tmp = self.log_path.with_suffix(".log.tmp")
+        with tmp.open("w", encoding="utf-8") as fh:
+            fh.writelines(f"{rid}\t{ts}\n" for rid, ts in self._seen.items())
+        os.replace(tmp, self.log_path)
+        self._log_lines = len(self._seen)
+
+
+class RedisSeenStore:
+    """
+    Współdzielony magazyn przetworzonych identyfikatorów w Redis: ZSET per rodzaj
+    snapshotu, wynik = czas pierwszego przetworzenia. Sprawdzenie całej porcji ID
+    to jedno ZMSCORE, dopisanie – potokowane ZADD NX.
+    TTL działa per ID, jak w LocalSeenStore: ID starsze niż `ttl_seconds` nie są
+    traktowane jako widziane i są usuwane (ZREMRANGEBYSCORE) przy zapisie.
+    """
+
+    def __init__(self, client, kind: str, ttl_seconds: Optional[float] = None):
+        self.client = client
+        prefix = os.getenv("SNAPSHOT_TRACKER_REDIS_PREFIX", "tracker")
+        self.key = f"{prefix}:{kind}:seen_at"
+        self.ttl_seconds = ttl_seconds or None
+        self.log_path = f"redis://{self.key}"
+
+    def _horizon(self) -> float:
+        return time.time() - self.ttl_seconds if self.ttl_seconds else float("-inf")
+
+    def __len__(self) -> int:
+        return int(self.client.zcount(self.key, self._horizon(), "+inf"))
+
+    def ids(self):
+        return set(self.client.zrangebyscore(self.key, self._horizon(), "+inf"))
+
+    def contains_many(self, ids: List[str]) -> List[bool]:
+        if not ids:
+            return []
+        try:
+            scores = self.client.zmscore(self.key, ids)
+        except RedisResponseError as e:
+            # Redis < 6.2 nie zna ZMSCORE – jeden potok ZSCORE
+            logger.warning("ZMSCORE niedostępne (%s), używam potoku ZSCORE.", e)
+            pipe = self.client.pipeline(transaction=False)
+            for rid in ids:
+                pipe.zscore(self.key, rid)
+            scores = pipe.execute()
+        horizon = self._horizon()
+        return [score is not None and float(score) >= horizon for score in scores]
+
+    def add_many(self, ids: Iterable[str]) -> int:
+        return self.seed(dict.fromkeys(ids, time.time()))
+
+    def seed(self, first_seen: Dict[str, float]) -> int:
+        """Dopisuje ID z czasem pierwszego przetworzenia (istniejące wpisy bez zmian)."""
+        items = list(first_seen.items())
+        if not items:
+            return 0
+        pipe = self.client.pipeline(transaction=False)
+        if self.ttl_seconds:
+            # Najpierw przeterminowane – inaczej ZADD NX nie odświeżyłby ich czasu
+            pipe.zremrangebyscore(self.key, "-inf", f"({self._horizon()}")
+        for start in range(0, len(items), BATCH_SIZE):
+            pipe.zadd(self.key, dict(items[start:start + BATCH_SIZE]), nx=True)
+        results = pipe.execute()
+        return sum(results[1:] if self.ttl_seconds else results)
+
+
+class BloomPrefilteredStore:
+    """
+    Warstwa filtra Blooma przed dokładnym magazynem (lokalnym lub Redis).
+    Wynik negatywny filtra = rekord na pewno nowy, bez zapytania do magazynu.
+    Wynik pozytywny jest domyślnie weryfikowany w magazynie; przy
+    trust_positives=True traktowany jest jako "widziany" (ryzyko = error_rate).
+
+    Filtr trzymany jest jako bitmapa w Redis (klucz `:bloom:bits` + parametry
+    w `:bloom:meta`) albo w pliku. Zapis nie nadpisuje bitów innych replik:
+    w Redis nowe ID ustawiają tylko swoje bity (BITFIELD SET w potoku), a plik
+    jest łączony (OR) z wersją na dysku pod blokadą.
+    Gdy magazyn dokładny ma TTL, filtr jest przebudowywany z żywych ID co
+    `ttl_seconds` (oraz po przekroczeniu pojemności) – ID usunięte przez TTL
+    nie zostają w nim na zawsze.
+    """
+
+    def __init__(
+        self,
+        exact,
+        kind: str,
+        cache_dir: Path,
+        capacity: int,
+        error_rate: float,
+        trust_positives: bool = False,
+        redis_client=None,
+    ):
+        self.exact = exact
+        self.kind = kind
+        self.log_path = exact.log_path
+        self.trust_positives = trust_positives
+        self.rotate_seconds = getattr(exact, "ttl_seconds", None)
+        self.stats: Counter = Counter()
+        self._redis = redis_client
+        prefix = os.getenv("SNAPSHOT_TRACKER_REDIS_PREFIX", "tracker")
+        self._bits_key = f"{prefix}:{kind}:bloom:bits"
+        self._meta_key = f"{prefix}:{kind}:bloom:meta"
+        self._path = cache_dir / f"{kind}_seen_records.bloom"
+        self._lock_path = cache_dir / f"{kind}_seen_records.bloom.lock"
+
+        self.bloom = BloomFilter(capacity, error_rate)
+        if not self._load() or self._needs_rotation():
+            self._rebuild()
+
+    # --- Wczytanie i przebudowa ---
+    def _load(self) -> bool:
+        if self._redis is None:
+            bloom = BloomFilter.load(self._path, self.bloom.capacity, self.bloom.error_rate)
+            if bloom is None:
+                return False
+            self.bloom = bloom
+            return True
+        return self._adopt_meta(self._redis.hgetall(self._meta_key))
+
+    def _adopt_meta(self, raw: Dict) -> bool:
+        """Przejmuje count/created_at z parametrów filtra w Redis, jeśli pasują do konfiguracji."""
+        meta = {_text(k): _text(v) for k, v in raw.items()}
+        try:
+            params = (int(meta["capacity"]), float(meta["error_rate"]), int(meta["k"]), int(meta["m"]))
+            count, created_at = int(meta.get("count", 0)), float(meta["created_at"])
+        except (KeyError, ValueError):
+            return False
+        bloom = self.bloom
+        if params != (bloom.capacity, bloom.error_rate, bloom.k, bloom.m):
+            logger.info("Zmienione parametry filtra Blooma – przebudowa %s.", self._bits_key)
+            return False
+        bloom.count, bloom.created_at = count, created_at
+        return True
+
+    def _needs_rotation(self) -> bool:
+        bloom = self.bloom
+        if bloom.count > bloom.capacity:
+            return True
+        return bool(self.rotate_seconds) and time.time() - bloom.created_at >= self.rotate_seconds
+
+    def _build(self) -> BloomFilter:
+        bloom = BloomFilter(self.bloom.capacity, self.bloom.error_rate)
+        bloom.update(self.exact.ids())
+        return bloom
+
+    def _rebuild(self) -> None:
+        """Nowy filtr z żywych ID magazynu dokładnego, zastępujący poprzedni."""
+        if self._redis is None:
+            bloom = self._build()
+            with _file_lock(self._lock_path):
+                bloom.save(self._path)
+            self.bloom = bloom
+        elif not self._rebuild_redis():
+            logger.warning("Nie udało się przebudować filtra Blooma %s – ponowię przy zapisie.", self._bits_key)
+            return
+        logger.info(
+            "Zbudowano filtr Blooma dla %s: %d ID, %d B, k=%d",
+            self.kind, self.bloom.count, self.bloom.size_bytes, self.bloom.k
+        )
+
+    def _rebuild_redis(self, attempts: int = 3) -> bool:
+        # WATCH na parametrach: zapis innej repliki (HINCRBY count) w trakcie budowy
+        # przerywa transakcję, więc jej bity nie giną przy podmianie bitmapy
+        for _ in range(attempts):
+            with self._redis.pipeline() as pipe:
+                try:
+                    pipe.watch(self._meta_key)
+                    if self._adopt_meta(pipe.hgetall(self._meta_key)) and not self._needs_rotation():
+                        return True  # inna replika właśnie przebudowała filtr
+                    bloom = self._build()
+                    pipe.multi()
+                    pipe.set(self._bits_key, bytes(bloom.bits))
+                    pipe.delete(self._meta_key)
+                    pipe.hset(self._meta_key, mapping={
+                        "capacity": bloom.capacity,
+                        "error_rate": repr(bloom.error_rate),
+                        "k": bloom.k,
+                        "m": bloom.m,
+                        "count": bloom.count,
+                        "created_at": repr(bloom.created_at),
+                    })
+                    pipe.execute()
+                except RedisWatchError:
+                    continue
+            self.bloom = bloom
+            return True
+        return False
+
+    # --- Bity filtra ---
+    def _might_contain(self, ids: List[str]) -> List[bool]:
+        if self._redis is None:
+            bloom = self.bloom
+            return [rid in bloom for rid in ids]
+        pipe = self._redis.pipeline(transaction=False)
+        for rid in ids:
+            op = pipe.bitfield(self._bits_key)
+            for pos in self.bloom.positions(rid):
+                op.get("u1", pos)
+            op.execute()
+        return [all(bits) for bits in pipe.execute()]
+
+    def _set_bits(self, ids: List[str], added: int) -> None:
+        if self._redis is None:
+            self._set_bits_file(ids)
+            return
+        pipe = self._redis.pipeline(transaction=False)
+        for rid in ids:
+            op = pipe.bitfield(self._bits_key)
+            for pos in self.bloom.positions(rid):
+                op.set("u1", pos, 1)
+            op.execute()
+        pipe.hincrby(self._meta_key, "count", added)
+        self.bloom.count = int(pipe.execute()[-1])
+
+    def _set_bits_file(self, ids: List[str]) -> None:
+        with _file_lock(self._lock_path):
+            on_disk = BloomFilter.load(self._path, self.bloom.capacity, self.bloom.error_rate)
+            if on_disk is not None and on_disk.created_at > self.bloom.created_at:
+                self.bloom = on_disk  # inny proces przebudował filtr
+            elif on_disk is not None and on_disk.created_at == self.bloom.created_at:
+                self.bloom.merge(on_disk)
+            self.bloom.update(rid for rid in ids if rid not in self.bloom)
+            self.bloom.save(self._path)
+
+    # --- API magazynu ---
+    def __len__(self) -> int:
+        return len(self.exact)
+
+    def ids(self):
+        return self.exact.ids()
+
+    def contains_many(self, ids: List[str]) -> List[bool]:
+        candidates = [i for i, maybe in enumerate(self._might_contain(ids)) if maybe]
+        self.stats["checks"] += len(ids)
+        self.stats["bloom_negative"] += len(ids) - len(candidates)
+        self.stats["bloom_positive"] += len(candidates)
+
+        flags = [False] * len(ids)
+        if self.trust_positives:
+            for i in candidates:
+                flags[i] = True
+            return flags
+
+        exact_flags = self.exact.contains_many([ids[i] for i in candidates]) if candidates else []
+        self.stats["exact_lookups"] += len(candidates)
+        for i, seen in zip(candidates, exact_flags):
+            flags[i] = seen
+            if not seen:
+                self.stats["false_positives"] += 1
+        return flags
+
+    def add_many(self, ids: Iterable[str]) -> int:
+        ids = list(dict.fromkeys(ids))
+        added = self.exact.add_many(ids)
+        self._after_write(ids, added)
+        return added
+
+    def seed(self, first_seen: Dict[str, float]) -> int:
+        """Jak RedisSeenStore.seed – z ustawieniem bitów przeniesionych ID."""
+        added = self.exact.seed(first_seen)
+        self._after_write(list(first_seen), added)
+        return added
+
+    def _after_write(self, ids: List[str], added: int) -> None:
+        if self._needs_rotation():
+            # Przebudowa z magazynu dokładnego obejmuje też właśnie dopisane ID
+            self._rebuild()
+        elif ids:
+            self._set_bits(ids, added)
+
+    def metrics(self) -> Dict[str, Any]:
+        checks = self.stats["checks"] or 1
+        positives = self.stats["bloom_positive"] or 1
+        return {
+            **self.stats,
+            "bloom_negative_ratio": self.stats["bloom_negative"] / checks,
+            "bloom_positive_ratio": self.stats["bloom_positive"] / checks,
+            "false_positive_ratio": self.stats["false_positives"] / positives,
+            "bloom_items": self.bloom.count,
+            "bloom_bytes": self.bloom.size_bytes,
+            "bloom_age_s": round(time.time() - self.bloom.created_at),
+        }
+
+
+def _text(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+@contextmanager
+def _file_lock(path: Path):
+    # Blokada między procesami na tym samym hoście (bez fcntl, np. Windows – bez blokady)
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _seed_from_local(store, cache_dir: Path, kind: str, ttl_seconds: Optional[float]) -> int:
+    """
+    Przy pierwszym użyciu Redis na tej instancji przenosi do niego lokalnie widziane ID
+    (z oryginalnym czasem), żeby przełączenie backendu nie powtórzyło powiadomień.
+    Znacznik `<kind>_seen_records.redis-seeded` zapobiega ponownemu przenoszeniu;
+    lokalny dziennik zostaje jako zapas na wypadek niedostępności Redis.
+    """
+    marker = cache_dir / f"{kind}_seen_records.redis-seeded"
+    if marker.is_file():
+        return 0
+    local_files = (cache_dir / f"{kind}_seen_records.log", cache_dir / f"{kind}_seen_records.json")
+    seeded = 0
+    if any(path.is_file() for path in local_files):
+        local = LocalSeenStore(cache_dir, kind, ttl_seconds=ttl_seconds)
+        seeded = store.seed(local.first_seen())
+        logger.info("Przeniesiono %d lokalnych identyfikatorów do %s", seeded, store.log_path)
+    marker.write_text(str(store.log_path), encoding="utf-8")
+    return seeded
+
+
+def _make_store(cache_dir: Path, kind: str, ttl_seconds: Optional[float]):
+    """
+    Wybiera magazyn wg ENV SNAPSHOT_TRACKER_BACKEND: 'auto' (domyślnie: Redis,
+    jeśli dostępny, w przeciwnym razie lokalny), 'redis' lub 'local'.
+    Opcjonalny filtr Blooma: SNAPSHOT_TRACKER_BLOOM=1 (+ _CAPACITY, _ERROR_RATE,
+    _TRUST_POSITIVES).
+    """
+    backend = os.getenv("SNAPSHOT_TRACKER_BACKEND", "auto").lower()
+    store = None
+    if backend in ("auto", "redis"):
+        client = shared_redis_client()
+        if client is not None:
+            store = RedisSeenStore(client, kind, ttl_seconds=ttl_seconds)
+        elif backend == "redis":
+            logger.warning("Redis niedostępny – SnapshotTracker używa lokalnego magazynu.")
+    if store is None:
+        store = LocalSeenStore(cache_dir, kind, ttl_seconds=ttl_seconds)
+
+    if os.getenv("SNAPSHOT_TRACKER_BLOOM", "0") == "1":
+        store = BloomPrefilteredStore(
+            store,
+            kind,
+            cache_dir,
+            capacity=int(os.getenv("SNAPSHOT_TRACKER_BLOOM_CAPACITY", "1000000")),
+            error_rate=float(os.getenv("SNAPSHOT_TRACKER_BLOOM_ERROR_RATE", "0.001")),
+            trust_positives=os.getenv("SNAPSHOT_TRACKER_BLOOM_TRUST_POSITIVES", "0") == "1",
+            redis_client=store.client if isinstance(store, RedisSeenStore) else None,
+        )
+    if isinstance(getattr(store, "exact", store), RedisSeenStore):
+        # Po nałożeniu filtra – przeniesione ID muszą trafić także do jego bitów
+        _seed_from_local(store, cache_dir, kind, ttl_seconds)
+    return store
+
+
 class SnapshotTracker:
     """
-    Śledzi już przetworzone rekordy, zapisując ich identyfikatory w pliku JSON.
+    Śledzi już przetworzone rekordy, zapisując ich identyfikatory w Redis
+    (współdzielone między replikami) lub w lokalnym magazynie.
+    TTL identyfikatorów: ENV SNAPSHOT_TRACKER_TTL_DAYS (domyślnie bez wygasania).
     """
-    def __init__(self, kind: str = "motoassist"):
+    def __init__(self, kind: str = "motoassist", ttl_days: Optional[float] = None):
         self.kind = kind
         # Upewnij się, że katalog na pliki cache istnieje
         self.cache_dir = Path("data")
         self.cache_dir.mkdir(parents=True, exist_ok=True)
-        # Ścieżka do pliku z zapisanymi id
-        self.cache_path = self.cache_dir / f"{kind}_seen_records.json"
-        self.seen_ids = self._load_seen_ids()
-
-    def _load_seen_ids(self) -> List[str]:
-        if self.cache_path.is_file():
-            try:
-                data = json.loads(self.cache_path.read_text(encoding="utf-8"))
-                if isinstance(data, list):
-                    return [str(i) for i in data]
-                else:
-                    logger.warning("Zawartość %s nie jest listą, restartuję cache.", self.cache_path)
-            except json.JSONDecodeError as e:
-                logger.error("Błąd dekodowania JSON w %s: %s", self.cache_path, e)
-        return []
-
-    def filter_new_records(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if ttl_days is None:
+            ttl_days = float(os.getenv("SNAPSHOT_TRACKER_TTL_DAYS", "0"))
+        self.store = _make_store(self.cache_dir, kind, ttl_days * 86400 or None)
+        self.cache_path = self.store.log_path
+
+    @property
+    def seen_ids(self):
+        return self.store.ids()
+
+    def filter_new_records(self, records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         Zwraca listę rekordów, których identyfikatory nie były wcześniej przetworzone.
         """
         new_records: List[Dict[str, Any]] = []
+        batch: List[Dict[str, Any]] = []
+
+        def _flush() -> None:
+            flags = self.store.contains_many([str(r["id"]) for r in batch])
+            new_records.extend(record for record, seen in zip(batch, flags) if not seen)
+            batch.clear()
+
+        # Sprawdzanie porcjami – także dla generatorów, bez materializacji całego snapshotu
         for record in records:
-            record_id = record.get("id")
-            if record_id:
-                record_id_str = str(record_id)
-                if record_id_str not in self.seen_ids:
-                    new_records.append(record)
+            if record.get("id"):
+                batch.append(record)
+                if len(batch) >= BATCH_SIZE:
+                    _flush()
+        if batch:
+            _flush()
         logger.info("Nowych rekordów: %d", len(new_records))
+        if isinstance(self.store, BloomPrefilteredStore):
+            logger.info("Filtr Blooma: %s", self.store.metrics())
         return new_records
 
-    def update_cache(self, records: List[Dict[str, Any]]) -> None:
+    def metrics(self) -> Dict[str, Any]:
+        """Metryki magazynu (m.in. trafienia filtra Blooma, jeśli włączony)."""
+        base = {"backend": type(self.store).__name__, "size": len(self.store)}
+        if isinstance(self.store, BloomPrefilteredStore):
+            base.update(self.store.metrics())
+        return base
+
+    def update_cache(self, records: Iterable[Dict[str, Any]]) -> None:
         """
-        Aktualizuje cache, dodając nowe identyfikatory rekordów.
+        Aktualizuje cache, dopisując nowe identyfikatory rekordów.
         """
-        ids = {str(r.get("id")) for r in records if r.get("id")}
-        combined = set(self.seen_ids) | ids
+        ids = [str(r.get("id")) for r in records if r.get("id")]
         try:
-            # Zapis do pliku
-            self.cache_path.write_text(json.dumps(list(combined), ensure_ascii=False, indent=2), encoding="utf-8")
-            self.seen_ids = list(combined)
-            logger.info("Zaktualizowano cache z %d rekordami.", len(self.seen_ids))
+            added = self.store.add_many(ids)
+            logger.info("Zaktualizowano cache: +%d, razem %d rekordów.", added, len(self.store))
         except Exception as e:
             logger.error("Błąd zapisu cache do %s: %s", self.cache_path, e)
@@ -0,0 +1,167 @@
+# app/core/token_accounting.py
+
+import json
+import time
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, BaseMessage, FunctionMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import LLMResult
+
+try:
+    import tiktoken
+except ImportError:  # przybliżenie ~4 znaki na token
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+_encodings: Dict[str, Any] = {}
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    if not text:
+        return 0
+    if tiktoken is None:
+        return max(1, len(text) // 4)
+    name = model or "gpt-4"
+    if name not in _encodings:
+        try:
+            _encodings[name] = tiktoken.encoding_for_model(name)
+        except KeyError:
+            _encodings[name] = tiktoken.get_encoding("cl100k_base")
+    return len(_encodings[name].encode(text, disallowed_special=()))
+
+
+def _message_part(message: BaseMessage) -> str:
+    if isinstance(message, SystemMessage):
+        return "system"
+    if isinstance(message, (FunctionMessage, ToolMessage)):
+        return f"tool:{getattr(message, 'name', None) or 'unknown'}"
+    if isinstance(message, AIMessage):
+        return "assistant"
+    return "user"
+
+
+def _message_text(message: BaseMessage) -> str:
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content, ensure_ascii=False)
+    calls = None
+    if isinstance(message, AIMessage):
+        calls = message.additional_kwargs.get("function_call") or message.additional_kwargs.get("tool_calls")
+    return content + (json.dumps(calls, ensure_ascii=False) if calls else "")
+
+
+_USAGE_METADATA_FIELDS = (
+    ("input_tokens", "prompt_tokens"),
+    ("output_tokens", "completion_tokens"),
+    ("total_tokens", "total_tokens"),
+)
+
+
+def response_usage(response: LLMResult) -> Dict[str, int]:
+    """
+    Zużycie tokenów z odpowiedzi LLM w nazwach pól OpenAI. Źródło: llm_output
+    ["token_usage"] (invoke), a gdy go brak (streaming, astream_events) –
+    usage_metadata wiadomości z generacji (LLM z stream_usage=True).
+    """
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return {k: v for k, v in usage.items() if isinstance(v, int)}
+    totals: Counter = Counter()
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            for source, target in _USAGE_METADATA_FIELDS:
+                if isinstance(metadata.get(source), int):
+                    totals[target] += metadata[source]
+    return dict(totals)
+
+
+class TokenAccountant(BaseCallbackHandler):
+    """
+    Zlicza tokeny jednego przebiegu agenta: prompt każdej tury rozbity na części
+    (system, user, assistant, tool:<nazwa>, functions), tokeny z API oraz surowy
+    rozmiar wyników narzędzi (przed kompakcją scratchpada).
+    """
+
+    # W przebiegach async (tryb równoległy) zdarzenia obsługiwane w pętli, bez wątków puli
+    run_inline = True
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model
+        self.turns: List[Dict[str, Any]] = []
+        self.prompt_parts: Counter = Counter()
+        self.tool_outputs: Counter = Counter()
+        self.tool_calls: Counter = Counter()
+        self.usage: Counter = Counter()
+        self._tool_names: Dict[UUID, str] = {}
+        self._turn_started: Dict[UUID, float] = {}
+        self.started_at = time.time()
+
+    # --- LLM ---
+    def on_chat_model_start(self, serialized, messages: List[List[BaseMessage]], *, run_id: UUID, **kwargs) -> None:
+        parts: Counter = Counter()
+        for message in (messages[0] if messages else []):
+            parts[_message_part(message)] += count_tokens(_message_text(message), self.model)
+        params = kwargs.get("invocation_params") or {}
+        functions = params.get("functions") or params.get("tools")
+        if functions:
+            parts["functions"] += count_tokens(json.dumps(functions, ensure_ascii=False), self.model)
+        self.prompt_parts.update(parts)
+        self._turn_started[run_id] = time.perf_counter()
+        self.turns.append({"run_id": str(run_id), "prompt_tokens_est": sum(parts.values()), "parts": dict(parts)})
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs) -> None:
+        turn = next((t for t in reversed(self.turns) if t["run_id"] == str(run_id)), None)
+        usage = response_usage(response)
+        self.usage.update(usage)
+        if turn is not None:
+            turn["usage"] = usage
+            started = self._turn_started.pop(run_id, None)
+            if started is not None:
+                turn["latency_s"] = round(time.perf_counter() - started, 3)
+
+    # --- Narzędzia ---
+    def on_tool_start(self, serialized, input_str: str, *, run_id: UUID, **kwargs) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._tool_names[run_id] = name
+        self.tool_calls[name] += 1
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs) -> None:
+        name = self._tool_names.pop(run_id, kwargs.get("name") or "unknown")
+        text = output if isinstance(output, str) else getattr(output, "content", None) or str(output)
+        self.tool_outputs[name] += count_tokens(text, self.model)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "turns": len(self.turns),
+            "duration_s": round(time.time() - self.started_at, 3),
+            "prompt_tokens_by_part": dict(self.prompt_parts),
+            "tool_calls": dict(self.tool_calls),
+            "tool_output_tokens_raw": dict(self.tool_outputs),
+            "api_usage": dict(self.usage),
+            "per_turn": self.turns,
+        }
+
+
+_last_report: Dict[str, Any] = {}
+
+
+def record_run(accountant: TokenAccountant) -> Dict[str, Any]:
+    """Zapamiętuje raport ostatniego przebiegu i loguje podsumowanie."""
+    global _last_report
+    _last_report = accountant.report()
+    logger.info(
+        "🧮 Tokeny przebiegu: %d tur, prompt=%s, completion=%s, części=%s",
+        _last_report["turns"],
+        _last_report["api_usage"].get("prompt_tokens"),
+        _last_report["api_usage"].get("completion_tokens"),
+        _last_report["prompt_tokens_by_part"],
+    )
+    return _last_report
+
+
+def last_run_report() -> Dict[str, Any]:
+    return _last_report
@@ -0,0 +1,202 @@
+# app/core/tool_memo.py
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from pydantic import BaseModel
+from langchain_core.tools import BaseTool
+
+# Narzędzia z efektami ubocznymi – nigdy nie są memoizowane
+SIDE_EFFECT_TOOLS = frozenset({"gmail_tool", "whatsapp_template_tool", "restart_fetch", "fetch_tool"})
+
+
+class MemoPolicy:
+    """
+    Deklaracja memoizacji narzędzia: TTL wpisu [s] i maksymalna liczba wpisów (LRU).
+    `version` – opcjonalna funkcja zwracająca wersję danych, od których zależy wynik
+    (np. hash tabeli preferencji); wchodzi do klucza, więc po zmianie danych
+    stare wpisy nie są już trafiane.
+    """
+
+    def __init__(
+        self,
+        ttl_s: float,
+        maxsize: int = 256,
+        cache_errors: bool = False,
+        version: Optional[Callable[[], Any]] = None,
+    ):
+        self.ttl_s = ttl_s
+        self.maxsize = maxsize
+        # Wyniki z "❌" to zwykle błędy przejściowe – domyślnie nie trafiają do cache
+        self.cache_errors = cache_errors
+        self.version = version
+
+    def for_tool(self, name: str) -> "MemoPolicy":
+        """Polityka z nadpisaniami z ENV: TOOL_MEMO_<NAZWA>_TTL_S i TOOL_MEMO_<NAZWA>_MAXSIZE."""
+        prefix = f"TOOL_MEMO_{name.upper()}"
+        return MemoPolicy(
+            ttl_s=float(os.getenv(f"{prefix}_TTL_S", self.ttl_s)),
+            maxsize=int(os.getenv(f"{prefix}_MAXSIZE", self.maxsize)),
+            cache_errors=self.cache_errors,
+            version=self.version,
+        )
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return _canonical(value.model_dump())
+    if isinstance(value, str):
+        stripped = value.strip()
+        if stripped[:1] in ("{", "["):
+            try:
+                return _canonical(json.loads(stripped))
+            except json.JSONDecodeError:
+                pass
+        return stripped
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def canonical_key(args: tuple, kwargs: dict, version: Any = None) -> str:
+    """
+    Klucz niezależny od kolejności kluczy JSON i białych znaków wokół wejścia;
+    `version` – wersja danych narzędzia (MemoPolicy.version).
+    """
+    parts = [_canonical(list(args)), _canonical(kwargs)]
+    if version is not None:
+        parts.append(version)
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """Cache LRU z wygasaniem wpisów po `ttl_s` sekundach."""
+
+    _MISSING = object()
+
+    def __init__(self, policy: MemoPolicy):
+        self.policy = policy
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+                self.expired += 1
+            self.misses += 1
+            return self._MISSING
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.policy.ttl_s, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.policy.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def key(self, args: tuple, kwargs: dict) -> str:
+        version = self.policy.version() if self.policy.version else None
+        return canonical_key(args, kwargs, version)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "ttl_s": self.policy.ttl_s,
+            "maxsize": self.policy.maxsize,
+        }
+
+
+_caches: Dict[str, TTLCache] = {}
+
+
+def _cacheable(policy: MemoPolicy, output: Any) -> bool:
+    return policy.cache_errors or not (isinstance(output, str) and output.startswith("❌"))
+
+
+def _memo_sync(func, cache: TTLCache):
+    def run(*args: Any, **kwargs: Any) -> Any:
+        key = cache.key(args, kwargs)
+        cached = cache.get(key)
+        if cached is not TTLCache._MISSING:
+            return cached
+        output = func(*args, **kwargs)
+        if _cacheable(cache.policy, output):
+            cache.put(key, output)
+        return output
+
+    return run
+
+
+def _memo_async(coroutine, cache: TTLCache):
+    async def run(*args: Any, **kwargs: Any) -> Any:
+        key = cache.key(args, kwargs)
+        cached = cache.get(key)
+        if cached is not TTLCache._MISSING:
+            return cached
+        output = await coroutine(*args, **kwargs)
+        if _cacheable(cache.policy, output):
+            cache.put(key, output)
+        return output
+
+    return run
+
+
+def memoize(tool: BaseTool, policy: MemoPolicy) -> BaseTool:
+    """Kopia narzędzia idempotentnego z wynikami w cache TTL+LRU (wspólnym dla kopii o tej nazwie)."""
+    if tool.name in SIDE_EFFECT_TOOLS:
+        raise ValueError(f"❌ Narzędzie {tool.name} ma efekty uboczne i nie może być memoizowane")
+    cache = _caches.get(tool.name)
+    if cache is None:
+        cache = _caches[tool.name] = TTLCache(policy.for_tool(tool.name))
+    update = {}
+    if getattr(tool, "func", None) is not None:
+        update["func"] = _memo_sync(tool.func, cache)
+    if getattr(tool, "coroutine", None) is not None:
+        update["coroutine"] = _memo_async(tool.coroutine, cache)
+    return tool.model_copy(update=update) if update else tool
+
+
+def with_memoization(tools: List[BaseTool], policies: Mapping[str, MemoPolicy]) -> List[BaseTool]:
+    """Memoizuje narzędzia wskazane w `policies` (ENV TOOL_MEMO=0 wyłącza całość)."""
+    if os.getenv("TOOL_MEMO", "1") == "0":
+        return list(tools)
+    return [memoize(tool, policies[tool.name]) if tool.name in policies else tool for tool in tools]
+
+
+def memo_metrics() -> Dict[str, Any]:
+    return {name: cache.stats() for name, cache in sorted(_caches.items())}
+
+
+def clear_memo(name: Optional[str] = None) -> None:
+    for tool_name, cache in _caches.items():
+        if name is None or tool_name == name:
+            cache.clear()
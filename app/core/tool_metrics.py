@@ -0,0 +1,157 @@
+# app/core/tool_metrics.py
+
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional
+
+from langchain_core.tools import BaseTool
+
+# Górne granice koszyków histogramu opóźnień [ms]; ostatni koszyk: powyżej 30 s
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+def _size(value: Any) -> int:
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return len(str(value))
+
+
+class ToolStats:
+    """
+    Liczniki jednego narzędzia. Aktualizacje to zwykłe inkrementacje bez blokad
+    (przy równoległych wywołaniach wartości mogą być minimalnie przybliżone),
+    bez logowania na ścieżce wywołania.
+    """
+
+    __slots__ = (
+        "name", "calls", "exceptions", "error_results", "total_s", "max_s",
+        "buckets", "input_chars", "output_chars",
+    )
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.exceptions = 0
+        self.error_results = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.input_chars = 0
+        self.output_chars = 0
+
+    def observe(self, elapsed: float, input_chars: int, output: Any, failed: bool) -> None:
+        self.calls += 1
+        self.total_s += elapsed
+        if elapsed > self.max_s:
+            self.max_s = elapsed
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed * 1000)] += 1
+        self.input_chars += input_chars
+        if failed:
+            self.exceptions += 1
+            return
+        self.output_chars += _size(output)
+        # Konwencja narzędzi: błędy zwracane jako tekst z prefiksem "❌"
+        if isinstance(output, str) and output.startswith("❌"):
+            self.error_results += 1
+
+    def _quantile_ms(self, q: float) -> Optional[float]:
+        """Górna granica koszyka zawierającego kwantyl q (None powyżej ostatniej granicy)."""
+        if not self.calls:
+            return None
+        threshold = q * self.calls
+        seen = 0
+        for position, count in enumerate(self.buckets):
+            seen += count
+            if seen >= threshold:
+                return LATENCY_BUCKETS_MS[position] if position < len(LATENCY_BUCKETS_MS) else None
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        calls = self.calls
+        errors = self.exceptions + self.error_results
+        return {
+            "calls": calls,
+            "exceptions": self.exceptions,
+            "error_results": self.error_results,
+            "error_rate": errors / calls if calls else 0.0,
+            "latency_ms": {
+                "avg": round(self.total_s / calls * 1000, 2) if calls else None,
+                "max": round(self.max_s * 1000, 2),
+                "p50_le": self._quantile_ms(0.5),
+                "p95_le": self._quantile_ms(0.95),
+                "histogram": {
+                    **{f"le_{bound}": count for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets)},
+                    "gt_30000": self.buckets[-1],
+                },
+            },
+            "avg_input_chars": round(self.input_chars / calls) if calls else 0,
+            "avg_output_chars": round(self.output_chars / (calls - self.exceptions)) if calls > self.exceptions else 0,
+        }
+
+
+_stats: Dict[str, ToolStats] = {}
+
+
+def stats_for(name: str) -> ToolStats:
+    # Wołane przy opakowywaniu narzędzia, nie przy każdym wywołaniu
+    return _stats.setdefault(name, ToolStats(name))
+
+
+def _input_chars(args: tuple, kwargs: dict) -> int:
+    return sum(_size(a) for a in args) + sum(_size(v) for v in kwargs.values())
+
+
+def _instrument_sync(func, stats: ToolStats):
+    def run(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            output = func(*args, **kwargs)
+        except BaseException:
+            stats.observe(time.perf_counter() - started, _input_chars(args, kwargs), None, True)
+            raise
+        stats.observe(time.perf_counter() - started, _input_chars(args, kwargs), output, False)
+        return output
+
+    return run
+
+
+def _instrument_async(coroutine, stats: ToolStats):
+    async def run(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            output = await coroutine(*args, **kwargs)
+        except BaseException:
+            stats.observe(time.perf_counter() - started, _input_chars(args, kwargs), None, True)
+            raise
+        stats.observe(time.perf_counter() - started, _input_chars(args, kwargs), output, False)
+        return output
+
+    return run
+
+
+def instrument(tool: BaseTool) -> BaseTool:
+    """Kopia narzędzia, której wywołania (sync i async) trafiają do liczników `tool.name`."""
+    stats = stats_for(tool.name)
+    update = {}
+    if getattr(tool, "func", None) is not None:
+        update["func"] = _instrument_sync(tool.func, stats)
+    if getattr(tool, "coroutine", None) is not None:
+        update["coroutine"] = _instrument_async(tool.coroutine, stats)
+    return tool.model_copy(update=update) if update else tool
+
+
+def tool_metrics(name: Optional[str] = None) -> Dict[str, Any]:
+    """Migawka liczników wszystkich narzędzi (lub jednego), od startu procesu."""
+    if name is not None:
+        stats = _stats.get(name)
+        return {name: stats.snapshot()} if stats else {}
+    return {tool_name: stats.snapshot() for tool_name, stats in sorted(_stats.items())}
+
+
+def reset_tool_metrics() -> None:
+    for name in list(_stats):
+        _stats[name].__init__(name)
+
+
+def instrumented_tools(tools: List[BaseTool]) -> List[BaseTool]:
+    return [instrument(tool) for tool in tools]
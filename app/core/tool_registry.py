@@ -11,8 +11,11 @@ from app.modules.whatsapp_tool import _send_whatsapp
 from app.modules.fetch_restart_tool import restart_fetch
 from app.modules.fetch_status_tool import check_fetch_status
 from app.modules.fetch_tool import resilient_fetch
-from app.modules.decision_tool import decide_if_order_is_good
+from app.modules.decision_tool import decide_if_order_is_good, decide_orders_batch, BatchDecisionInput
 from app.modules.snapshot_sanitizer_tool import _sanityzuj_snapshot
+from app.core.tool_memo import MemoPolicy, with_memoization
+from app.core.tool_metrics import instrumented_tools
+from app.utils.preference_table import preference_table_version
 
 # ✅ Pusty model wejściowy wymagany przez StructuredTool
 class EmptyInput(BaseModel):
@@ -85,9 +88,28 @@ decision_tool = Tool.from_function(
     return_direct=True,
 )
 
-# 🎯 Eksport wszystkich narzędzi
+batch_decision_tool = StructuredTool.from_function(
+    func=decide_orders_batch,
+    name="decide_orders_batch",
+    description="Ocenia wszystkie rekordy snapshotu naraz i zwraca decyzję TAK/NIE lub błąd dla każdego z nich.",
+    args_schema=BatchDecisionInput,
+    return_direct=True,
+)
+
+# ♻️ Narzędzia idempotentne – wyniki w cache TTL + LRU, klucz z kanonicznego wejścia.
+# Narzędzia z efektami ubocznymi (gmail, whatsapp, restart, fetch) są wykluczone w tool_memo.
+IDEMPOTENT_TOOLS = {
+    "check_fetch_status": MemoPolicy(ttl_s=30, maxsize=1),
+    "mapuj_wojewodztwo": MemoPolicy(ttl_s=3600, maxsize=512),
+    "snapshot_sanitizer_tool": MemoPolicy(ttl_s=600, maxsize=1024),
+    # Wynik zależy od tabeli preferencji – jej hash jest częścią klucza
+    "decide_if_order_is_good": MemoPolicy(ttl_s=600, maxsize=2048, version=preference_table_version),
+}
+
+# 🎯 Eksport wszystkich narzędzi (opakowanych licznikami wywołań, czasu i błędów – tool_metrics;
+# memoizacja na zewnątrz, więc metryki liczą tylko faktyczne wykonania)
 def get_all_tools() -> list[Tool]:
-    return [
+    return with_memoization(instrumented_tools([
         s3_tool,
         gmail_tool,
         mapper_tool,
@@ -97,4 +119,5 @@ def get_all_tools() -> list[Tool]:
         fetch_tool,
         sanitizer_tool,
         decision_tool,
-    ]
+        batch_decision_tool,
+    ]), IDEMPOTENT_TOOLS)
@@ -1,14 +1,22 @@
-import os
 import logging
-import pandas as pd
-from pathlib import Path
+from typing import Any, Dict, Iterable, List
 
 from pydantic import BaseModel, Field
 from langchain.tools import Tool
 
-from app.modules.snapshot_sanitizer_tool import SnapshotSanitizerTool, SanitizerInput
-from app.modules.mapper_tool import WojewodztwoMapperTool, MapperInput
+from app.modules.snapshot_sanitizer_tool import (
+    SanitizerInput,
+    SEGMENT_FIELD_ID,
+    WOJEWODZTWO_FIELD_ID,
+    _sanityzuj_snapshot,
+)
+from app.modules.mapper_tool import (
+    _load_id_map,
+    resolve_wojewodztwo,
+    resolve_wojewodztwa_batch,
+)
 from app.utils.error_reporter import report_error
+from app.utils.preference_table import get_preference_table
 
 # Konfiguracja loggera
 logger = logging.getLogger(__name__)
@@ -20,6 +28,22 @@ class DecisionInput(BaseModel):
     record: dict = Field(..., description="Rekord JSON zawierający dane zlecenia z snapshotu")
 
 
+class BatchDecisionInput(BaseModel):
+    """
+    Wejściowy model danych: lista rekordów JSON ze snapshotu.
+    """
+    records: List[dict] = Field(..., description="Rekordy JSON zleceń z snapshotu")
+
+
+UNMAPPED_REGION = "❌ Nie udało się rozpoznać województwa"
+
+
+def _cell_text(cell: Dict[str, Any], field: str) -> str:
+    """Wartość pola rekordu jako tekst; brak (None) to pusty tekst – wspólne dla obu ścieżek decyzji."""
+    value = cell.get(field)
+    return "" if value is None else str(value).strip()
+
+
 def _decide_if_order_is_good(tool_input: DecisionInput) -> str:
     """
     Analizuje zlecenie i zwraca:
@@ -27,9 +51,12 @@ def _decide_if_order_is_good(tool_input: DecisionInput) -> str:
       - 'NIE' jeśli wartość różna od 1,
       - komunikaty o błędach z prefiksem '❌'.
     """
+    cell = tool_input.record.get("cellValuesByColumnId")
+    cell = cell if isinstance(cell, dict) else {}
+
     # 1. Sanityzacja rekordu
     try:
-        sanity = SnapshotSanitizerTool().run(tool_input=SanitizerInput(record=tool_input.record))
+        sanity = _sanityzuj_snapshot(SanitizerInput(record=tool_input.record))
         if sanity.startswith("❌"):
             logger.warning("Sanityzacja nieudana: %s", sanity)
             return f"❌ Rekord niepoprawny: {sanity}"
@@ -40,16 +67,10 @@ def _decide_if_order_is_good(tool_input: DecisionInput) -> str:
 
     # 2. Mapowanie województwa
     try:
-        mapper_input = MapperInput(
-            wojewodztwo_id=str(
-                tool_input.record.get("cellValuesByColumnId", {})
-                                  .get("fldCbMMnj7vuHlmsu", "")
-            )
-        )
-        mapped = WojewodztwoMapperTool().run(tool_input=mapper_input)
+        mapped = resolve_wojewodztwo(wojewodztwo_id=_cell_text(cell, WOJEWODZTWO_FIELD_ID))
         if mapped.startswith("❌"):
             logger.warning("Mapowanie nieudane: %s", mapped)
-            return f"❌ Nie udało się rozpoznać województwa: {mapped}"
+            return f"{UNMAPPED_REGION}: {mapped}"
         wojewodztwo = mapped.strip().upper()
     except Exception as e:
         report_error("DecisionTool", "Mapowanie województwa", e)
@@ -58,33 +79,21 @@ def _decide_if_order_is_good(tool_input: DecisionInput) -> str:
 
     # 3. Sprawdzanie tabeli preferencji
     try:
-        excel_path = Path(
-            os.getenv(
-                "PREFERENCES_XLSX_PATH",
-                "data/tablica binarna segment + wojewodztwo.xlsx"
-            )
-        )
-        if not excel_path.is_file():
-            logger.error("Brak pliku preferencji: %s", excel_path)
-            return f"❌ Brak pliku preferencji: {excel_path}"
-
-        df = pd.read_excel(excel_path)
-        df.columns = [str(col).strip().upper() for col in df.columns]
+        table = get_preference_table()
+        if not table.exists():
+            logger.error("Brak pliku preferencji: %s", table.path)
+            return f"❌ Brak pliku preferencji: {table.path}"
 
-        segment = str(
-            tool_input.record.get("cellValuesByColumnId", {})
-                               .get("fldfEIZxM3O4pF3bW", "")
-        ).strip().upper()
+        segment = _cell_text(cell, SEGMENT_FIELD_ID).upper()
 
-        if wojewodztwo not in df.columns:
+        if not table.has_region(wojewodztwo):
             logger.warning("Brak kolumny województwo: %s", wojewodztwo)
             return f"❌ Województwo '{wojewodztwo}' nie występuje w tabeli"
-        if segment not in df["SEGMENT"].values:
+        if not table.has_segment(segment):
             logger.warning("Brak segmentu: %s", segment)
             return f"❌ Segment '{segment}' nie występuje w tabeli"
 
-        value = df.loc[df["SEGMENT"] == segment, wojewodztwo].iat[0]
-        result = "TAK" if value == 1 else "NIE"
+        result = "TAK" if table.is_preferred(segment, wojewodztwo) else "NIE"
         logger.info(
             "Decyzja dla segment %s i województwo %s: %s",
             segment, wojewodztwo, result
@@ -104,3 +113,95 @@ decide_if_order_is_good = Tool.from_function(
     args_schema=DecisionInput,
     return_direct=True
 )
+
+
+def decide_orders_batch(records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Wsadowa wersja decide_if_order_is_good dla całego snapshotu.
+    W jednym przebiegu wyciąga segment i województwo z rekordów, mapuje
+    województwa wsadowo i łączy wynik z tabelą preferencji (pandas merge).
+    Zwraca listę słowników {'id', 'decision', 'error'} w kolejności wejścia:
+      - decision: 'TAK' / 'NIE' lub None, gdy wystąpił błąd,
+      - error: komunikat z prefiksem '❌' lub None.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rows = []
+    for record in records:
+        record = record if isinstance(record, dict) else {}
+        cell = record.get("cellValuesByColumnId")
+        has_cell = isinstance(cell, dict) and bool(cell)
+        cell = cell if has_cell else {}
+        rows.append((
+            record.get("id"),
+            has_cell,
+            _cell_text(cell, SEGMENT_FIELD_ID).upper(),
+            _cell_text(cell, WOJEWODZTWO_FIELD_ID),
+        ))
+    if not rows:
+        return []
+
+    df = pd.DataFrame(rows, columns=["id", "has_cell", "segment", "wojewodztwo_id"])
+
+    try:
+        mapa = _load_id_map()
+        if not mapa:
+            return _batch_failure(df, f"{UNMAPPED_REGION}: ❌ Błąd ładowania mapowania województw")
+
+        table = get_preference_table()
+        if not table.exists():
+            logger.error("Brak pliku preferencji: %s", table.path)
+            return _batch_failure(df, f"❌ Brak pliku preferencji: {table.path}")
+
+        regions, _ = resolve_wojewodztwa_batch(df["wojewodztwo_id"])
+        df["wojewodztwo"] = regions
+        matrix = table.to_frame()
+        merged = df.merge(
+            matrix, on=["segment", "wojewodztwo"], how="left", validate="many_to_one"
+        )
+
+        wojewodztwo = merged["wojewodztwo"].fillna("")
+        errors = np.select(
+            [
+                ~merged["has_cell"],
+                merged["segment"] == "",
+                merged["wojewodztwo_id"] == "",
+                merged["wojewodztwo"].isna(),
+                ~wojewodztwo.isin(matrix["wojewodztwo"].unique()),
+                ~merged["segment"].isin(matrix["segment"].unique()),
+            ],
+            [
+                "❌ Rekord niepoprawny: ❌ Brak danych w polu 'cellValuesByColumnId'",
+                "❌ Rekord niepoprawny: ❌ Brak wartości segmentu pojazdu",
+                "❌ Rekord niepoprawny: ❌ Brak województwa lub kodu pocztowego",
+                f"{UNMAPPED_REGION}: {UNMAPPED_REGION}",
+                "❌ Województwo '" + wojewodztwo + "' nie występuje w tabeli",
+                "❌ Segment '" + merged["segment"] + "' nie występuje w tabeli",
+            ],
+            default="",
+        )
+        preferred = merged["preferred"].eq(True).to_numpy()
+        decisions = np.where(errors == "", np.where(preferred, "TAK", "NIE"), "")
+
+        logger.info(
+            "Decyzje wsadowe: %d rekordów, TAK=%d, NIE=%d, błędy=%d",
+            len(merged),
+            int((decisions == "TAK").sum()),
+            int((decisions == "NIE").sum()),
+            int((errors != "").sum()),
+        )
+        return [
+            {"id": record_id, "decision": decision or None, "error": error or None}
+            for record_id, decision, error in zip(merged["id"], decisions, errors)
+        ]
+
+    except Exception as e:
+        report_error("DecisionTool", "decide_orders_batch", e)
+        logger.error("Błąd decyzji wsadowej: %s", e, exc_info=True)
+        return _batch_failure(df, f"❌ Błąd decyzji wsadowej: {e}")
+
+
+def _batch_failure(df, message: str) -> List[Dict[str, Any]]:
+    return [{"id": record_id, "decision": None, "error": message} for record_id in df["id"]]
+
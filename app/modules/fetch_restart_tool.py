@@ -24,7 +24,7 @@ def restart_fetch(_: EmptyInput) -> str:
     """
     base_url = os.getenv("FETCH_BASE_URL", "https://fetch-2-0.onrender.com")
     try:
-        response = requests.get(f"{base_url}/restart", timeout=10)
+        response = requests.get(f"{base_url}/restart", timeout=float(os.getenv("FETCH_HTTP_TIMEOUT", "10")))
         response.raise_for_status()
         return "🔁 Fetch został zrestartowany."
     except Exception as e:
@@ -22,7 +22,7 @@ def check_fetch_status(_: EmptyInput) -> str:
     """
     base_url = os.getenv("FETCH_BASE_URL", "https://fetch-2-0.onrender.com")
     try:
-        response = requests.get(f"{base_url}/status", timeout=10)
+        response = requests.get(f"{base_url}/status", timeout=float(os.getenv("FETCH_HTTP_TIMEOUT", "10")))
         response.raise_for_status()
         data = response.json()
         if data.get("running") or data.get("status") is True:
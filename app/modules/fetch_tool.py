@@ -24,7 +24,7 @@ def resilient_fetch(_: EmptyInput) -> str:
     base_url = os.getenv("FETCH_BASE_URL", "https://fetch-2-0.onrender.com")
 
     def _get(path: str) -> requests.Response:
-        return requests.get(f"{base_url}{path}", timeout=10)
+        return requests.get(f"{base_url}{path}", timeout=float(os.getenv("FETCH_HTTP_TIMEOUT", "10")))
 
     try:
         logger.info("🚀 Próba uruchomienia Fetch...")
@@ -2,12 +2,14 @@
 
 import os
 import logging
-from typing import Dict
+from email.mime.text import MIMEText
+from typing import Dict, List
 
 from langchain_core.tools import Tool
 from pydantic import BaseModel, ValidationError
 
 from app.utils.error_reporter import report_error
+from app.utils.mail_transport import get_mail_transport
 
 logger = logging.getLogger(__name__)
 
@@ -15,34 +17,38 @@ class GmailInput(BaseModel):
     subject: str
     body: str
 
+def _gmail_config():
+    from_address = os.getenv("GMAIL_USER")
+    password = os.getenv("GMAIL_PASSWORD")
+    to_address = os.getenv("GMAIL_RECIPIENT", from_address)
+    return from_address, password, to_address
+
+
+def _build_message(parsed: GmailInput, from_address: str, to_address: str) -> MIMEText:
+    msg = MIMEText(parsed.body)
+    msg["Subject"] = parsed.subject
+    msg["From"] = from_address
+    msg["To"] = to_address
+    return msg
+
+
 def send_gmail_email(data: Dict[str, str]) -> str:
     """
-    Wysyła e-mail z podanym tematem i treścią.
+    Wysyła e-mail z podanym tematem i treścią przez współdzielone, zalogowane
+    połączenie SMTP (mail_transport).
     Wymaga ENV: GMAIL_USER, GMAIL_PASSWORD.
     :param data: dict z polami 'subject' i 'body'
     :return: komunikat o sukcesie lub błędzie
     """
     try:
         parsed = GmailInput.parse_obj(data)
-        from_address = os.getenv("GMAIL_USER")
-        password = os.getenv("GMAIL_PASSWORD")
-        to_address = os.getenv("GMAIL_RECIPIENT", from_address)
+        from_address, password, to_address = _gmail_config()
 
         if not from_address or not password:
             return "❌ Brakuje konfiguracji GMAIL_USER lub GMAIL_PASSWORD"
 
-        import smtplib
-        from email.mime.text import MIMEText
-
-        msg = MIMEText(parsed.body)
-        msg["Subject"] = parsed.subject
-        msg["From"] = from_address
-        msg["To"] = to_address
-
-        server = smtplib.SMTP_SSL("smtp.gmail.com", 465)
-        server.login(from_address, password)
-        server.sendmail(from_address, [to_address], msg.as_string())
-        server.quit()
+        msg = _build_message(parsed, from_address, to_address)
+        get_mail_transport(from_address, password).send(msg, from_address, [to_address])
 
         success = f"✅ E-mail wysłany do {to_address}"
         logger.info(success)
@@ -54,7 +60,40 @@ def send_gmail_email(data: Dict[str, str]) -> str:
         report_error("gmail_tool", "send_gmail_email", e)
         logger.error("❌ Błąd wysyłania e-maila: %s", e, exc_info=True)
         return f"❌ Błąd wysyłania e-maila: {e}"
-    
+
+
+def send_gmail_emails(items: List[Dict[str, str]]) -> List[str]:
+    """
+    Wysyła wiele e-maili jednym połączeniem SMTP (send_many).
+    Zwraca komunikat o sukcesie lub błędzie dla każdej pozycji.
+    """
+    from_address, password, to_address = _gmail_config()
+    if not from_address or not password:
+        return ["❌ Brakuje konfiguracji GMAIL_USER lub GMAIL_PASSWORD"] * len(items)
+
+    results: List[str] = [""] * len(items)
+    batch, positions = [], []
+    for position, data in enumerate(items):
+        try:
+            msg = _build_message(GmailInput.parse_obj(data), from_address, to_address)
+        except ValidationError as ve:
+            results[position] = f"❌ Błędne dane wejściowe: {ve}"
+            continue
+        batch.append((msg, from_address, [to_address]))
+        positions.append(position)
+
+    try:
+        errors = get_mail_transport(from_address, password).send_many(batch)
+    except Exception as e:
+        report_error("gmail_tool", "send_gmail_emails", e)
+        logger.error("❌ Błąd wysyłania e-maili: %s", e, exc_info=True)
+        errors = [str(e)] * len(batch)
+
+    for position, error in zip(positions, errors):
+        results[position] = f"❌ Błąd wysyłania e-maila: {error}" if error else f"✅ E-mail wysłany do {to_address}"
+    logger.info("📨 Wysłano %d/%d e-maili.", sum(r.startswith("✅") for r in results), len(items))
+    return results
+
 gmail_tool = Tool.from_function(
     name="gmail_tool",
     description="Wysyła e-mail z podanym tematem i treścią. Wymaga skonfigurowanego GMAIL_USER.",
@@ -4,7 +4,7 @@ import os
 import json
 import logging
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from pydantic import BaseModel, Field
 
@@ -13,19 +13,37 @@ from langchain_core.tools import Tool  # upewnij się, że masz właściwy impor
 
 logger = logging.getLogger(__name__)
 
-# Mapowanie kodów pocztowych na województwa
-KOD_WOJ: Dict[str, str] = {
-    "00": "MAZOWIECKIE", "01": "MAZOWIECKIE", "02": "MAZOWIECKIE", "03": "MAZOWIECKIE", "04": "MAZOWIECKIE",
-    "05": "MAZOWIECKIE", "10": "WARMIŃSKO-MAZURSKIE", "15": "PODLASKIE", "20": "LUBELSKIE",
-    "25": "ŚWIĘTOKRZYSKIE", "30": "MAŁOPOLSKIE", "31": "MAŁOPOLSKIE", "35": "PODKARPACKIE",
-    "40": "ŚLĄSKIE", "45": "OPOLSKIE", "50": "DOLNOŚLĄSKIE", "51": "DOLNOŚLĄSKIE",
-    "52": "DOLNOŚLĄSKIE", "53": "DOLNOŚLĄSKIE", "54": "DOLNOŚLĄSKIE", "60": "WIELKOPOLSKIE",
-    "61": "WIELKOPOLSKIE", "65": "LUBUSKIE", "70": "ZACHODNIOPOMORSKIE",
-    "71": "ZACHODNIOPOMORSKIE", "75": "ZACHODNIOPOMORSKIE", "80": "POMORSKIE",
-    "81": "POMORSKIE", "82": "POMORSKIE", "83": "POMORSKIE", "84": "POMORSKIE",
-    "85": "KUJAWSKO-POMORSKIE", "90": "ŁÓDZKIE", "91": "ŁÓDZKIE", "92": "ŁÓDZKIE",
-    "93": "ŁÓDZKIE", "94": "ŁÓDZKIE"
-}
+# Mapowanie dwucyfrowych prefiksów kodów pocztowych na województwa (zakresy 00–99).
+# Przy prefiksach obejmujących dwa województwa wybrane jest to, do którego należy
+# większość kodów z danego prefiksu.
+_KOD_WOJ_ZAKRESY = (
+    (0, 9, "MAZOWIECKIE"),
+    (10, 14, "WARMIŃSKO-MAZURSKIE"),
+    (15, 18, "PODLASKIE"),
+    (19, 19, "WARMIŃSKO-MAZURSKIE"),
+    (20, 24, "LUBELSKIE"),
+    (25, 29, "ŚWIĘTOKRZYSKIE"),
+    (30, 34, "MAŁOPOLSKIE"),
+    (35, 39, "PODKARPACKIE"),
+    (40, 44, "ŚLĄSKIE"),
+    (45, 49, "OPOLSKIE"),
+    (50, 59, "DOLNOŚLĄSKIE"),
+    (60, 64, "WIELKOPOLSKIE"),
+    (65, 69, "LUBUSKIE"),
+    (70, 75, "ZACHODNIOPOMORSKIE"),
+    (76, 77, "POMORSKIE"),
+    (78, 79, "ZACHODNIOPOMORSKIE"),
+    (80, 84, "POMORSKIE"),
+    (85, 89, "KUJAWSKO-POMORSKIE"),
+    (90, 99, "ŁÓDZKIE"),
+)
+
+# Tablica 100 slotów: indeks = int(prefiks), wartość = województwo
+KOD_WOJ_TABLE: Tuple[str, ...] = tuple(
+    next(woj for lo, hi, woj in _KOD_WOJ_ZAKRESY if lo <= i <= hi) for i in range(100)
+)
+
+KOD_WOJ: Dict[str, str] = {f"{i:02d}": woj for i, woj in enumerate(KOD_WOJ_TABLE)}
 
 _DEFAULT_MAP_PATH = Path("data") / "wojewodztwa_mapping.json"
 _MAPPING_PATH = Path(os.getenv("WOJEWODZTWA_MAPPING_PATH", _DEFAULT_MAP_PATH))
@@ -76,6 +94,38 @@ def resolve_wojewodztwo(wojewodztwo_id: Optional[str] = None, kod_pocztowy: Opti
         logger.error("Błąd mapowania: %s", e, exc_info=True)
         return f"❌ Błąd mapowania: {e}"
 
+def resolve_wojewodztwa_batch(
+    wojewodztwo_ids: Optional[Iterable[Any]] = None,
+    kody_pocztowe: Optional[Iterable[Any]] = None,
+) -> Tuple[Any, List[int]]:
+    """
+    Wsadowa wersja resolve_wojewodztwo dla list lub pandas.Series.
+    ID województwa ma pierwszeństwo przed kodem pocztowym (jak w wersji pojedynczej).
+    Zwraca (Series województw w kolejności wejścia, None dla braków; pozycje braków).
+    """
+    import numpy as np
+    import pandas as pd
+
+    ids = pd.Series(list(wojewodztwo_ids) if wojewodztwo_ids is not None else [], dtype=object)
+    codes = pd.Series(list(kody_pocztowe) if kody_pocztowe is not None else [], dtype=object)
+    size = max(len(ids), len(codes))
+    ids = ids.reindex(range(size))
+    codes = codes.reindex(range(size))
+
+    mapa = _load_id_map() or {}
+    by_id = ids.where(ids.notna(), None).astype("string").str.strip().map(mapa)
+
+    prefixes = codes.astype("string").str.replace("-", "", regex=False).str.strip().str[:2]
+    valid = prefixes.str.fullmatch(r"\d{2}").fillna(False).to_numpy(dtype=bool)
+    by_code = np.full(size, None, dtype=object)
+    by_code[valid] = np.asarray(KOD_WOJ_TABLE, dtype=object)[prefixes[valid].astype(int).to_numpy()]
+
+    regions = by_id.astype(object).where(by_id.notna(), pd.Series(by_code))
+    regions = regions.where(regions.notna(), None)
+    misses = np.flatnonzero(regions.isna().to_numpy()).tolist()
+    return regions, misses
+
+
 WojewodztwoMapperTool = Tool.from_function(
     name="resolve_wojewodztwo",
     description="Rozpoznaje nazwę województwa na podstawie ID lub kodu pocztowego.",
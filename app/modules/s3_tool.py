@@ -1,58 +1,379 @@
 # app/modules/s3_tool.py
 
+import io
 import os
+import gzip
 import json
 import logging
-from typing import Any, Dict
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
 
 import boto3
+from botocore.exceptions import ClientError
 from pydantic import BaseModel
 from langchain.tools import tool
 
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 from app.utils.error_reporter import report_error
+from app.utils.snapshot_cache import CHUNK_SIZE, get_snapshot_cache
 
 logger = logging.getLogger(__name__)
 
+SNAPSHOT_PREFIX = os.getenv("S3_SNAPSHOT_PREFIX", "motoassist/")
+# Wskaźnik na najnowszy snapshot zapisywany obok snapshotów: {"latest": key, "previous": key}
+MANIFEST_NAME = "latest.json"
+_STATE_PATH = Path(os.getenv("S3_STATE_PATH", "data/s3_snapshot_state.json"))
+
+
+# Kodowania snapshotów: Content-Encoding lub rozszerzenie klucza
+ENCODING_SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+
 
 class EmptyInput(BaseModel):
     """Model wejściowy – pusty, ale wymagany przez LangChain."""
     pass
 
 
-@tool(args_schema=EmptyInput, return_direct=True)
-def fetch_latest_snapshot(_: EmptyInput) -> Dict[str, Any]:
+@lru_cache(maxsize=1)
+def _s3_client():
+    # Klient boto3 jest bezpieczny wątkowo – tworzony raz na proces
+    return boto3.client(
+        "s3",
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        region_name=os.getenv("AWS_DEFAULT_REGION", "eu-central-1"),
+    )
+
+
+def _manifest_key(prefix: str) -> str:
+    return f"{prefix}{MANIFEST_NAME}"
+
+
+def write_latest_manifest(s3, bucket: str, key: str, prefix: str = SNAPSHOT_PREFIX) -> None:
     """
-    Pobiera najnowszy snapshot z S3 i zwraca jako dict.
-    Jeśli wystąpi błąd – zwraca {'records': [], 'error': '...'}
+    Aktualizuje wskaźnik najnowszego snapshotu. Wołać po każdym zapisie snapshotu,
+    dzięki czemu odczyt najnowszego klucza kosztuje jedno żądanie GET.
+    """
+    previous = None
+    try:
+        current = json.loads(s3.get_object(Bucket=bucket, Key=_manifest_key(prefix))["Body"].read())
+        previous = current.get("latest")
+    except s3.exceptions.NoSuchKey:
+        pass
+    if previous == key:
+        return
+    s3.put_object(
+        Bucket=bucket,
+        Key=_manifest_key(prefix),
+        Body=json.dumps({"latest": key, "previous": previous}).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+
+def _load_state(prefix: str) -> Dict[str, Optional[str]]:
+    if _STATE_PATH.is_file():
+        try:
+            state = json.loads(_STATE_PATH.read_text(encoding="utf-8"))
+            if isinstance(state.get(prefix), dict):
+                return state[prefix]
+        except (json.JSONDecodeError, AttributeError) as e:
+            logger.warning("Nieczytelny stan S3 w %s, zaczynam od zera: %s", _STATE_PATH, e)
+    return {}
+
+
+def _save_state(prefix: str, latest: str, previous: Optional[str]) -> None:
+    try:
+        state = json.loads(_STATE_PATH.read_text(encoding="utf-8")) if _STATE_PATH.is_file() else {}
+    except json.JSONDecodeError:
+        state = {}
+    state[prefix] = {"latest": latest, "previous": previous}
+    try:
+        _STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _STATE_PATH.write_text(json.dumps(state), encoding="utf-8")
+    except OSError as e:
+        logger.warning("Nie można zapisać stanu S3 do %s: %s", _STATE_PATH, e)
+
+
+def _discover_latest_key(s3, bucket: str, prefix: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Zwraca (najnowszy klucz, poprzedni klucz).
+    1) Manifest `<prefix>latest.json` – jedno żądanie niezależnie od liczby snapshotów.
+    2) Fallback (brak manifestu albo manifest bez "previous", np. po pierwszym
+       zapisie): stronicowane listowanie od ostatnio widzianego klucza (StartAfter).
+       Wymaga nazw kluczy uporządkowanych czasowo (np. znacznik czasu w nazwie).
+    """
+    try:
+        manifest = json.loads(s3.get_object(Bucket=bucket, Key=_manifest_key(prefix))["Body"].read())
+        if manifest.get("latest") and manifest.get("previous"):
+            return manifest["latest"], manifest["previous"]
+        logger.info("Manifest %s bez poprzedniego snapshotu, używam listowania.", _manifest_key(prefix))
+    except s3.exceptions.NoSuchKey:
+        logger.info("Brak manifestu %s, używam listowania.", _manifest_key(prefix))
+
+    state = _load_state(prefix)
+    latest, previous = state.get("latest"), state.get("previous")
+
+    params = {"Bucket": bucket, "Prefix": prefix}
+    if latest:
+        params["StartAfter"] = latest
+    for page in s3.get_paginator("list_objects_v2").paginate(**params):
+        for obj in page.get("Contents", []):
+            key = obj["Key"]
+            if key == _manifest_key(prefix) or key.endswith("/"):
+                continue
+            if latest is None or key > latest:
+                latest, previous = key, latest
+
+    if latest:
+        _save_state(prefix, latest, previous)
+    return latest, previous
+
+
+def detect_encoding(key: str, content_encoding: Optional[str] = None) -> Optional[str]:
+    """Zwraca 'gzip', 'zstd' lub None (czysty JSON)."""
+    if content_encoding:
+        value = content_encoding.strip().lower()
+        if value in ("gzip", "x-gzip"):
+            return "gzip"
+        if value in ("zstd", "zst"):
+            return "zstd"
+    for suffix, encoding in ENCODING_SUFFIXES.items():
+        if key.endswith(suffix):
+            return encoding
+    return None
+
+
+def _decoding_reader(raw, encoding: Optional[str]):
+    """Opakowuje strumień binarny dekoderem właściwym dla kodowania (strumieniowo)."""
+    if encoding == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Snapshot zstd wymaga biblioteki 'zstandard'.")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+    return raw
+
+
+def encode_snapshot(data: bytes, encoding: Optional[str]) -> bytes:
+    """Kompresuje treść snapshotu ('gzip', 'zstd' lub None – bez zmian)."""
+    if encoding == "gzip":
+        return gzip.compress(data, mtime=0)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Kompresja zstd wymaga biblioteki 'zstandard'.")
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return data
+
+
+def write_snapshot(
+    s3,
+    bucket: str,
+    key: str,
+    snapshot: Dict[str, Any],
+    encoding: Optional[str] = "gzip",
+    prefix: str = SNAPSHOT_PREFIX,
+) -> str:
+    """
+    Zapisuje snapshot do S3 (domyślnie gzip, z Content-Encoding i rozszerzeniem
+    klucza) i aktualizuje manifest najnowszego snapshotu. Zwraca zapisany klucz.
+    """
+    suffix = next((s for s, enc in ENCODING_SUFFIXES.items() if enc == encoding), "")
+    if suffix and not key.endswith(suffix):
+        key += suffix
+    params = {
+        "Bucket": bucket,
+        "Key": key,
+        "Body": encode_snapshot(json.dumps(snapshot, ensure_ascii=False).encode("utf-8"), encoding),
+        "ContentType": "application/json",
+    }
+    if encoding:
+        params["ContentEncoding"] = encoding
+    s3.put_object(**params)
+    write_latest_manifest(s3, bucket, key, prefix)
+    return key
+
+
+def _is_not_modified(error: ClientError) -> bool:
+    code = str(error.response.get("Error", {}).get("Code", ""))
+    status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code in ("304", "NotModified") or status == 304
+
+
+def _fetch_cached(s3, bucket: str, key: str) -> Dict[str, Any]:
+    """
+    Zwraca wpis cache dla klucza, pobierając treść z S3 tylko gdy się zmieniła
+    (warunkowy GET z IfNoneMatch; przy 304 treść serwowana jest z dysku).
     """
+    cache = get_snapshot_cache()
+    entry = cache.get(key)
+    params = {"Bucket": bucket, "Key": key}
+    if entry and entry.get("etag"):
+        params["IfNoneMatch"] = entry["etag"]
     try:
-        bucket = os.getenv("S3_BUCKET_NAME")
-        if not bucket:
-            return {"records": [], "error": "Brak ENV S3_BUCKET_NAME"}
+        obj = s3.get_object(**params)
+    except ClientError as e:
+        if entry and _is_not_modified(e):
+            logger.info("📦 Snapshot %s bez zmian (304), używam cache.", key)
+            return {**entry, "key": key}
+        raise
+
+    body = obj.get("Body")
+    if not body:
+        raise RuntimeError("Brak zawartości w obiekcie S3.")
+    last_modified = obj.get("LastModified")
+    return {
+        **cache.put(
+            key,
+            body,
+            etag=obj.get("ETag"),
+            last_modified=last_modified.isoformat() if last_modified else None,
+            encoding=detect_encoding(key, obj.get("ContentEncoding")),
+        ),
+        "key": key,
+    }
+
+
+def _bucket() -> str:
+    bucket = os.getenv("S3_BUCKET_NAME")
+    if not bucket:
+        raise RuntimeError("Brak ENV S3_BUCKET_NAME")
+    return bucket
+
+
+def latest_snapshot_keys() -> Tuple[str, str]:
+    """Zwraca (klucz najnowszego, klucz poprzedniego snapshotu) albo zgłasza RuntimeError."""
+    latest_key, previous_key = _discover_latest_key(_s3_client(), _bucket(), SNAPSHOT_PREFIX)
+    if not latest_key or not previous_key:
+        raise RuntimeError("Brak wystarczających snapshotów w S3.")
+    return latest_key, previous_key
 
-        s3 = boto3.client(
-            "s3",
-            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-            region_name=os.getenv("AWS_DEFAULT_REGION", "eu-central-1"),
-        )
 
-        resp = s3.list_objects_v2(Bucket=bucket, Prefix="motoassist/")
-        contents = resp.get("Contents", [])
-        if len(contents) < 2:
-            return {"records": [], "error": "Brak wystarczających snapshotów w S3."}
+@contextmanager
+def _open_entry(entry: Dict[str, Any]):
+    """Otwiera treść z cache, dekodując gzip/zstd w locie."""
+    cache = get_snapshot_cache()
+    raw = cache.open(entry)
+    if raw is None:
+        # Treść usunięta z cache (eksmisja w innym wątku) – pobierz ją ponownie
+        logger.info("📦 Snapshot %s usunięty z cache, pobieram ponownie.", entry["key"])
+        raw = cache.open(_fetch_cached(_s3_client(), _bucket(), entry["key"]))
+        if raw is None:
+            raise RuntimeError(f"Snapshot {entry['key']} niedostępny w cache.")
+    with raw:
+        with _decoding_reader(raw, entry.get("encoding")) as fh:
+            yield fh
+
+
+_KIND_MARKER = b"marcel"
+
+
+def _scan_kind(key: str, entry: Dict[str, Any]) -> str:
+    """
+    Rodzaj snapshotu: 'marcel' (zlecenia już pozyskane), gdy "marcel" występuje
+    w kluczu S3 albo gdziekolwiek w treści (także w rekordach), inaczej 'motoassist'.
+    Treść przeglądana porcjami jako bajty, bez parsowania JSON.
+    """
+    if _KIND_MARKER.decode() in key.lower():
+        return "marcel"
+    tail = b""
+    with _open_entry(entry) as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+            window = tail + chunk.lower()
+            if _KIND_MARKER in window:
+                return "marcel"
+            tail = window[-(len(_KIND_MARKER) - 1):]
+    return "motoassist"
+
+
+def latest_snapshot() -> Dict[str, Any]:
+    """
+    Najnowszy snapshot: wpis cache uzupełniony o 'key', 'previous_key' i 'kind'.
+    Jedno wykrycie klucza i jeden warunkowy GET – rodzaj i rekordy pochodzą
+    z tej samej treści. Rodzaj wyznaczany jest raz na treść i zapisywany w indeksie cache.
+    """
+    latest_key, previous_key = latest_snapshot_keys()
+    entry = _fetch_cached(_s3_client(), _bucket(), latest_key)
+    if not entry.get("kind"):
+        entry = get_snapshot_cache().annotate(latest_key, entry, kind=_scan_kind(latest_key, entry))
+    return {**entry, "previous_key": previous_key}
 
-        sorted_objs = sorted(contents, key=lambda o: o["LastModified"], reverse=True)
-        latest_key = sorted_objs[0]["Key"]
 
-        obj = s3.get_object(Bucket=bucket, Key=latest_key)
-        body = obj.get("Body")
-        if not body:
-            raise RuntimeError("Brak zawartości w obiekcie S3.")
+def snapshot_records(snapshot: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Generator rekordów snapshotu z latest_snapshot() (ijson; bez niego – parsowanie całości)."""
+    with _open_entry(snapshot) as fh:
+        if ijson is None:
+            logger.warning("Brak biblioteki ijson – snapshot parsowany w całości.")
+            yield from json.load(fh).get("records", [])
+        else:
+            yield from ijson.items(fh, "records.item", use_float=True)
 
-        return json.loads(body.read())
+
+def read_snapshot(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """Cały snapshot z latest_snapshot() jako świeżo sparsowany dict."""
+    with _open_entry(snapshot) as fh:
+        return json.load(fh)
+
+
+def stream_snapshot_records(key: str) -> Iterator[Dict[str, Any]]:
+    """Generator rekordów snapshotu o podanym kluczu (przez cache na dysku)."""
+    yield from snapshot_records(_fetch_cached(_s3_client(), _bucket(), key))
+
+
+def stream_latest_records() -> Iterator[Dict[str, Any]]:
+    """
+    Generator rekordów najnowszego snapshotu parsowanych przyrostowo.
+    Treść z S3 trafia strumieniowo do cache na dysku, a rekordy z `records`
+    są odczytywane z pliku po jednym (ijson), więc zużycie pamięci nie rośnie
+    z rozmiarem snapshotu. Bez biblioteki ijson – parsowanie całego pliku.
+    Błędy pobrania zgłaszane są wyjątkiem przy pierwszym next().
+    """
+    yield from snapshot_records(latest_snapshot())
+
+
+@tool(args_schema=EmptyInput, return_direct=True)
+def fetch_latest_snapshot(_: EmptyInput) -> Dict[str, Any]:
+    """
+    Pobiera najnowszy snapshot z S3 i zwraca jako dict.
+    Treść pochodzi z cache na dysku (bez pobierania, gdy ETag się nie zmienił);
+    każde wywołanie dostaje własny, świeżo sparsowany dict.
+    Jeśli wystąpi błąd – zwraca {'records': [], 'error': '...'}
+    """
+    try:
+        return read_snapshot(latest_snapshot())
 
     except Exception as e:
         report_error("s3_tool", "fetch_latest_snapshot", e)
         logger.error("❌ Błąd S3Tool: %s", e, exc_info=True)
         return {"records": [], "error": str(e)}
+
+
+if __name__ == "__main__":
+    # Użycie: python -m app.modules.s3_tool compress <snapshot.json> [gzip|zstd]
+    import sys
+
+    if len(sys.argv) < 3 or sys.argv[1] != "compress":
+        print("Użycie: python -m app.modules.s3_tool compress <snapshot.json> [gzip|zstd]")
+        sys.exit(2)
+    source = Path(sys.argv[2])
+    enc = sys.argv[3] if len(sys.argv) > 3 else "gzip"
+    suffixes = {e: s for s, e in ENCODING_SUFFIXES.items()}
+    if enc not in suffixes:
+        print(f"❌ Nieznane kodowanie: {enc} (dostępne: {', '.join(suffixes)})")
+        sys.exit(2)
+    if not source.is_file():
+        print(f"❌ Brak pliku: {source}")
+        sys.exit(2)
+    target = source.with_name(source.name + suffixes[enc])
+    target.write_bytes(encode_snapshot(source.read_bytes(), enc))
+    print(f"✅ Zapisano {target} ({source.stat().st_size} -> {target.stat().st_size} B)")
@@ -1,4 +1,6 @@
 import logging
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from pydantic import BaseModel, Field
 from langchain.tools import Tool
@@ -9,6 +11,17 @@ from app.utils.error_reporter import report_error
 SEGMENT_FIELD_ID = "fldfEIZxM3O4pF3bW"
 WOJEWODZTWO_FIELD_ID = "fldCbMMnj7vuHlmsu"
 
+# 🏷️ Kody przyczyn odrzucenia rekordu
+REASON_MISSING_CELLS = "missing_cells"
+REASON_MISSING_SEGMENT = "missing_segment"
+REASON_MISSING_WOJEWODZTWO = "missing_wojewodztwo"
+
+REASON_MESSAGES: Dict[str, str] = {
+    REASON_MISSING_CELLS: "❌ Brak danych w polu 'cellValuesByColumnId'",
+    REASON_MISSING_SEGMENT: "❌ Brak wartości segmentu pojazdu",
+    REASON_MISSING_WOJEWODZTWO: "❌ Brak województwa lub kodu pocztowego",
+}
+
 # Konfiguracja loggera
 logger = logging.getLogger(__name__)
 
@@ -19,6 +32,75 @@ class SanitizerInput(BaseModel):
     record: dict = Field(..., description="Rekord JSON do sanityzacji")
 
 
+def _is_blank(value: Any) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return not value.strip()
+    return not str(value).strip()
+
+
+def record_failures(record: Any) -> List[str]:
+    """
+    Zwraca listę kodów przyczyn dla rekordu (pusta lista = rekord poprawny).
+    Pierwszy element to przyczyna główna, kolejne – pozostałe brakujące pola.
+    """
+    cell = record.get("cellValuesByColumnId") if isinstance(record, dict) else None
+    if not isinstance(cell, dict) or not cell:
+        return [REASON_MISSING_CELLS]
+    failures = []
+    if _is_blank(cell.get(SEGMENT_FIELD_ID)):
+        failures.append(REASON_MISSING_SEGMENT)
+    if _is_blank(cell.get(WOJEWODZTWO_FIELD_ID)):
+        failures.append(REASON_MISSING_WOJEWODZTWO)
+    return failures
+
+
+class SnapshotValidator:
+    """
+    Jednoprzebiegowy walidator całego snapshotu.
+    Przyjmuje dowolny iterowalny zbiór rekordów (także generator), przepuszcza
+    poprawne rekordy dalej leniwie, a odrzucone odkłada z kodem przyczyny.
+    Liczniki: `reasons` (przyczyna główna) i `field_failures` (każde brakujące pole).
+    """
+
+    def __init__(self, keep_invalid: bool = True):
+        self.keep_invalid = keep_invalid
+        self.total = 0
+        self.valid_count = 0
+        self.invalid: List[Tuple[Any, str]] = []
+        self.reasons: Counter = Counter()
+        self.field_failures: Counter = Counter()
+
+    def iter_valid(self, records: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+        """Generator poprawnych rekordów; odrzucone trafiają do `self.invalid`."""
+        for record in records:
+            self.total += 1
+            failures = record_failures(record)
+            if not failures:
+                self.valid_count += 1
+                yield record
+                continue
+            self.reasons[failures[0]] += 1
+            self.field_failures.update(failures)
+            if self.keep_invalid:
+                self.invalid.append((record, failures[0]))
+
+    def partition(self, records: Iterable[Any]) -> Tuple[List[Dict[str, Any]], List[Tuple[Any, str]]]:
+        """Materializuje obie partycje: (poprawne, [(rekord, kod przyczyny), ...])."""
+        valid = list(self.iter_valid(records))
+        return valid, self.invalid
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "valid": self.valid_count,
+            "invalid": self.total - self.valid_count,
+            "reasons": dict(self.reasons),
+            "field_failures": dict(self.field_failures),
+        }
+
+
 def _sanityzuj_snapshot(tool_input: SanitizerInput) -> str:
     """
     Weryfikuje poprawność rekordu ze snapshotu:
@@ -26,18 +108,9 @@ def _sanityzuj_snapshot(tool_input: SanitizerInput) -> str:
       - Zwraca '✅ Rekord wygląda poprawnie' lub komunikat '❌ ...'.
     """
     try:
-        cell = tool_input.record.get("cellValuesByColumnId")
-        if not isinstance(cell, dict) or not cell:
-            return "❌ Brak danych w polu 'cellValuesByColumnId'"
-
-        segment = str(cell.get(SEGMENT_FIELD_ID, "")).strip()
-        wojewodztwo = str(cell.get(WOJEWODZTWO_FIELD_ID, "")).strip()
-
-        if not segment:
-            return "❌ Brak wartości segmentu pojazdu"
-        if not wojewodztwo:
-            return "❌ Brak województwa lub kodu pocztowego"
-
+        failures = record_failures(tool_input.record)
+        if failures:
+            return REASON_MESSAGES[failures[0]]
         return "✅ Rekord wygląda poprawnie"
 
     except Exception as e:
@@ -1,10 +1,10 @@
 import os
 import logging
 from dotenv import load_dotenv
-from twilio.rest import Client
 from twilio.base.exceptions import TwilioRestException
 from langchain.tools import Tool
 
+from app.core.clients import get_twilio_client
 from app.utils.error_reporter import report_error
 
 # Wczytaj zmienne środowiskowe z .env
@@ -22,8 +22,6 @@ def _send_whatsapp(content_variables: str) -> str:
     """
     try:
         # Odczyt konfiguracji z ENV
-        account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-        auth_token = os.getenv("TWILIO_AUTH_TOKEN")
         from_whatsapp = os.getenv("TWILIO_WHATSAPP_FROM")
         to_whatsapp = os.getenv("TWILIO_WHATSAPP_TO")
         content_sid = os.getenv("TWILIO_WHATSAPP_CONTENT_SID")
@@ -42,7 +40,7 @@ def _send_whatsapp(content_variables: str) -> str:
             logger.error(msg)
             return msg
 
-        client = Client(account_sid, auth_token)
+        client = get_twilio_client()
         try:
             # Próba wysłania wiadomości szablonem
             message = client.messages.create(
@@ -1,6 +1,9 @@
 import os
+import time
 from dotenv import load_dotenv
 
+from app.core.lazy import lazy_singleton
+
 # Wczytanie zmiennych środowiskowych z .env
 load_dotenv()
 
@@ -20,7 +23,11 @@ def get_redis_client():
         print("⚠️ REDIS_URL is not set or redis library missing — using in-memory fallback.")
         return None
     try:
-        client = redis.from_url(url, decode_responses=True)
+        client = redis.from_url(
+            url,
+            decode_responses=True,
+            socket_connect_timeout=float(os.getenv("REDIS_CONNECT_TIMEOUT", "5")),
+        )
         # Test connect
         client.ping()
         print("✅ Connected to Redis at:", url)
@@ -31,16 +38,52 @@ def get_redis_client():
         return None
 
 
+class RedisUnavailable(RuntimeError):
+    """REDIS_URL jest ustawione, ale połączenie się nie powiodło."""
+
+
+@lazy_singleton("redis_client")
+def _connect_shared_redis():
+    client = get_redis_client()
+    if client is None and redis and os.getenv("REDIS_URL"):
+        # Wyjątek zamiast None – lazy_singleton nie zapamiętuje błędów
+        raise RedisUnavailable("Brak połączenia z Redis")
+    return client
+
+
+REDIS_RETRY_SECONDS = float(os.getenv("REDIS_RETRY_SECONDS", "30"))
+_redis_failure = {"at": float("-inf")}
+
+
+def shared_redis_client():
+    """
+    Jedno połączenie Redis (pula połączeń) na proces, tworzone przy pierwszym użyciu.
+    Nieudane połączenie nie jest zapamiętywane: do czasu kolejnej próby
+    (co REDIS_RETRY_SECONDS) zwracane jest None i działa fallback lokalny.
+    """
+    if not _connect_shared_redis.is_ready() and time.monotonic() - _redis_failure["at"] < REDIS_RETRY_SECONDS:
+        return None
+    try:
+        return _connect_shared_redis()
+    except RedisUnavailable:
+        _redis_failure["at"] = time.monotonic()
+        return None
+
+
 class AgentState:
     """
     Zarządza stanem agenta (uruchomiony/zatrzymany).
     Stosuje Redis, jeśli dostępny, w przeciwnym razie pamięć lokalną.
     """
     def __init__(self):
-        self._client = get_redis_client()
-        self._in_memory = {} if self._client is None else None
+        self._in_memory = {}
         self._key = "agent:is_running"
 
+    @property
+    def _client(self):
+        # Połączenie z Redis dopiero przy pierwszym odczycie/zapisie stanu
+        return shared_redis_client()
+
     def start(self):
         """Ustawia stan agenta na uruchomiony."""
         if self._client:
@@ -0,0 +1,107 @@
+# app/utils/bloom_filter.py
+
+import math
+import time
+import struct
+import hashlib
+import logging
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"BLM2"
+_HEADER = struct.Struct(">4sQdIQQd")  # magic, capacity, error_rate, k, m, count, created_at
+
+
+class BloomFilter:
+    """
+    Filtr Blooma o stałym rozmiarze bufora.
+    Rozmiar (m bitów) i liczba funkcji skrótu (k) wynikają z pojemności
+    i dopuszczalnego odsetka fałszywych trafień. Bity numerowane są od
+    najstarszego bitu bajtu – zgodnie z GETBIT/SETBIT/BITFIELD w Redis.
+    `created_at` to czas zbudowania filtra – podstawa jego rotacji.
+    """
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.001):
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError("capacity > 0 i 0 < error_rate < 1")
+        self.capacity = int(capacity)
+        self.error_rate = float(error_rate)
+        self.m = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.k = max(1, int(round(self.m / capacity * math.log(2))))
+        self.bits = bytearray((self.m + 7) // 8)
+        self.count = 0
+        self.created_at = time.time()
+
+    def positions(self, item: str) -> List[int]:
+        # Podwójne haszowanie (Kirsch–Mitzenmacher): h1 + i*h2
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.m for i in range(self.k)]
+
+    def add(self, item: str) -> None:
+        bits = self.bits
+        for pos in self.positions(item):
+            bits[pos >> 3] |= 0x80 >> (pos & 7)
+        self.count += 1
+
+    def update(self, items: Iterable[str]) -> None:
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (0x80 >> (pos & 7)) for pos in self.positions(item))
+
+    def merge(self, other: "BloomFilter") -> None:
+        """Suma (OR) bitów z filtrem o tych samych parametrach; count jest przybliżony."""
+        if (other.k, other.m) != (self.k, self.m):
+            raise ValueError("Niespójne parametry filtra Blooma")
+        merged = int.from_bytes(self.bits, "big") | int.from_bytes(other.bits, "big")
+        self.bits[:] = merged.to_bytes(len(self.bits), "big")
+        self.count = max(self.count, other.count)
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.bits)
+
+    # --- Serializacja ---
+    def to_bytes(self) -> bytes:
+        header = _HEADER.pack(_MAGIC, self.capacity, self.error_rate, self.k, self.m, self.count, self.created_at)
+        return header + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "BloomFilter":
+        magic, capacity, error_rate, k, m, count, created_at = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("Nieprawidłowy format filtra Blooma")
+        bloom = cls(capacity, error_rate)
+        if (bloom.k, bloom.m) != (k, m) or len(data) - _HEADER.size != len(bloom.bits):
+            raise ValueError("Niespójne parametry filtra Blooma")
+        bloom.bits[:] = data[_HEADER.size:]
+        bloom.count = count
+        bloom.created_at = created_at
+        return bloom
+
+    def save(self, path: Path) -> None:
+        tmp = Path(path).with_suffix(".tmp")
+        tmp.write_bytes(self.to_bytes())
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path, capacity: int, error_rate: float) -> Optional["BloomFilter"]:
+        """Wczytuje filtr z pliku; None, gdy brak pliku lub parametry się nie zgadzają."""
+        path = Path(path)
+        if not path.is_file():
+            return None
+        try:
+            bloom = cls.from_bytes(path.read_bytes())
+        except (ValueError, struct.error) as e:
+            logger.warning("Nie można wczytać filtra Blooma %s: %s", path, e)
+            return None
+        if (bloom.capacity, bloom.error_rate) != (capacity, error_rate):
+            logger.info("Zmienione parametry filtra Blooma – przebudowa %s.", path)
+            return None
+        return bloom
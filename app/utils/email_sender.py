@@ -1,8 +1,8 @@
 import os
-import smtplib
 import logging
 from email.message import EmailMessage
 from app.utils.error_reporter import report_error
+from app.utils.mail_transport import get_mail_transport
 
 logger = logging.getLogger(__name__)
 
@@ -24,9 +24,8 @@ def send_email(subject: str, body: str) -> str:
         msg["Subject"] = subject
         msg.set_content(body)
 
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as smtp:
-            smtp.login(sender, password)
-            smtp.send_message(msg)
+        # Współdzielone, zalogowane połączenie zamiast nowego SMTP_SSL na każdą wiadomość
+        get_mail_transport(sender, password).send(msg)
 
         logger.info(f"✅ E-mail wysłany do {receiver} z tematem '{subject}'")
         return "✅ E-mail wysłany pomyślnie"
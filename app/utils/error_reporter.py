@@ -2,7 +2,6 @@ import os
 import traceback
 import requests
 import logging
-import openai
 
 log_file = "errors.log"
 logger = logging.getLogger("agent")
@@ -42,6 +41,8 @@ def report_error(module: str, context: str = "", exception: Exception = None, an
     # analiza przez GPT (jeśli włączona)
     if analyze:
         try:
+            import openai  # leniwie – import openai jest kosztowny przy starcie API
+
             gpt_response = openai.ChatCompletion.create(
                 model="gpt-4",
                 messages=[
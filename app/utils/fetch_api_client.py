@@ -14,9 +14,9 @@ class FetchAPIClient:
     Obsługuje /status, /start, /stop z jednolitą konfiguracją timeout i logowaniem.
     """
 
-    def __init__(self, base_url: Optional[str] = None, timeout: int = 10):
+    def __init__(self, base_url: Optional[str] = None, timeout: Optional[float] = None):
         self.base_url = base_url or os.getenv("FETCH_URL", "https://fetch-2-0.onrender.com")
-        self.timeout = timeout
+        self.timeout = timeout or float(os.getenv("FETCH_HTTP_TIMEOUT", "10"))
         self.session = requests.Session()
 
     def _get(self, path: str) -> Dict[str, Any]:
@@ -0,0 +1,272 @@
+# app/utils/mail_transport.py
+
+import os
+import ssl
+import time
+import hashlib
+import queue
+import logging
+import smtplib
+import threading
+from email.message import Message
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _is_connection_error(exc: BaseException) -> bool:
+    """Zerwane/nieświeże połączenie (wtedy łączymy się ponownie), a nie odmowa serwera."""
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return True
+    # SMTPException dziedziczy po OSError – odpowiedzi serwera nie są błędem połączenia
+    return isinstance(exc, OSError) and not isinstance(exc, smtplib.SMTPException)
+
+
+class _Connection:
+    __slots__ = ("smtp", "last_used")
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+
+
+class SMTPTransport:
+    """
+    Pula trwałych, zalogowanych połączeń SMTP współdzielona przez nadawców.
+    Połączenie bezczynne dłużej niż `noop_after_s` jest sprawdzane NOOP-em przed
+    użyciem, starsze niż `max_idle_s` – otwierane od nowa; zerwane połączenie
+    jest odtwarzane, a wysyłka ponawiana raz.
+    Host/port/SSL z ENV (SMTP_HOST, SMTP_PORT, SMTP_SSL, SMTP_STARTTLS), więc
+    można testować z lokalnym serwerem, np. `python -m aiosmtpd -n -l localhost:8025`
+    i SMTP_HOST=localhost SMTP_PORT=8025 SMTP_SSL=0.
+    """
+
+    def __init__(
+        self,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        use_ssl: Optional[bool] = None,
+        starttls: Optional[bool] = None,
+        pool_size: Optional[int] = None,
+        timeout: Optional[float] = None,
+        noop_after_s: Optional[float] = None,
+        max_idle_s: Optional[float] = None,
+    ):
+        self.username = username
+        self.password = password
+        self.host = host or os.getenv("SMTP_HOST", "smtp.gmail.com")
+        self.port = int(port or os.getenv("SMTP_PORT", "465"))
+        self.use_ssl = use_ssl if use_ssl is not None else os.getenv("SMTP_SSL", "1" if self.port == 465 else "0") == "1"
+        self.starttls = starttls if starttls is not None else os.getenv("SMTP_STARTTLS", "0") == "1"
+        self.pool_size = pool_size or int(os.getenv("SMTP_POOL_SIZE", "2"))
+        self.timeout = timeout or float(os.getenv("SMTP_TIMEOUT", "15"))
+        self.noop_after_s = noop_after_s if noop_after_s is not None else float(os.getenv("SMTP_NOOP_AFTER_S", "30"))
+        self.max_idle_s = max_idle_s if max_idle_s is not None else float(os.getenv("SMTP_MAX_IDLE_S", "240"))
+
+        self._idle: "queue.LifoQueue[_Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self.stats = {"connects": 0, "reconnects": 0, "noops": 0, "sent": 0, "failed": 0}
+
+    # --- Połączenia ---
+    def _connect(self) -> _Connection:
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout, context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                smtp.starttls(context=ssl.create_default_context())
+        try:
+            smtp.ehlo_or_helo_if_needed()
+            # Lokalne serwery testowe zwykle nie ogłaszają AUTH
+            if self.password and smtp.has_extn("auth"):
+                smtp.login(self.username, self.password)
+        except Exception:
+            self._close(smtp)
+            raise
+        self.stats["connects"] += 1
+        logger.info("📬 Połączono z SMTP %s:%s.", self.host, self.port)
+        return _Connection(smtp)
+
+    @staticmethod
+    def _close(smtp: smtplib.SMTP) -> None:
+        try:
+            smtp.quit()
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+    def _is_alive(self, conn: _Connection) -> bool:
+        idle = time.monotonic() - conn.last_used
+        if idle > self.max_idle_s:
+            return False
+        if idle > self.noop_after_s:
+            self.stats["noops"] += 1
+            try:
+                return conn.smtp.noop()[0] == 250
+            except OSError:
+                return False
+        return True
+
+    def _acquire(self) -> _Connection:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_open = self._opened < self.pool_size
+                    if can_open:
+                        self._opened += 1
+                if can_open:
+                    try:
+                        return self._connect()
+                    except Exception:
+                        with self._lock:
+                            self._opened -= 1
+                        raise
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"Brak wolnego połączenia SMTP w puli ({self.pool_size})") from None
+            if self._is_alive(conn):
+                return conn
+            self._discard(conn)
+
+    def _release(self, conn: _Connection) -> None:
+        conn.last_used = time.monotonic()
+        self._idle.put(conn)
+
+    def _discard(self, conn: _Connection) -> None:
+        self._close(conn.smtp)
+        with self._lock:
+            self._opened -= 1
+
+    # --- Wysyłka ---
+    def _send_on(self, conn: _Connection, msg: Message, from_addr: Optional[str], to_addrs: Optional[Sequence[str]]) -> None:
+        conn.smtp.send_message(msg, from_addr=from_addr, to_addrs=to_addrs)
+        conn.last_used = time.monotonic()
+
+    def send(self, msg: Message, from_addr: Optional[str] = None, to_addrs: Optional[Sequence[str]] = None) -> None:
+        """Wysyła jedną wiadomość; przy zerwanym połączeniu łączy się ponownie i ponawia raz."""
+        self.send_many([(msg, from_addr, to_addrs)], raise_errors=True)
+
+    def send_many(
+        self,
+        messages: Iterable,
+        raise_errors: bool = False,
+    ) -> List[Optional[str]]:
+        """
+        Wysyła wiadomości jednym połączeniem z puli. Elementy: Message albo
+        krotka (Message, from_addr, to_addrs). Zwraca listę: None dla wysłanej
+        wiadomości lub opis błędu (raise_errors=True – wyjątek przy pierwszym błędzie).
+        """
+        results: List[Optional[str]] = []
+        conn: Optional[_Connection] = None
+        try:
+            for item in messages:
+                msg, from_addr, to_addrs = item if isinstance(item, tuple) else (item, None, None)
+                try:
+                    if conn is None:
+                        conn = self._acquire()
+                    try:
+                        self._send_on(conn, msg, from_addr, to_addrs)
+                    except Exception as e:
+                        if not _is_connection_error(e):
+                            raise
+                        logger.warning("🔄 Połączenie SMTP zerwane (%s) – łączę ponownie.", e)
+                        self.stats["reconnects"] += 1
+                        self._discard(conn)
+                        conn = None
+                        conn = self._acquire()
+                        self._send_on(conn, msg, from_addr, to_addrs)
+                    self.stats["sent"] += 1
+                    results.append(None)
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    if conn is not None and _is_connection_error(e):
+                        self._discard(conn)
+                        conn = None
+                    if raise_errors:
+                        raise
+                    results.append(str(e))
+        finally:
+            if conn is not None:
+                self._release(conn)
+        return results
+
+    # --- Utrzymanie ---
+    def keepalive(self) -> int:
+        """NOOP na bezczynnych połączeniach; martwe są zamykane. Zwraca liczbę żywych."""
+        alive: List[_Connection] = []
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.last_used -= self.noop_after_s + 1  # wymusza NOOP w _is_alive
+            if self._is_alive(conn):
+                conn.last_used = time.monotonic()
+                alive.append(conn)
+            else:
+                self._discard(conn)
+        for conn in alive:
+            self._idle.put(conn)
+        return len(alive)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def metrics(self) -> Dict[str, object]:
+        return {**self.stats, "open": self._opened, "idle": self._idle.qsize(), "host": f"{self.host}:{self.port}"}
+
+
+_transports: Dict[Tuple[str, int, Optional[str], str], SMTPTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def _secret_digest(password: Optional[str]) -> str:
+    # Hasło nie trafia wprost do klucza puli (repr, logi, metryki)
+    return hashlib.sha256((password or "").encode("utf-8")).hexdigest()[:16]
+
+
+def get_mail_transport(username: Optional[str], password: Optional[str]) -> SMTPTransport:
+    """
+    Współdzielony transport dla konta `username` na SMTP_HOST:SMTP_PORT.
+    Klucz puli obejmuje skrót hasła: po zmianie hasła powstaje nowy transport,
+    a połączenia zalogowane starym hasłem są zamykane.
+    """
+    host = os.getenv("SMTP_HOST", "smtp.gmail.com")
+    port = int(os.getenv("SMTP_PORT", "465"))
+    key = (host, port, username, _secret_digest(password))
+    with _transports_lock:
+        transport = _transports.get(key)
+        if transport is None:
+            for stale in [k for k in _transports if k[:3] == key[:3]]:
+                _transports.pop(stale).close()
+            transport = _transports[key] = SMTPTransport(username, password, host=host, port=port)
+        return transport
+
+
+def mail_transport_metrics() -> Dict[str, object]:
+    return {f"{user}@{host}:{port}": t.metrics() for (host, port, user, _), t in _transports.items()}
+
+
+def keepalive_mail_transports() -> Dict[str, int]:
+    """NOOP na bezczynnych połączeniach wszystkich transportów; zwraca liczbę żywych per konto."""
+    with _transports_lock:
+        transports = list(_transports.items())
+    return {f"{user}@{host}:{port}": t.keepalive() for (host, port, user, _), t in transports}
+
+
+def close_mail_transports() -> None:
+    with _transports_lock:
+        for transport in _transports.values():
+            transport.close()
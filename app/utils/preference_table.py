@@ -0,0 +1,270 @@
+# app/utils/preference_table.py
+
+import os
+import sys
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREFERENCES_PATH = "data/tablica binarna segment + wojewodztwo.xlsx"
+SIDECAR_SUFFIX = ".prefs.json"
+SIDECAR_VERSION = 1
+
+
+def _normalize(value: object) -> str:
+    return str(value).strip().upper()
+
+
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def sidecar_path_for(source: Path) -> Path:
+    """Ścieżka skompilowanej tabeli obok arkusza, np. tablica.xlsx -> tablica.prefs.json."""
+    source = Path(source)
+    return source.with_name(source.stem + SIDECAR_SUFFIX)
+
+
+# --- Kompilacja (build-time, wymaga pandas/openpyxl) ---
+def read_workbook(source: Path) -> Tuple[List[str], List[str], Dict[Tuple[str, str], bool]]:
+    """
+    Czyta arkusz preferencji i zwraca (segmenty, województwa, indeks).
+    Pierwsza kolumna (lub kolumna SEGMENT) to segment, pozostałe – województwa.
+    """
+    import pandas as pd
+
+    df = pd.read_excel(source)
+    df.columns = [_normalize(col) for col in df.columns]
+    segment_col = "SEGMENT" if "SEGMENT" in df.columns else df.columns[0]
+    regions = [col for col in df.columns if col != segment_col]
+
+    segments: List[str] = []
+    index: Dict[Tuple[str, str], bool] = {}
+    for row in df.itertuples(index=False):
+        values = dict(zip(df.columns, row))
+        segment = _normalize(values[segment_col])
+        if not segment or segment == "NAN":
+            continue
+        segments.append(segment)
+        for region in regions:
+            index[(segment, region)] = values[region] == 1
+    return segments, regions, index
+
+
+def compile_preferences(source: Path, target: Optional[Path] = None) -> Path:
+    """
+    Kompiluje arkusz xlsx do sidecara JSON z bitmapą: dla każdego segmentu
+    liczba, w której bit i odpowiada województwu regions[i].
+    """
+    source = Path(source)
+    target = Path(target or sidecar_path_for(source))
+    segments, regions, index = read_workbook(source)
+    bitmap = {
+        segment: sum(1 << i for i, region in enumerate(regions) if index[(segment, region)])
+        for segment in segments
+    }
+    payload = {
+        "version": SIDECAR_VERSION,
+        "source": source.name,
+        "source_sha256": _sha256(source),
+        "segments": segments,
+        "regions": regions,
+        "bitmap": bitmap,
+    }
+    tmp = target.with_name(target.name + ".tmp")
+    tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(target)
+    logger.info("Skompilowano %s -> %s", source, target)
+    return target
+
+
+def check_preferences(source: Path, target: Optional[Path] = None) -> List[str]:
+    """
+    Porównuje sidecar z arkuszem źródłowym. Zwraca listę rozbieżności (pusta = zgodne).
+    """
+    source = Path(source)
+    target = Path(target or sidecar_path_for(source))
+    if not target.is_file():
+        return [f"Brak skompilowanej tabeli: {target}"]
+
+    problems: List[str] = []
+    data = json.loads(target.read_text(encoding="utf-8"))
+    if data.get("source_sha256") != _sha256(source):
+        problems.append("Hash arkusza źródłowego różni się od zapisanego w sidecarze")
+
+    _, _, index = read_workbook(source)
+    compiled = _index_from_sidecar(data)
+    for key in sorted(set(index) | set(compiled)):
+        if index.get(key) != compiled.get(key):
+            problems.append(f"Rozbieżność dla {key}: arkusz={index.get(key)} sidecar={compiled.get(key)}")
+    return problems
+
+
+def _index_from_sidecar(data: dict) -> Dict[Tuple[str, str], bool]:
+    if data.get("version") != SIDECAR_VERSION:
+        raise ValueError(f"Nieobsługiwana wersja tabeli preferencji: {data.get('version')}")
+    regions = data["regions"]
+    return {
+        (segment, region): bool(bits >> i & 1)
+        for segment, bits in data["bitmap"].items()
+        for i, region in enumerate(regions)
+    }
+
+
+class PreferenceTable:
+    """
+    Skompilowana tabela preferencji: indeks (segment, województwo) -> bool.
+    W runtime czyta wyłącznie sidecar JSON (bez pandas); indeks przebudowywany
+    jest tylko wtedy, gdy zmieni się mtime/rozmiar i hash sidecara.
+    Bezpieczna do współdzielenia między wątkami i żądaniami.
+    """
+
+    def __init__(self, path: Path, source: Optional[Path] = None):
+        self.path = Path(path)
+        self.source = Path(source) if source else None
+        self._lock = threading.Lock()
+        self._stat: Optional[Tuple[int, int]] = None
+        self._digest: Optional[str] = None
+        self._index: Dict[Tuple[str, str], bool] = {}
+        self._segments: FrozenSet[str] = frozenset()
+        self._regions: FrozenSet[str] = frozenset()
+        self._frame = None
+
+    # --- Ładowanie ---
+    def exists(self) -> bool:
+        """
+        True, jeśli skompilowana tabela jest dostępna. Gdy brakuje sidecara,
+        a istnieje arkusz źródłowy, kompiluje go jednorazowo (wymaga pandas).
+        """
+        if self.path.is_file():
+            return True
+        if self.source and self.source.is_file():
+            logger.warning("Brak skompilowanej tabeli %s, kompiluję z %s", self.path, self.source)
+            with self._lock:
+                if not self.path.is_file():
+                    compile_preferences(self.source, self.path)
+            return True
+        return False
+
+    def _refresh(self) -> None:
+        st = self.path.stat()
+        stat_key = (st.st_mtime_ns, st.st_size)
+        if stat_key == self._stat:
+            return
+
+        with self._lock:
+            if stat_key == self._stat:
+                return
+            raw = self.path.read_bytes()
+            digest = hashlib.sha256(raw).hexdigest()
+            if digest != self._digest:
+                index = _index_from_sidecar(json.loads(raw))
+                self._index = index
+                self._segments = frozenset(s for s, _ in index)
+                self._regions = frozenset(r for _, r in index)
+                self._frame = None
+                self._digest = digest
+                logger.info(
+                    "Załadowano tabelę preferencji %s (%d segmentów × %d województw)",
+                    self.path, len(self._segments), len(self._regions)
+                )
+            self._stat = stat_key
+
+    # --- API ---
+    def has_segment(self, segment: str) -> bool:
+        self._refresh()
+        return _normalize(segment) in self._segments
+
+    def has_region(self, wojewodztwo: str) -> bool:
+        self._refresh()
+        return _normalize(wojewodztwo) in self._regions
+
+    def is_preferred(self, segment: str, wojewodztwo: str) -> bool:
+        """Zwraca True, jeśli w tabeli dla pary (segment, województwo) jest 1."""
+        self._refresh()
+        return self._index.get((_normalize(segment), _normalize(wojewodztwo)), False)
+
+    @property
+    def version(self) -> Optional[str]:
+        """sha256 aktualnie załadowanego sidecara – zmienia się po przeładowaniu tabeli."""
+        self._refresh()
+        return self._digest
+
+    @property
+    def segments(self) -> FrozenSet[str]:
+        self._refresh()
+        return self._segments
+
+    @property
+    def regions(self) -> FrozenSet[str]:
+        self._refresh()
+        return self._regions
+
+    def to_frame(self):
+        """
+        Zwraca tabelę w postaci długiej (DataFrame: segment, wojewodztwo, preferred)
+        do złączeń wsadowych. Ramka jest cache'owana do następnej przebudowy indeksu.
+        """
+        import pandas as pd
+
+        self._refresh()
+        with self._lock:
+            if self._frame is None:
+                self._frame = pd.DataFrame(
+                    [(s, r, v) for (s, r), v in self._index.items()],
+                    columns=["segment", "wojewodztwo", "preferred"],
+                )
+            return self._frame
+
+
+_tables: Dict[Path, PreferenceTable] = {}
+_tables_lock = threading.Lock()
+
+
+def get_preference_table(path: Optional[Path] = None) -> PreferenceTable:
+    """
+    Zwraca współdzieloną instancję tabeli preferencji.
+    Sidecar: ENV PREFERENCES_TABLE_PATH lub <PREFERENCES_XLSX_PATH>.prefs.json.
+    """
+    source = Path(os.getenv("PREFERENCES_XLSX_PATH", DEFAULT_PREFERENCES_PATH))
+    resolved = Path(path or os.getenv("PREFERENCES_TABLE_PATH") or sidecar_path_for(source))
+    with _tables_lock:
+        table = _tables.get(resolved)
+        if table is None:
+            table = _tables[resolved] = PreferenceTable(resolved, source=source)
+        return table
+
+
+def preference_table_version() -> Optional[str]:
+    """Wersja współdzielonej tabeli preferencji (do kluczy memoizacji); None, gdy niedostępna."""
+    try:
+        table = get_preference_table()
+        return table.version if table.exists() else None
+    except (OSError, ValueError) as e:
+        logger.warning("Nie można ustalić wersji tabeli preferencji: %s", e)
+        return None
+
+
+if __name__ == "__main__":
+    # Użycie: python -m app.utils.preference_table build|check [plik.xlsx] [sidecar.json]
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+    src = Path(sys.argv[2] if len(sys.argv) > 2 else os.getenv("PREFERENCES_XLSX_PATH", DEFAULT_PREFERENCES_PATH))
+    dst = Path(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    if command == "build":
+        print(f"✅ Zapisano {compile_preferences(src, dst)}")
+    elif command == "check":
+        issues = check_preferences(src, dst)
+        for issue in issues:
+            print(f"❌ {issue}")
+        print("✅ Tabela zgodna z arkuszem" if not issues else f"❌ Rozbieżności: {len(issues)}")
+        sys.exit(1 if issues else 0)
+    else:
+        print(f"❌ Nieznana komenda: {command} (build|check)")
+        sys.exit(2)
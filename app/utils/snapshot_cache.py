@@ -0,0 +1,161 @@
+# app/utils/snapshot_cache.py
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = "data/snapshot_cache"
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+class SnapshotCache:
+    """
+    Lokalny cache snapshotów S3 adresowany treścią.
+    Treść zapisywana jest jako <sha256> w katalogu cache, a indeks
+    (index.json) mapuje klucz S3 na ETag, LastModified i skrót treści.
+    Rozmiar jest ograniczony – najdawniej używane pliki są usuwane (LRU po mtime).
+    """
+
+    def __init__(self, directory: Optional[Path] = None, max_bytes: Optional[int] = None):
+        self.directory = Path(directory or os.getenv("SNAPSHOT_CACHE_DIR", DEFAULT_CACHE_DIR))
+        self.max_bytes = int(max_bytes or os.getenv("SNAPSHOT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._index_path = self.directory / "index.json"
+        self._lock = threading.Lock()
+
+    # --- Indeks ---
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        if self._index_path.is_file():
+            try:
+                data = json.loads(self._index_path.read_text(encoding="utf-8"))
+                if isinstance(data, dict):
+                    return data
+            except json.JSONDecodeError as e:
+                logger.warning("Uszkodzony indeks cache %s, zaczynam od zera: %s", self._index_path, e)
+        return {}
+
+    def _save_index(self, index: Dict[str, Dict[str, Any]]) -> None:
+        tmp = self._index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(index), encoding="utf-8")
+        tmp.replace(self._index_path)
+
+    def _blob(self, digest: str) -> Path:
+        return self.directory / digest
+
+    # --- API ---
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Zwraca wpis {'etag', 'last_modified', 'digest', 'size', 'encoding'}
+        lub None, gdy brak treści na dysku. Treść trzymana jest w postaci z S3
+        (także skompresowanej).
+        """
+        with self._lock:
+            entry = self._load_index().get(key)
+        if entry and self._blob(entry["digest"]).is_file():
+            return entry
+        return None
+
+    def open(self, entry: Dict[str, Any]) -> Optional[BinaryIO]:
+        """
+        Otwiera treść wpisu do odczytu binarnego i oznacza ją jako ostatnio używaną.
+        Zwraca None (chybienie), gdy treść została w międzyczasie usunięta z cache.
+        """
+        path = self._blob(entry["digest"])
+        try:
+            fh = path.open("rb")
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # usunięta już po otwarciu – deskryptor nadal czyta treść
+        return fh
+
+    def put(
+        self,
+        key: str,
+        body: BinaryIO,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        encoding: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Zapisuje treść strumieniowo (porcjami po CHUNK_SIZE), licząc skrót w locie,
+        więc w pamięci nigdy nie ląduje cały snapshot.
+        """
+        sha = hashlib.sha256()
+        size = 0
+        tmp = self.directory / f"{threading.get_ident()}-{os.getpid()}.tmp"
+        try:
+            with tmp.open("wb") as out:
+                for chunk in iter(lambda: body.read(CHUNK_SIZE), b""):
+                    sha.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        digest = sha.hexdigest()
+        entry = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "digest": digest,
+            "size": size,
+            "encoding": encoding,
+        }
+
+        with self._lock:
+            path = self._blob(digest)
+            if path.is_file():
+                tmp.unlink(missing_ok=True)
+                os.utime(path)
+            else:
+                tmp.replace(path)
+            index = self._load_index()
+            index[key] = entry
+            self._evict(index, keep=digest)
+            self._save_index(index)
+        return entry
+
+    def annotate(self, key: str, entry: Dict[str, Any], **fields: Any) -> Dict[str, Any]:
+        """Dopisuje do wpisu pola wyliczone z treści (np. rodzaj snapshotu) – raz na treść."""
+        with self._lock:
+            index = self._load_index()
+            if index.get(key, {}).get("digest") == entry["digest"]:
+                index[key] = {**index[key], **fields}
+                self._save_index(index)
+        return {**entry, **fields}
+
+    def _evict(self, index: Dict[str, Dict[str, Any]], keep: str) -> None:
+        blobs = [p for p in self.directory.iterdir() if p.is_file() and len(p.name) == 64]
+        total = sum(p.stat().st_size for p in blobs)
+        for path in sorted(blobs, key=lambda p: p.stat().st_mtime):
+            if total <= self.max_bytes:
+                break
+            if path.name == keep:
+                continue
+            total -= path.stat().st_size
+            path.unlink(missing_ok=True)
+            for k in [k for k, v in index.items() if v.get("digest") == path.name]:
+                del index[k]
+            logger.info("🧹 Usunięto z cache snapshot %s", path.name)
+
+
+_cache: Optional[SnapshotCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_snapshot_cache() -> SnapshotCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SnapshotCache()
+    return _cache
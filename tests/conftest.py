@@ -0,0 +1,38 @@
+# tests/conftest.py
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    """Każdy test w osobnym katalogu roboczym (data/), bez Redis i bez .env."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.setenv("SNAPSHOT_TRACKER_BACKEND", "local")
+    monkeypatch.setenv("SNAPSHOT_DELTA_DIR", str(tmp_path / "data"))
+    return tmp_path
+
+
+def make_record(record_id, segment="OSOBOWE", wojewodztwo="12"):
+    from app.modules.snapshot_sanitizer_tool import SEGMENT_FIELD_ID, WOJEWODZTWO_FIELD_ID
+
+    return {
+        "id": record_id,
+        "cellValuesByColumnId": {SEGMENT_FIELD_ID: segment, WOJEWODZTWO_FIELD_ID: wojewodztwo},
+    }
+
+
+@pytest.fixture
+def snapshots(monkeypatch):
+    """Snapshoty w S3 zastąpione słownikiem klucz -> rekordy; 'keys' = (najnowszy, poprzedni)."""
+    from app.core import snapshot_delta
+
+    state = {"keys": ("s/2.json", "s/1.json"), "data": {}}
+    monkeypatch.setattr(
+        snapshot_delta,
+        "latest_snapshot",
+        lambda: {"key": state["keys"][0], "previous_key": state["keys"][1], "kind": "motoassist"},
+    )
+    monkeypatch.setattr(snapshot_delta, "snapshot_records", lambda snapshot: iter(state["data"][snapshot["key"]]))
+    monkeypatch.setattr(snapshot_delta, "stream_snapshot_records", lambda key: iter(state["data"][key]))
+    return state
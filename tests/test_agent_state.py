@@ -0,0 +1,38 @@
+# tests/test_agent_state.py
+
+import pytest
+
+from app.state import agent_state
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def flaky_redis(monkeypatch):
+    monkeypatch.setenv("REDIS_URL", "redis://localhost:6379/0")
+    attempts = []
+    client = fakeredis.FakeRedis(decode_responses=True)
+
+    def _connect():
+        attempts.append(1)
+        return None if len(attempts) == 1 else client
+
+    monkeypatch.setattr(agent_state, "get_redis_client", _connect)
+    agent_state._connect_shared_redis.reset()
+    monkeypatch.setitem(agent_state._redis_failure, "at", float("-inf"))
+    yield client, attempts
+    agent_state._connect_shared_redis.reset()
+
+
+def test_failed_connection_is_retried_after_backoff(flaky_redis, monkeypatch):
+    client, attempts = flaky_redis
+    monkeypatch.setattr(agent_state, "REDIS_RETRY_SECONDS", 30)
+
+    assert agent_state.shared_redis_client() is None
+    assert agent_state.shared_redis_client() is None  # w oknie backoffu bez nowej próby
+    assert len(attempts) == 1
+
+    monkeypatch.setattr(agent_state, "REDIS_RETRY_SECONDS", 0)
+    assert agent_state.shared_redis_client() is client
+    assert agent_state.shared_redis_client() is client
+    assert len(attempts) == 2
@@ -0,0 +1,73 @@
+# tests/test_decision_tool.py
+
+import json
+
+import pytest
+
+from app.modules import decision_tool, mapper_tool
+from app.modules.decision_tool import DecisionInput, _decide_if_order_is_good, decide_orders_batch
+from app.modules.snapshot_sanitizer_tool import SEGMENT_FIELD_ID, WOJEWODZTWO_FIELD_ID
+from app.utils import preference_table
+from app.utils.preference_table import SIDECAR_VERSION
+from conftest import make_record
+
+
+@pytest.fixture(autouse=True)
+def tables(isolated_env, monkeypatch):
+    """Mapowanie ID → województwo i tabela preferencji w katalogu testu."""
+    mapping = isolated_env / "wojewodztwa_mapping.json"
+    mapping.write_text(json.dumps({"12": "Małopolskie", "14": "mazowieckie", "99": "ATLANTYDA"}), encoding="utf-8")
+    monkeypatch.setattr(mapper_tool, "_MAPPING_PATH", mapping)
+    monkeypatch.setattr(mapper_tool, "_mapa_id_cache", None)
+
+    sidecar = isolated_env / "prefs.json"
+    sidecar.write_text(json.dumps({
+        "version": SIDECAR_VERSION,
+        "regions": ["MAŁOPOLSKIE", "MAZOWIECKIE"],
+        "bitmap": {"OSOBOWE": 0b01, "CIĘŻAROWE": 0b10},
+    }), encoding="utf-8")
+    monkeypatch.setenv("PREFERENCES_TABLE_PATH", str(sidecar))
+    monkeypatch.setattr(preference_table, "_tables", {})
+    monkeypatch.setattr(decision_tool, "report_error", lambda *args, **kwargs: None)
+
+
+def _record(record_id, **cells):
+    return {"id": record_id, "cellValuesByColumnId": cells}
+
+
+RECORDS = [
+    make_record("tak", segment="osobowe ", wojewodztwo="12"),
+    make_record("nie", segment="OSOBOWE", wojewodztwo="14"),
+    make_record("tak-2", segment="Ciężarowe", wojewodztwo=14),
+    {"id": "bez-pol"},
+    {"id": "puste-pola", "cellValuesByColumnId": {}},
+    _record("segment-none", **{SEGMENT_FIELD_ID: None, WOJEWODZTWO_FIELD_ID: "12"}),
+    _record("segment-pusty", **{SEGMENT_FIELD_ID: "  ", WOJEWODZTWO_FIELD_ID: "12"}),
+    _record("segment-zero", **{SEGMENT_FIELD_ID: 0, WOJEWODZTWO_FIELD_ID: "12"}),
+    _record("brak-wojewodztwa", **{SEGMENT_FIELD_ID: "OSOBOWE"}),
+    make_record("nieznane-id", wojewodztwo="77"),
+    make_record("spoza-tabeli", wojewodztwo="99"),
+    make_record("nieznany-segment", segment="MOTOCYKL", wojewodztwo="12"),
+]
+
+
+def test_batch_matches_single_record_decisions():
+    batch = decide_orders_batch(RECORDS)
+
+    single = [_decide_if_order_is_good(DecisionInput(record=record)) for record in RECORDS]
+    assert [b["id"] for b in batch] == [r.get("id") for r in RECORDS]
+    assert [b["decision"] or b["error"] for b in batch] == single
+
+
+def test_decisions_and_errors_per_case():
+    by_id = {d["id"]: d["decision"] or d["error"] for d in decide_orders_batch(RECORDS)}
+
+    assert by_id["tak"] == "TAK"
+    assert by_id["nie"] == "NIE"
+    assert by_id["tak-2"] == "TAK"
+    assert by_id["segment-none"] == by_id["segment-pusty"] == "❌ Rekord niepoprawny: ❌ Brak wartości segmentu pojazdu"
+    assert by_id["segment-zero"] == "❌ Segment '0' nie występuje w tabeli"
+    assert by_id["brak-wojewodztwa"] == "❌ Rekord niepoprawny: ❌ Brak województwa lub kodu pocztowego"
+    assert by_id["nieznane-id"].startswith("❌ Nie udało się rozpoznać województwa")
+    assert by_id["spoza-tabeli"] == "❌ Województwo 'ATLANTYDA' nie występuje w tabeli"
+    assert by_id["nieznany-segment"] == "❌ Segment 'MOTOCYKL' nie występuje w tabeli"
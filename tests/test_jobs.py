@@ -0,0 +1,34 @@
+# tests/test_jobs.py
+
+import asyncio
+import threading
+
+from app.core.jobs import JOB_DONE, JOB_RUNNING, JobManager
+
+
+def test_eviction_keeps_running_jobs():
+    release = threading.Event()
+
+    async def _scenario():
+        jobs = JobManager(max_workers=2, max_jobs=1)
+        done = jobs.submit("szybkie", lambda: "ok")
+        while done["status"] != JOB_DONE:
+            await asyncio.sleep(0.01)
+
+        running = jobs.submit("długie", lambda: release.wait(5) and "koniec")
+        while running["status"] != JOB_RUNNING:
+            await asyncio.sleep(0.01)
+        queued = jobs.submit("kolejne", lambda: "ok")
+
+        # Limit 1: zakończone zlecenie usunięte, trwające nadal dostępne
+        assert jobs.get(done["id"]) is None
+        assert jobs.get(running["id"]) is running
+        assert jobs.get(queued["id"]) is queued
+
+        release.set()
+        while running["status"] != JOB_DONE or queued["status"] != JOB_DONE:
+            await asyncio.sleep(0.01)
+        assert running["result"] == "koniec"
+        jobs.shutdown()
+
+    asyncio.run(_scenario())
@@ -0,0 +1,37 @@
+# tests/test_llm_cache.py
+
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from app.core.llm_cache import cache_key
+
+
+def _turn(call_ids, message_id, results=("TAK", "NIE")):
+    calls = [{"name": "decide_if_order_is_good", "args": {"id": f"rec{i}"}, "id": cid} for i, cid in enumerate(call_ids)]
+    return [
+        SystemMessage("Agent"),
+        HumanMessage("Rozpocznij analizę"),
+        AIMessage(
+            "",
+            id=message_id,
+            tool_calls=calls,
+            response_metadata={"id": f"chatcmpl-{message_id}", "system_fingerprint": "fp"},
+        ),
+        *[ToolMessage(result, tool_call_id=cid) for cid, result in zip(call_ids, results)],
+    ]
+
+
+def test_key_ignores_random_message_and_tool_call_ids():
+    first = cache_key(dumps(_turn(["call_a", "call_b"], "run-1")), "gpt-4o")
+    second = cache_key(dumps(_turn(["call_x", "call_y"], "run-2")), "gpt-4o")
+    assert first == second
+
+
+def test_key_keeps_tool_call_pairing_and_message_classes():
+    base = cache_key(dumps(_turn(["call_a", "call_b"], "run-1")), "gpt-4o")
+    swapped = cache_key(dumps(_turn(["call_a", "call_b"], "run-1", results=("NIE", "TAK"))), "gpt-4o")
+    assert base != swapped
+
+    as_system = cache_key(dumps([SystemMessage("tekst")]), "gpt-4o")
+    as_human = cache_key(dumps([HumanMessage("tekst")]), "gpt-4o")
+    assert as_system != as_human
@@ -0,0 +1,106 @@
+# tests/test_mail_transport.py
+
+import socket
+from email.mime.text import MIMEText
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller
+
+from app.utils import mail_transport
+from app.utils.mail_transport import SMTPTransport
+
+
+class _Inbox:
+    def __init__(self):
+        self.subjects = []
+
+    async def handle_DATA(self, server, session, envelope):
+        text = envelope.content.decode("utf-8", "replace")
+        self.subjects.extend(line.split(":", 1)[1].strip() for line in text.splitlines() if line.startswith("Subject:"))
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class _Server:
+    """Lokalny serwer aiosmtpd; restart() zrywa otwarte połączenia klientów."""
+
+    def __init__(self):
+        self.inbox = _Inbox()
+        self.hostname = "127.0.0.1"
+        self.port = _free_port()
+        self._start()
+
+    def _start(self):
+        self.controller = Controller(self.inbox, hostname=self.hostname, port=self.port)
+        self.controller.start()
+
+    def restart(self):
+        self.controller.stop()
+        self._start()
+
+
+@pytest.fixture
+def smtp_server():
+    server = _Server()
+    yield server
+    server.controller.stop()
+
+
+def _message(subject: str) -> MIMEText:
+    msg = MIMEText("treść")
+    msg["Subject"] = subject
+    msg["From"] = "agent@example.com"
+    msg["To"] = "biuro@example.com"
+    return msg
+
+
+def _transport(server) -> SMTPTransport:
+    return SMTPTransport(host=server.hostname, port=server.port, use_ssl=False, pool_size=1, timeout=5, noop_after_s=60)
+
+
+def test_send_reconnects_and_retries_after_server_restart(smtp_server):
+    transport = _transport(smtp_server)
+    transport.send(_message("pierwsza"))
+
+    # Restart serwera zrywa połączenie czekające w puli
+    smtp_server.restart()
+
+    transport.send(_message("druga"))
+
+    assert smtp_server.inbox.subjects == ["pierwsza", "druga"]
+    assert transport.stats["reconnects"] == 1
+    assert transport.stats["connects"] == 2
+    assert transport.stats["sent"] == 2 and transport.stats["failed"] == 0
+    transport.close()
+
+
+def test_send_many_uses_one_connection(smtp_server):
+    transport = _transport(smtp_server)
+
+    errors = transport.send_many([_message(f"zlecenie {i}") for i in range(3)])
+
+    assert errors == [None, None, None]
+    assert transport.stats["connects"] == 1
+    assert transport.keepalive() == 1
+    transport.close()
+
+
+def test_pool_key_includes_credentials(smtp_server, monkeypatch):
+    monkeypatch.setenv("SMTP_HOST", smtp_server.hostname)
+    monkeypatch.setenv("SMTP_PORT", str(smtp_server.port))
+    monkeypatch.setattr(mail_transport, "_transports", {})
+
+    old = mail_transport.get_mail_transport("agent@example.com", "stare")
+    assert mail_transport.get_mail_transport("agent@example.com", "stare") is old
+
+    new = mail_transport.get_mail_transport("agent@example.com", "nowe")
+    assert new is not old and new.password == "nowe"
+    assert list(mail_transport.mail_transport_metrics()) == [f"agent@example.com@{smtp_server.hostname}:{smtp_server.port}"]
+    assert "nowe" not in repr(list(mail_transport._transports))
@@ -0,0 +1,83 @@
+# tests/test_parallel_tools.py
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.agents import AgentExecutor, create_tool_calling_agent
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.tools import Tool
+
+from app.core import parallel_tools
+from app.core.parallel_tools import with_bounded_pool
+
+
+class _ScriptedModel(BaseChatModel):
+    """Model zwracający kolejne wiadomości ze skryptu; bind_tools bez zmian."""
+
+    script: list
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=self.script.pop(0))])
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def _stub_tools(running, peak, lock):
+    def _make(name, delay):
+        def _run(query: str) -> str:
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(delay)
+            with lock:
+                running[0] -= 1
+            return f"{name}:{query}"
+
+        return Tool(name=name, func=_run, description=f"stub {name}")
+
+    # Pierwsze wywołania trwają najdłużej – kończą się po późniejszych
+    return [_make("slow", 0.2), _make("medium", 0.1), _make("fast", 0.01)]
+
+
+def test_tool_calls_of_one_turn_run_in_bounded_pool_and_keep_order(monkeypatch):
+    monkeypatch.setattr(parallel_tools, "_pool", ThreadPoolExecutor(max_workers=2))
+    running, peak, lock = [0], [0], threading.Lock()
+    tools = with_bounded_pool(_stub_tools(running, peak, lock))
+
+    calls = [
+        {"name": name, "args": {"query": str(i)}, "id": f"call_{i}"}
+        for i, name in enumerate(["slow", "medium", "fast", "slow", "fast"])
+    ]
+    model = _ScriptedModel(script=[AIMessage(content="", tool_calls=calls), AIMessage(content="gotowe")])
+    prompt = ChatPromptTemplate.from_messages([
+        ("human", "{input}"),
+        MessagesPlaceholder("agent_scratchpad"),
+    ])
+    agent = create_tool_calling_agent(llm=model, tools=tools, prompt=prompt)
+    executor = AgentExecutor(agent=agent, tools=tools, return_intermediate_steps=True)
+
+    result = asyncio.run(executor.ainvoke({"input": "start"}))
+
+    assert result["output"] == "gotowe"
+    assert [(action.tool_call_id, output) for action, output in result["intermediate_steps"]] == [
+        (call["id"], f"{call['name']}:{call['args']['query']}") for call in calls
+    ]
+    assert peak[0] == 2  # równolegle, ale nie więcej niż pula
+
+
+def test_tools_with_own_coroutine_are_left_unchanged():
+    async def _native(query: str) -> str:
+        return query
+
+    native = Tool(name="native", func=None, coroutine=_native, description="async")
+    assert with_bounded_pool([native])[0] is native
@@ -0,0 +1,118 @@
+# tests/test_pipeline.py
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import pipeline, snapshot_delta
+from app.core.snapshot_tracker import SnapshotTracker
+from conftest import make_record
+
+
+class _PassThroughValidator:
+    invalid = []
+
+    def iter_valid(self, records):
+        return iter(records)
+
+    def stats(self):
+        return {}
+
+
+@pytest.fixture
+def run(monkeypatch, snapshots):
+    """Pipeline w trybie delty z podmienionym fetch, decyzjami i powiadomieniami."""
+    notified = []
+    verdicts = {}
+    monkeypatch.setattr(pipeline, "check_fetch_status", SimpleNamespace(func=lambda _: "✅ Fetch działa"))
+    monkeypatch.setattr(pipeline, "latest_snapshot", snapshot_delta.latest_snapshot)
+    monkeypatch.setattr(pipeline, "SnapshotValidator", _PassThroughValidator)
+    monkeypatch.setattr(
+        pipeline,
+        "decide_orders_batch",
+        lambda records: [
+            {"id": r["id"], "decision": verdicts.get(r["id"], "TAK"), "error": None}
+            if verdicts.get(r["id"], "TAK") in ("TAK", "NIE")
+            else {"id": r["id"], "decision": None, "error": verdicts[r["id"]]}
+            for r in records
+        ],
+    )
+    monkeypatch.setattr(
+        pipeline,
+        "_notify_good_orders",
+        lambda records: notified.extend(r["id"] for r in records) or ["✅"] * len(records),
+    )
+
+    def _run(**kwargs):
+        return pipeline.run_pipeline(delta=True, **kwargs)
+
+    _run.notified = notified
+    _run.verdicts = verdicts
+    return _run
+
+
+def test_delta_redecides_changed_records_once_per_content(run, snapshots, isolated_env):
+    snapshots["data"] = {
+        "s/1.json": [make_record("a"), make_record("c")],
+        "s/2.json": [make_record("a", wojewodztwo="14"), make_record("b"), make_record("c")],
+    }
+    # "a" i "c" już powiadomione (np. w trybie agenta); "b" też, choć jest w delcie jako dodane
+    SnapshotTracker(kind="motoassist").update_cache([make_record("a"), make_record("b"), make_record("c")])
+
+    result = run()
+
+    assert result["delta"]["changed"] == 1
+    assert run.notified == ["a"]
+
+    # Utracony indeks delty: "a" znów wychodzi jako zmienione, ale ta wersja treści już była oceniona
+    (isolated_env / "data" / "motoassist_record_hashes.json").unlink()
+    again = run()
+    assert again["delta"]["changed"] == 1
+    assert again["processed"] == 0
+    assert run.notified == ["a"]
+
+
+def test_delta_index_not_committed_when_processing_fails(run, snapshots, monkeypatch):
+    snapshots["data"] = {"s/1.json": [], "s/2.json": [make_record("a")]}
+
+    def _smtp_down(records):
+        raise ConnectionError("smtp down")
+
+    with monkeypatch.context() as m:
+        m.setattr(pipeline, "_notify_good_orders", _smtp_down)
+        with pytest.raises(ConnectionError):
+            run()
+
+    result = run()
+    assert result["delta"]["added"] == 1
+    assert run.notified == ["a"]
+    assert run()["delta"] == {"snapshot": "s/2.json", "added": 0, "changed": 0, "removed": 0}
+
+
+def test_failed_escalation_keeps_record_for_retry(run, snapshots):
+    snapshots["data"] = {"s/1.json": [], "s/2.json": [make_record("a"), make_record("b")]}
+    run.verdicts["b"] = "❌ Nie udało się rozpoznać województwa"
+
+    def _llm_down(text):
+        raise RuntimeError("llm down")
+
+    result = run(escalate=_llm_down)
+    assert result["llm_output"].startswith("❌")
+    assert "b" not in SnapshotTracker(kind="motoassist").seen_ids
+
+    # Kolejny przebieg: "a" już obsłużone, "b" ponowione i tym razem eskalowane
+    result = run(escalate=lambda text: "obsłużone")
+    assert result["processed"] == 1
+    assert run.notified == ["a"]
+    assert "b" in SnapshotTracker(kind="motoassist").seen_ids
+
+
+def test_anomalies_without_escalation_handler_are_not_retried(run, snapshots):
+    snapshots["data"] = {"s/1.json": [], "s/2.json": [make_record("a")]}
+    run.verdicts["a"] = "❌ Nie udało się rozpoznać województwa"
+
+    result = run()
+
+    assert result["anomalies"] and result["llm_output"] is None
+    assert "a" in SnapshotTracker(kind="motoassist").seen_ids
+    assert run()["delta"] == {"snapshot": "s/2.json", "added": 0, "changed": 0, "removed": 0}
@@ -0,0 +1,113 @@
+# tests/test_run_budget.py
+
+import json
+from uuid import uuid4
+
+import pytest
+
+from app.core import agent_executor
+from app.core.run_budget import BudgetExceeded, BudgetGuard, RunBudget, partial_result, with_tool_timeouts
+from app.core.snapshot_tracker import SnapshotTracker
+from conftest import make_record
+
+
+def _guard(**limits):
+    budget = RunBudget("cli", wall_clock_s=None, max_iterations=None, max_tokens=None, tool_timeout_s=None)
+    for name, value in limits.items():
+        setattr(budget, name, value)
+    return BudgetGuard(budget)
+
+
+def _call_tool(guard, name, tool_input):
+    run_id = uuid4()
+    guard.on_tool_start({"name": name}, json.dumps(tool_input), run_id=run_id, inputs=tool_input)
+    guard.on_tool_end("TAK", run_id=run_id)
+
+
+def test_partial_result_lists_records_that_reached_decision_tools():
+    guard = _guard(max_iterations=2)
+    _call_tool(guard, "decide_orders_batch", {"records": [make_record("a"), make_record("b")]})
+    _call_tool(guard, "fetch_latest_snapshot", {"records": [make_record("c")]})
+    for _ in range(2):
+        guard.on_chat_model_start({}, [], run_id=uuid4())
+
+    with pytest.raises(BudgetExceeded) as exc:
+        guard.on_chat_model_start({}, [], run_id=uuid4())
+    result = partial_result(guard, exc.value)
+
+    assert result["partial"] is True
+    assert result["budget_exhausted"] == "iterations"
+    assert sorted(result["processed_records"]) == ["a", "b"]
+
+
+@pytest.fixture
+def cli_run(monkeypatch):
+    records = [make_record(rid) for rid in ("seen", "a", "b", "c")]
+    SnapshotTracker(kind="motoassist").update_cache([records[0]])
+    monkeypatch.setattr(agent_executor, "latest_snapshot", lambda: {"key": "s/2.json", "kind": "motoassist"})
+    monkeypatch.setattr(agent_executor, "read_snapshot", lambda snapshot: {"records": records})
+
+    def _run(result):
+        monkeypatch.setattr(agent_executor, "invoke_agent", lambda *args, **kwargs: result)
+        agent_executor.run_agent_cli("agent")
+        return [r["id"] for r in SnapshotTracker(kind="motoassist").filter_new_records(records)]
+
+    return _run
+
+
+def test_cli_partial_run_marks_only_processed_records(cli_run):
+    assert cli_run({"partial": True, "processed_records": ["a"]}) == ["b", "c"]
+
+
+def test_cli_full_run_marks_new_records(cli_run):
+    assert cli_run({"output": "ok", "processed_records": ["a"]}) == []
+
+
+def _streamed_response():
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, LLMResult
+
+    message = AIMessage("TAK", usage_metadata={"input_tokens": 120, "output_tokens": 30, "total_tokens": 150})
+    # Tak wygląda odpowiedź z astream_events: bez llm_output["token_usage"]
+    return LLMResult(generations=[[ChatGeneration(message=message)]], llm_output=None)
+
+
+def test_streamed_usage_counts_towards_budget_and_report():
+    from app.core.token_accounting import TokenAccountant
+
+    guard = _guard(max_tokens=100)
+    accountant = TokenAccountant(model="gpt-4")
+    run_id = uuid4()
+    accountant.on_chat_model_start({}, [[]], run_id=run_id)
+    for handler in (guard, accountant):
+        handler.on_llm_end(_streamed_response(), run_id=run_id)
+
+    assert guard.tokens == 150
+    assert accountant.report()["api_usage"] == {"prompt_tokens": 120, "completion_tokens": 30, "total_tokens": 150}
+    with pytest.raises(BudgetExceeded):
+        guard.on_chat_model_start({}, [], run_id=uuid4())
+
+
+def test_llm_streams_usage(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("LLM_CACHE", "off")
+    agent_executor.get_llm.reset()
+    try:
+        assert agent_executor.get_llm().stream_usage is True
+    finally:
+        agent_executor.get_llm.reset()
+
+
+def test_side_effect_tools_are_not_wrapped_with_timeouts():
+    import time
+    from langchain_core.tools import Tool
+
+    sent = []
+    slow_lookup = Tool.from_function(name="check_fetch_status", description="x", func=lambda _: time.sleep(1) or "ok")
+    gmail = Tool.from_function(name="gmail_tool", description="x", func=lambda text: sent.append(text) or "✅")
+
+    limited = {tool.name: tool for tool in with_tool_timeouts([slow_lookup, gmail], 0.05)}
+
+    assert limited["check_fetch_status"].invoke("x").startswith("❌ Przekroczono limit czasu")
+    assert limited["gmail_tool"] is gmail
+    assert limited["gmail_tool"].invoke("treść") == "✅" and sent == ["treść"]
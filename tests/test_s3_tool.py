@@ -0,0 +1,100 @@
+# tests/test_s3_tool.py
+
+import io
+import hashlib
+from collections import Counter
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.modules import s3_tool
+from app.utils import snapshot_cache
+from conftest import make_record
+
+
+class _FakeS3:
+    """Minimalny klient S3 w pamięci: get/put, warunkowy GET (ETag) i listowanie."""
+
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self):
+        self.objects = {}
+        self.gets = Counter()
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = (Body, kwargs.get("ContentEncoding"))
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None):
+        self.gets[Key] += 1
+        if Key not in self.objects:
+            raise self.exceptions.NoSuchKey(Key)
+        body, encoding = self.objects[Key]
+        etag = hashlib.md5(body).hexdigest()
+        if IfNoneMatch == etag:
+            raise ClientError({"Error": {"Code": "304"}, "ResponseMetadata": {"HTTPStatusCode": 304}}, "GetObject")
+        return {"Body": io.BytesIO(body), "ETag": etag, "ContentEncoding": encoding}
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self, Bucket, Prefix, StartAfter=None):
+        keys = sorted(k for k in self.objects if k.startswith(Prefix) and (StartAfter is None or k > StartAfter))
+        yield {"Contents": [{"Key": k} for k in keys]}
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = _FakeS3()
+    monkeypatch.setenv("S3_BUCKET_NAME", "bucket")
+    monkeypatch.setattr(s3_tool, "_s3_client", lambda: fake)
+    monkeypatch.setattr(snapshot_cache, "_cache", None)
+    return fake
+
+
+def _write(s3, key, records, **header):
+    return s3_tool.write_snapshot(s3, "bucket", f"{s3_tool.SNAPSHOT_PREFIX}{key}", {**header, "records": records})
+
+
+def test_kind_and_records_come_from_one_fetch(s3, monkeypatch):
+    _write(s3, "1.json", [make_record("a")])
+    latest_key = _write(s3, "2.json", [make_record("a"), make_record("b", segment="Marcel – pozyskane")])
+
+    snapshot = s3_tool.latest_snapshot()
+
+    assert snapshot["kind"] == "marcel"
+    assert [r["id"] for r in s3_tool.snapshot_records(snapshot)] == ["a", "b"]
+    assert s3.gets[latest_key] == 1
+
+    # Kolejny przebieg: 304 z S3, rodzaj z indeksu cache – bez ponownego skanowania treści
+    monkeypatch.setattr(s3_tool, "_scan_kind", lambda *_: pytest.fail("treść skanowana ponownie"))
+    again = s3_tool.latest_snapshot()
+    assert again["kind"] == "marcel"
+    assert s3.gets[latest_key] == 2
+    assert s3_tool.read_snapshot(again)["records"][1]["id"] == "b"
+
+
+def test_kind_defaults_to_motoassist(s3):
+    _write(s3, "1.json", [make_record("a")])
+    _write(s3, "2.json", [make_record("b")], source="motoassist")
+
+    assert s3_tool.latest_snapshot()["kind"] == "motoassist"
+
+
+def test_first_manifest_without_previous_falls_back_to_listing(s3):
+    s3.put_object(Bucket="bucket", Key=f"{s3_tool.SNAPSHOT_PREFIX}1.json", Body=b'{"records": []}')
+    latest_key = _write(s3, "2.json", [make_record("a")])
+
+    assert s3_tool.latest_snapshot_keys() == (latest_key, f"{s3_tool.SNAPSHOT_PREFIX}1.json")
+
+
+def test_evicted_snapshot_is_fetched_again(s3):
+    _write(s3, "1.json", [make_record("a")])
+    latest_key = _write(s3, "2.json", [make_record("b")])
+    snapshot = s3_tool.latest_snapshot()
+
+    (snapshot_cache.get_snapshot_cache().directory / snapshot["digest"]).unlink()
+
+    assert [r["id"] for r in s3_tool.snapshot_records(snapshot)] == ["b"]
+    assert s3.gets[latest_key] == 2
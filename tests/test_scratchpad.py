@@ -0,0 +1,74 @@
+# tests/test_scratchpad.py
+
+import json
+
+from langchain_core.agents import AgentAction
+
+from app.core import scratchpad
+from app.core.scratchpad import compact_intermediate_steps, compact_observation
+from app.modules.snapshot_sanitizer_tool import SEGMENT_FIELD_ID, WOJEWODZTWO_FIELD_ID
+
+
+def _snapshot(count):
+    return {
+        "snapshot": "motoassist/2.json",
+        "records": [
+            {
+                "id": f"rec{i:04d}",
+                "createdTime": "2024-05-01T10:00:00Z",
+                "cellValuesByColumnId": {
+                    SEGMENT_FIELD_ID: "OSOBOWE",
+                    WOJEWODZTWO_FIELD_ID: "12",
+                    "fldKod": "31-154",
+                    "fldOpis": "x" * 200,
+                },
+            }
+            for i in range(count)
+        ],
+    }
+
+
+def test_recent_observation_is_projected_and_cut_at_record_boundaries():
+    text = compact_observation(json.dumps(_snapshot(200)), max_chars=4000, keep_records=True)
+    data = json.loads(text)  # poprawny JSON
+
+    assert len(text) <= 4000
+    assert data["records_count"] == 200
+    assert data["records_omitted"] == 200 - len(data["records"]) > 0
+    assert data["records"][0] == {
+        "id": "rec0000",
+        "cellValuesByColumnId": {SEGMENT_FIELD_ID: "OSOBOWE", WOJEWODZTWO_FIELD_ID: "12", "fldKod": "31-154"},
+    }
+
+
+def test_recent_list_keeps_whole_items():
+    verdicts = [{"id": f"rec{i}", "decision": "TAK", "error": None} for i in range(500)]
+    text = compact_observation(verdicts, max_chars=1000, keep_records=True)
+    data = json.loads(text)
+    assert len(text) <= 1000
+    assert data[0] == verdicts[0]
+    assert data[-1]["items_omitted"] == 500 - (len(data) - 1)
+
+
+def test_old_observation_summary_stays_valid_json():
+    text = compact_observation(json.dumps(_snapshot(50)), max_chars=120, keep_records=False)
+    data = json.loads(text)
+    assert len(text) <= 120
+    assert data["records_count"] == 50 and data["compacted"] is True
+    assert data["record_ids_sample"] == [f"rec{i:04d}" for i in range(len(data["record_ids_sample"]))]
+
+
+def test_plain_text_is_truncated():
+    text = compact_observation("a" * 100, max_chars=10, keep_records=True)
+    assert text.startswith("a" * 10) and "obcięto 90" in text
+
+
+def test_last_step_is_never_summarized(monkeypatch):
+    monkeypatch.setattr(scratchpad, "FULL_STEPS", 0)
+    monkeypatch.setattr(scratchpad, "OLD_OBSERVATION_MAX_CHARS", 200)
+    action = AgentAction(tool="fetch_latest_snapshot", tool_input={}, log="")
+    steps = [(action, json.dumps(_snapshot(5))), (action, json.dumps(_snapshot(5)))]
+
+    (_, old), (_, last) = compact_intermediate_steps(steps)
+    assert "record_ids_sample" in json.loads(old)
+    assert len(json.loads(last)["records"]) == 5
@@ -0,0 +1,124 @@
+# tests/test_single_flight.py
+
+import time
+import threading
+
+import pytest
+
+from app.core.single_flight import AlreadyInFlight, SingleFlight
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def test_claim_blocks_second_claim_and_do_joins_its_result():
+    flight = SingleFlight(poll_interval=0.01)
+    flight._redis_resolved = True  # bez Redis – tylko w procesie
+    joined = []
+
+    with flight.claim("agent-run") as outcome:
+        with pytest.raises(AlreadyInFlight):
+            with flight.claim("agent-run"):
+                pass
+        waiter = threading.Thread(target=lambda: joined.append(flight.do("agent-run", lambda: "own run")))
+        waiter.start()
+        outcome["result"] = {"output": "stream"}
+    waiter.join(timeout=5)
+
+    assert joined == [{"output": "stream"}]
+    assert not flight.in_flight("agent-run")
+
+
+def test_claim_is_visible_to_other_processes_through_redis():
+    pytest.importorskip("lupa")  # skrypty Lua dzierżawy w fakeredis
+    client = fakeredis.FakeRedis(decode_responses=True)
+    streaming = SingleFlight(redis_client=client, poll_interval=0.01)
+    other_worker = SingleFlight(redis_client=client, poll_interval=0.01)
+    joined = []
+
+    with streaming.claim("agent-run") as outcome:
+        with pytest.raises(AlreadyInFlight):
+            with other_worker.claim("agent-run"):
+                pass
+        waiter = threading.Thread(target=lambda: joined.append(other_worker.do("agent-run", lambda: "own run")))
+        waiter.start()
+        outcome["result"] = "stream"
+    waiter.join(timeout=5)
+
+    assert joined == ["stream"]
+    assert not client.exists("singleflight:agent-run:lock")
+
+
+def test_interrupted_claim_releases_the_key():
+    flight = SingleFlight()
+    flight._redis_resolved = True
+    with pytest.raises(RuntimeError):
+        with flight.claim("agent-run"):
+            raise RuntimeError("rozłączono")
+    assert flight.do("agent-run", lambda: "next") == "next"
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_claim_closed_without_outcome_fails_joiners(shared):
+    if shared:
+        pytest.importorskip("lupa")
+        client = fakeredis.FakeRedis(decode_responses=True)
+        streaming = SingleFlight(redis_client=client, poll_interval=0.01)
+        other = SingleFlight(redis_client=client, poll_interval=0.01)
+    else:
+        streaming = other = SingleFlight(poll_interval=0.01)
+        streaming._redis_resolved = True
+    errors = []
+
+    def _join():
+        try:
+            other.do("agent-run", lambda: "own run")
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    with streaming.claim("agent-run"):  # klient rozłączył strumień – brak wyniku i błędu
+        waiter = threading.Thread(target=_join)
+        waiter.start()
+        time.sleep(0.1)  # dołączający czeka już na przebieg
+    waiter.join(timeout=5)
+
+    assert len(errors) == 1 and "przerwany" in errors[0]
+
+
+def test_stream_endpoint_refuses_while_any_mode_runs(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.api import main
+
+    flight = SingleFlight()
+    flight._redis_resolved = True
+    monkeypatch.setattr(main, "single_flight", flight)
+
+    with flight.claim(main.AGENT_RUN_KEY):  # np. trwające zlecenie w trybie pipeline
+        response = TestClient(main.app).get("/run-agent-llm/stream", params={"mode": "parallel"})
+    assert response.status_code == 409
+
+
+def test_stream_holds_the_run_key_until_it_ends(monkeypatch):
+    from types import SimpleNamespace
+    from fastapi.testclient import TestClient
+    from app.api import main
+    from app.core import agent_stream
+
+    flight = SingleFlight()
+    flight._redis_resolved = True
+    monkeypatch.setattr(main, "single_flight", flight)
+    held = []
+
+    async def _events(*args, **kwargs):
+        held.append(flight.in_flight(main.AGENT_RUN_KEY))
+        yield "result", {"output": "ok"}
+
+    fake_stream = SimpleNamespace(
+        stream_agent_events=_events, sse_stream=agent_stream.sse_stream, SSE_HEADERS=agent_stream.SSE_HEADERS
+    )
+    monkeypatch.setattr(main, "timed_import", lambda name: fake_stream)
+
+    response = TestClient(main.app).get("/run-agent-llm/stream", params={"mode": "agent"})
+    assert response.status_code == 200
+    assert "event: result" in response.text
+    assert held == [True]
+    assert not flight.in_flight(main.AGENT_RUN_KEY)
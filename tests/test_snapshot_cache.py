@@ -0,0 +1,33 @@
+# tests/test_snapshot_cache.py
+
+import io
+
+import pytest
+
+from app.utils.snapshot_cache import SnapshotCache
+
+
+class _BrokenBody(io.BytesIO):
+    def read(self, size=-1):
+        if self.tell():
+            raise ConnectionError("połączenie z S3 zerwane")
+        return super().read(4)
+
+
+def test_failed_download_leaves_no_temporary_file(isolated_env):
+    cache = SnapshotCache(isolated_env / "cache")
+
+    with pytest.raises(ConnectionError):
+        cache.put("s/1.json", _BrokenBody(b'{"records": []}'), etag="e1", last_modified=None)
+
+    assert list((isolated_env / "cache").iterdir()) == []
+    assert cache.get("s/1.json") is None
+
+
+def test_open_of_evicted_blob_is_a_miss(isolated_env):
+    cache = SnapshotCache(isolated_env / "cache")
+    entry = cache.put("s/1.json", io.BytesIO(b'{"records": []}'), etag="e1", last_modified=None)
+
+    (isolated_env / "cache" / entry["digest"]).unlink()  # eksmisja w innym wątku
+
+    assert cache.open(entry) is None
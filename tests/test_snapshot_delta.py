@@ -0,0 +1,51 @@
+# tests/test_snapshot_delta.py
+
+from app.core.snapshot_delta import SnapshotDelta
+from conftest import make_record
+
+
+def test_diff_classifies_added_changed_removed():
+    delta = SnapshotDelta()
+    previous = delta._hash_records([make_record("a"), make_record("b"), make_record("c")])
+    result = delta.diff(
+        [make_record("a"), make_record("b", segment="DOSTAWCZE"), make_record("d")],
+        previous,
+    )
+    assert [r["id"] for r in result["added"]] == ["d"]
+    assert [r["id"] for r in result["changed"]] == ["b"]
+    assert result["removed"] == ["c"]
+    assert set(result["hashes"]) == {"a", "b", "d"}
+
+
+def test_compute_does_not_persist_index_until_commit(snapshots):
+    snapshots["data"] = {"s/1.json": [make_record("a")], "s/2.json": [make_record("a"), make_record("b")]}
+    delta = SnapshotDelta()
+
+    first = delta.compute()
+    assert [r["id"] for r in first["added"]] == ["b"]
+    assert not delta.index_path.exists()
+
+    # Przetwarzanie nie powiodło się – kolejny przebieg widzi tę samą deltę
+    again = delta.compute()
+    assert [r["id"] for r in again["added"]] == ["b"]
+
+    delta.commit(again["snapshot"], again["hashes"])
+    done = delta.compute()
+    assert done["added"] == [] and done["hashes"] is None
+
+
+def test_next_snapshot_is_diffed_against_committed_index(snapshots):
+    snapshots["data"] = {
+        "s/1.json": [make_record("a")],
+        "s/2.json": [make_record("a"), make_record("b")],
+        "s/3.json": [make_record("a", wojewodztwo="14"), make_record("b"), make_record("c")],
+    }
+    delta = SnapshotDelta()
+    first = delta.compute()
+    delta.commit(first["snapshot"], first["hashes"])
+
+    snapshots["keys"] = ("s/3.json", "s/2.json")
+    second = delta.compute()
+    assert [r["id"] for r in second["added"]] == ["c"]
+    assert [r["id"] for r in second["changed"]] == ["a"]
+    assert second["removed"] == []
@@ -0,0 +1,181 @@
+# tests/test_snapshot_tracker.py
+
+import time
+
+import pytest
+
+from app.core import snapshot_tracker
+from app.core.snapshot_tracker import (
+    BloomPrefilteredStore,
+    LocalSeenStore,
+    RedisSeenStore,
+    SnapshotTracker,
+    _make_store,
+)
+from conftest import make_record
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def use_redis(monkeypatch, redis_client):
+    monkeypatch.setenv("SNAPSHOT_TRACKER_BACKEND", "redis")
+    monkeypatch.setattr(snapshot_tracker, "shared_redis_client", lambda: redis_client)
+    return redis_client
+
+
+# --- LocalSeenStore ---
+def test_local_store_persists_and_filters(isolated_env):
+    tracker = SnapshotTracker(kind="motoassist")
+    tracker.update_cache([make_record("a"), make_record("b")])
+
+    reloaded = SnapshotTracker(kind="motoassist")
+    new = reloaded.filter_new_records([make_record("a"), make_record("c"), {"id": None}])
+    assert [r["id"] for r in new] == ["c"]
+
+
+def test_local_store_ttl_is_per_id(isolated_env):
+    store = LocalSeenStore(isolated_env, "motoassist", ttl_seconds=60)
+    store.add_many(["old"])
+    store._seen["old"] = time.time() - 120
+    store.compact()
+    store.add_many(["fresh"])
+
+    reloaded = LocalSeenStore(isolated_env, "motoassist", ttl_seconds=60)
+    assert reloaded.contains_many(["old", "fresh"]) == [False, True]
+
+
+# --- RedisSeenStore ---
+def test_redis_store_ttl_is_per_id_not_per_key(redis_client):
+    store = RedisSeenStore(redis_client, "motoassist", ttl_seconds=60)
+    store.seed({"old": time.time() - 120, "recent": time.time() - 30})
+    assert store.contains_many(["old", "recent", "never"]) == [False, True, False]
+
+    # Zapis nie odnawia wygasania całego zbioru, a przeterminowane ID dostaje nowy czas
+    assert store.add_many(["old", "other"]) == 2
+    assert redis_client.ttl(store.key) == -1
+    assert store.contains_many(["old", "recent", "other"]) == [True, True, True]
+    assert len(store) == 3
+
+
+def test_redis_store_falls_back_only_on_response_error(redis_client, monkeypatch):
+    from redis.exceptions import ConnectionError, ResponseError
+
+    store = RedisSeenStore(redis_client, "motoassist")
+    store.add_many(["a"])
+
+    def _unknown_command(*args, **kwargs):
+        raise ResponseError("unknown command 'ZMSCORE'")
+
+    monkeypatch.setattr(redis_client, "zmscore", _unknown_command)
+    assert store.contains_many(["a", "b"]) == [True, False]
+
+    def _connection_lost(*args, **kwargs):
+        raise ConnectionError("Connection refused")
+
+    monkeypatch.setattr(redis_client, "zmscore", _connection_lost)
+    with pytest.raises(ConnectionError):
+        store.contains_many(["a"])
+
+
+def test_switch_to_redis_seeds_local_ids_once(isolated_env, use_redis):
+    (isolated_env / "data").mkdir()
+    local = LocalSeenStore(isolated_env / "data", "motoassist")
+    local.add_many(["a", "b"])
+
+    tracker = SnapshotTracker(kind="motoassist")
+    assert isinstance(tracker.store, RedisSeenStore)
+    assert [r["id"] for r in tracker.filter_new_records([make_record("a"), make_record("c")])] == ["c"]
+
+    # Znacznik: ID usunięte z Redis nie wracają z lokalnego dziennika
+    use_redis.zrem(tracker.store.key, "a")
+    again = SnapshotTracker(kind="motoassist")
+    assert again.store.contains_many(["a", "b"]) == [False, True]
+
+
+def test_auto_backend_without_redis_uses_local_store(isolated_env, monkeypatch):
+    monkeypatch.setenv("SNAPSHOT_TRACKER_BACKEND", "auto")
+    monkeypatch.setattr(snapshot_tracker, "shared_redis_client", lambda: None)
+    assert isinstance(_make_store(isolated_env, "motoassist", None), LocalSeenStore)
+
+
+# --- BloomPrefilteredStore ---
+def _bloom(exact, cache_dir, redis_client=None, **kwargs):
+    return BloomPrefilteredStore(
+        exact, "motoassist", cache_dir, capacity=1000, error_rate=0.01,
+        trust_positives=True, redis_client=redis_client, **kwargs
+    )
+
+
+def test_bloom_in_redis_keeps_bits_of_other_replicas(isolated_env, redis_client):
+    first = _bloom(RedisSeenStore(redis_client, "motoassist"), isolated_env, redis_client)
+    second = _bloom(RedisSeenStore(redis_client, "motoassist"), isolated_env, redis_client)
+
+    first.add_many(["a"])
+    second.add_many(["b"])
+
+    # Bity sprawdzane w Redis – zapis jednej repliki nie kasuje bitów drugiej
+    assert first.contains_many(["a", "b", "c"]) == [True, True, False]
+    third = _bloom(RedisSeenStore(redis_client, "motoassist"), isolated_env, redis_client)
+    assert third.contains_many(["a", "b"]) == [True, True]
+    assert third.bloom.count == 2
+
+
+def test_bloom_file_is_merged_with_copy_on_disk(isolated_env):
+    first = _bloom(LocalSeenStore(isolated_env, "motoassist"), isolated_env)
+    # Drugi proces z własnym dziennikiem, ale wspólnym plikiem filtra
+    second = _bloom(LocalSeenStore(isolated_env, "other"), isolated_env)
+
+    first.add_many(["a"])
+    second.add_many(["b"])
+
+    reloaded = _bloom(LocalSeenStore(isolated_env, "motoassist"), isolated_env)
+    assert reloaded.contains_many(["a", "b", "c"]) == [True, True, False]
+
+
+def test_bloom_is_rebuilt_after_ttl(isolated_env):
+    exact = LocalSeenStore(isolated_env, "motoassist", ttl_seconds=60)
+    store = _bloom(exact, isolated_env)
+    store.add_many(["old"])
+
+    # ID wygasło w magazynie dokładnym, a filtr ma już wiek TTL
+    exact._seen["old"] = time.time() - 120
+    exact.compact()
+    store.bloom.created_at -= 120
+    store.add_many(["new"])
+
+    assert store.contains_many(["old", "new"]) == [False, True]
+    reloaded = _bloom(LocalSeenStore(isolated_env, "motoassist", ttl_seconds=60), isolated_env)
+    assert reloaded.contains_many(["old", "new"]) == [False, True]
+
+
+def test_bloom_in_redis_is_rotated_once_for_all_replicas(isolated_env, redis_client):
+    exact = RedisSeenStore(redis_client, "motoassist", ttl_seconds=60)
+    store = _bloom(exact, isolated_env, redis_client)
+    store.add_many(["old"])
+    redis_client.zadd(exact.key, {"old": time.time() - 120}, xx=True)
+    redis_client.hset(store._meta_key, "created_at", repr(time.time() - 120))
+
+    rotated = _bloom(RedisSeenStore(redis_client, "motoassist", ttl_seconds=60), isolated_env, redis_client)
+    assert rotated.contains_many(["old"]) == [False]
+    assert store.contains_many(["old"]) == [False]
+    created_at = float(redis_client.hget(store._meta_key, "created_at"))
+    again = _bloom(RedisSeenStore(redis_client, "motoassist", ttl_seconds=60), isolated_env, redis_client)
+    assert again.bloom.created_at == created_at
+
+
+def test_seeded_ids_reach_existing_redis_bloom(isolated_env, use_redis, monkeypatch):
+    monkeypatch.setenv("SNAPSHOT_TRACKER_BLOOM", "1")
+    monkeypatch.setenv("SNAPSHOT_TRACKER_BLOOM_TRUST_POSITIVES", "1")
+    _make_store(isolated_env, "motoassist", None)  # filtr zbudowany przez inną replikę
+    (isolated_env / "motoassist_seen_records.redis-seeded").unlink()
+    LocalSeenStore(isolated_env, "motoassist").add_many(["local"])
+
+    store = _make_store(isolated_env, "motoassist", None)
+    assert isinstance(store, BloomPrefilteredStore)
+    assert store.contains_many(["local", "unknown"]) == [True, False]
@@ -0,0 +1,45 @@
+# tests/test_tool_memo.py
+
+import json
+import os
+
+from langchain_core.tools import Tool
+
+from app.core import tool_memo
+from app.core.tool_memo import MemoPolicy, memoize
+from app.utils.preference_table import SIDECAR_VERSION, PreferenceTable
+
+
+def _write_sidecar(path, preferred: bool):
+    path.write_text(json.dumps({
+        "version": SIDECAR_VERSION,
+        "regions": ["MAŁOPOLSKIE"],
+        "bitmap": {"OSOBOWE": int(preferred)},
+    }), encoding="utf-8")
+
+
+def test_memo_key_follows_preference_table_version(tmp_path, monkeypatch):
+    monkeypatch.setattr(tool_memo, "_caches", {})
+    sidecar = tmp_path / "prefs.json"
+    _write_sidecar(sidecar, preferred=True)
+    table = PreferenceTable(sidecar)
+    calls = []
+
+    def _decide(query: str) -> str:
+        calls.append(query)
+        return "TAK" if table.is_preferred("OSOBOWE", "MAŁOPOLSKIE") else "NIE"
+
+    tool = memoize(
+        Tool(name="decide_if_order_is_good", func=_decide, description="test"),
+        MemoPolicy(ttl_s=600, version=lambda: table.version),
+    )
+    assert tool.run("rec1") == "TAK"
+    assert tool.run("rec1") == "TAK"
+    assert len(calls) == 1
+
+    # Przeładowana tabela = nowa wersja w kluczu, bez czekania na TTL
+    _write_sidecar(sidecar, preferred=False)
+    st = sidecar.stat()  # ten sam rozmiar – wymuszona zmiana mtime
+    os.utime(sidecar, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert tool.run("rec1") == "NIE"
+    assert len(calls) == 2
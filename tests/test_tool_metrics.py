@@ -0,0 +1,68 @@
+# tests/test_tool_metrics.py
+
+import pytest
+from langchain_core.tools import Tool
+
+from app.core import tool_metrics
+from app.core.tool_metrics import ToolStats, instrument
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(tool_metrics, "_stats", {})
+
+
+def test_durations_land_in_buckets_and_totals_add_up():
+    stats = ToolStats("s3_tool")
+    for elapsed in (0.005, 0.0051, 0.2, 0.2, 40.0):
+        stats.observe(elapsed, input_chars=10, output="ok", failed=False)
+    stats.observe(0.03, input_chars=10, output="❌ Brak ENV S3_BUCKET_NAME", failed=False)
+    stats.observe(0.001, input_chars=10, output=None, failed=True)
+
+    snapshot = stats.snapshot()
+    histogram = snapshot["latency_ms"]["histogram"]
+
+    assert histogram["le_5"] == 2  # 5 ms i 1 ms (granica włącznie)
+    assert histogram["le_10"] == 1
+    assert histogram["le_50"] == 1
+    assert histogram["le_250"] == 2
+    assert histogram["gt_30000"] == 1
+    assert sum(histogram.values()) == snapshot["calls"] == 7
+    assert (snapshot["exceptions"], snapshot["error_results"]) == (1, 1)
+    assert snapshot["error_rate"] == pytest.approx(2 / 7)
+    assert snapshot["latency_ms"]["max"] == 40000.0
+    assert snapshot["latency_ms"]["p50_le"] == 50  # 4. z 7 wywołań w koszyku le_50
+    assert snapshot["latency_ms"]["p95_le"] is None  # kwantyl powyżej ostatniej granicy
+    assert snapshot["avg_input_chars"] == 10
+
+
+def test_instrumented_tool_counts_calls_errors_and_exceptions():
+    def _lookup(query: str) -> str:
+        if query == "boom":
+            raise RuntimeError("awaria")
+        return "❌ Brak danych" if query == "pusty" else "✅ ok"
+
+    tool = instrument(Tool(name="check_fetch_status", func=_lookup, description="test"))
+    tool.run("x")
+    tool.run("pusty")
+    with pytest.raises(RuntimeError):
+        tool.run("boom")
+
+    metrics = tool_metrics.tool_metrics("check_fetch_status")["check_fetch_status"]
+    assert (metrics["calls"], metrics["exceptions"], metrics["error_results"]) == (3, 1, 1)
+    assert sum(metrics["latency_ms"]["histogram"].values()) == 3
+    assert tool_metrics.tool_metrics("nieznane") == {}
+
+
+def test_metrics_endpoint_reports_all_tools():
+    from fastapi.testclient import TestClient
+    from app.api import main
+
+    tool_metrics.stats_for("gmail_tool").observe(0.02, 5, "✅", False)
+    tool_metrics.stats_for("s3_tool").observe(0.5, 5, "✅", False)
+
+    body = TestClient(main.app).get("/metrics/tools").json()
+
+    assert list(body) == ["gmail_tool", "s3_tool"]
+    assert body["s3_tool"]["latency_ms"]["histogram"]["le_500"] == 1
+    assert TestClient(main.app).get("/metrics/tools", params={"name": "gmail_tool"}).json()["gmail_tool"]["calls"] == 1